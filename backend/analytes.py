@@ -0,0 +1,195 @@
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple, TypedDict
+
+# Registry of the CBC analytes the extractors know how to read. Each definition carries the
+# labels printed on reports (for the prompt and the local text parser), the printed units
+# and their factor to the canonical unit, and the adult reference range used to flag values.
+# CBC_PANEL - comma-separated analyte keys to extract, or "all" (default: "anc", the
+#             single-analyte pipeline). The ANC is always part of the panel.
+
+_MICROLITER = r"(?:µ|μ|u|mc)\s*l\b"
+_CUBIC_MM = r"(?:c(?:u\.?\s*)?mm|mm\s*(?:3|³))\b"
+_TEN_TO = r"(?:[x×*]\s*)?10\s*(?:\^|\*{1,2}|e)?\s*"
+
+# Cell counts: K/µL, ×10³/µL and 10^9/L mean thousands; Indian labs also print lakhs/cumm
+COUNT_UNITS: Tuple[Tuple[str, float], ...] = (
+    (r"(?:k|thou(?:s(?:and)?)?)\s*/\s*" + _MICROLITER
+     + r"|" + _TEN_TO + r"(?:3|³)\s*/\s*(?:" + _MICROLITER + r"|" + _CUBIC_MM + r")"
+     + r"|" + _TEN_TO + r"(?:9|⁹)\s*/\s*l\b", 1000),
+    (r"lakhs?\s*/\s*(?:" + _MICROLITER + r"|" + _CUBIC_MM + r")", 100_000),
+    (r"(?:cells\s*)?/\s*(?:" + _MICROLITER + r"|" + _CUBIC_MM + r")"
+     + r"|per\s+(?:micro\s*lit(?:er|re)|" + _MICROLITER + r")", 1),
+)
+HEMOGLOBIN_UNITS: Tuple[Tuple[str, float], ...] = (
+    (r"gm?\s*/\s*dl\b|gm?\s*%", 1),
+    (r"gm?\s*/\s*l\b", 0.1),
+    (r"mmol\s*/\s*l\b", 1.611),
+)
+
+
+class Analyte(NamedTuple):
+    key: str
+    name: str
+    aliases: Tuple[str, ...]
+    label: str                       # regex for the analyte's line in report text
+    unit: str                        # canonical unit every value is converted to
+    units: Tuple[Tuple[str, float], ...]
+    reference_range: Tuple[float, float]
+    critical_low: float              # below this the value alone warrants admission
+    low_condition: str
+    high_condition: str
+    max_plausible: float             # larger canonical values are treated as misreads
+    exclude: Optional[str] = None    # regex for other tests whose labels contain this one's
+
+
+ANALYTES: Dict[str, Analyte] = {analyte.key: analyte for analyte in (
+    Analyte(
+        key="anc", name="Absolute Neutrophil Count",
+        aliases=("ANC", "Neutrophils (Absolute)", "Abs Neutrophils", "NEUT#"),
+        label=r"neutrophil|\bneut\b|\banc\b", unit="cells/µL", units=COUNT_UNITS,
+        reference_range=(1500, 8000), critical_low=500,
+        low_condition="Neutropenia", high_condition="Neutrophilia", max_plausible=100_000,
+    ),
+    Analyte(
+        key="wbc", name="White Blood Cell count",
+        aliases=("WBC", "Total Leukocyte Count", "TLC", "Leukocytes"),
+        label=r"\bwbc\b|white\s+(?:blood\s+)?cell|leu[ck]ocyte|\btlc\b", unit="cells/µL", units=COUNT_UNITS,
+        reference_range=(4000, 11000), critical_low=1000,
+        low_condition="Leukopenia", high_condition="Leukocytosis", max_plausible=500_000,
+    ),
+    Analyte(
+        key="hemoglobin", name="Hemoglobin",
+        aliases=("Hb", "Hgb", "Haemoglobin"),
+        label=r"ha?emoglobin|\bhgb\b|\bhb\b", unit="g/dL", units=HEMOGLOBIN_UNITS,
+        reference_range=(12.0, 17.5), critical_low=7.0,
+        low_condition="Anemia", high_condition="High hemoglobin", max_plausible=25,
+        exclude=r"mean\s+corpuscular|\bmchc?\b|a1c|glyc",
+    ),
+    Analyte(
+        key="platelets", name="Platelet count",
+        aliases=("PLT", "Platelets"),
+        label=r"platelet|\bplt\b", unit="cells/µL", units=COUNT_UNITS,
+        reference_range=(150_000, 450_000), critical_low=20_000,
+        low_condition="Thrombocytopenia", high_condition="Thrombocytosis", max_plausible=3_000_000,
+        exclude=r"mean\s+platelet|\bmpv\b|\bpdw\b|plateletcrit|\bpct\b",
+    ),
+)}
+
+# Compiled once at import: one alternation per analyte, the unit's factor found by group index
+_LABELS: Dict[str, Pattern[str]] = {key: re.compile(a.label, re.IGNORECASE) for key, a in ANALYTES.items()}
+_EXCLUDES: Dict[str, Pattern[str]] = {
+    key: re.compile(a.exclude, re.IGNORECASE) for key, a in ANALYTES.items() if a.exclude
+}
+_UNITS: Dict[str, Pattern[str]] = {
+    key: re.compile("|".join(f"(?P<u{i}>{pattern})" for i, (pattern, _) in enumerate(a.units)), re.IGNORECASE)
+    for key, a in ANALYTES.items()
+}
+
+
+class AnalyteResult(TypedDict):
+    """One analyte of an extracted panel; value is in the analyte's canonical unit."""
+    value: Optional[float]
+    unit: str
+    status: str                      # success, not_found, unclear or parse_error
+    flag: Optional[str]              # critical_low, low, normal or high
+    reference_range: List[float]
+    printed_value: Optional[float]
+    printed_unit: Optional[str]
+    confidence: Optional[float]
+
+
+def cbc_panel() -> Tuple[str, ...]:
+    """The configured panel's analyte keys, ANC first."""
+    setting = os.getenv("CBC_PANEL", "anc").strip().lower()
+    keys = list(ANALYTES) if setting == "all" else [key.strip() for key in setting.split(",") if key.strip()]
+    unknown = [key for key in keys if key not in ANALYTES]
+    if unknown:
+        raise ValueError(f"Unknown CBC_PANEL analyte(s): {', '.join(unknown)}. Use {', '.join(ANALYTES)} or 'all'.")
+    return ("anc",) + tuple(dict.fromkeys(key for key in keys if key != "anc"))
+
+
+def panel_analytes(keys: Sequence[str]) -> List[Analyte]:
+    return [ANALYTES[key] for key in keys]
+
+
+def label_pattern(analyte: Analyte) -> Pattern[str]:
+    return _LABELS[analyte.key]
+
+
+def is_excluded(analyte: Analyte, line: str) -> bool:
+    """Whether the line names another test whose label contains this analyte's (MCH, MPV)."""
+    exclude = _EXCLUDES.get(analyte.key)
+    return exclude is not None and exclude.search(line) is not None
+
+
+def unit_pattern(analyte: Analyte) -> Pattern[str]:
+    return _UNITS[analyte.key]
+
+
+def unit_factor(analyte: Analyte, unit_match: "re.Match[str]") -> float:
+    """Factor to the canonical unit for a match of unit_pattern."""
+    return analyte.units[int(unit_match.lastgroup[1:])][1]
+
+
+def to_canonical(printed_value: float, factor: float) -> float:
+    """A printed value converted with its unit's factor to the canonical unit."""
+    # 2.03 * 1000 is 2029.9999999999998 in floating point
+    return round(printed_value * factor, 6)
+
+
+def printed_unit_factor(analyte: Analyte, printed_unit: Optional[str]) -> Optional[float]:
+    """Factor to the canonical unit for a unit as printed, or None if the registry does not know it."""
+    if not printed_unit:
+        return None
+    match = _UNITS[analyte.key].search(printed_unit)
+    return unit_factor(analyte, match) if match is not None else None
+
+
+def flag(analyte: Analyte, value: float) -> str:
+    low, high = analyte.reference_range
+    if value < analyte.critical_low:
+        return "critical_low"
+    if value < low:
+        return "low"
+    if value > high:
+        return "high"
+    return "normal"
+
+
+def condition(analyte: Analyte, value_flag: Optional[str]) -> Optional[str]:
+    """The condition a flagged value points to, e.g. "Severe anemia", or None when in range."""
+    if value_flag == "critical_low":
+        return f"Severe {analyte.low_condition.lower()}"
+    if value_flag == "low":
+        return analyte.low_condition
+    if value_flag == "high":
+        return analyte.high_condition
+    return None
+
+
+def analyte_result(analyte: Analyte, status: str, printed_value: Optional[float] = None,
+                   printed_unit: Optional[str] = None, factor: Optional[float] = None,
+                   confidence: Optional[float] = None) -> AnalyteResult:
+    """
+    Build one panel entry. A successful read is converted to the canonical unit and flagged
+    against the reference range; a negative or implausible value is reported as unclear.
+    """
+    value = None
+    if status == "success":
+        if printed_value is None or factor is None:
+            status = "parse_error"
+        else:
+            value = to_canonical(printed_value, factor)
+            if not 0 <= value <= analyte.max_plausible:
+                value, status = None, "unclear"
+    return AnalyteResult(
+        value=value,
+        unit=analyte.unit,
+        status=status,
+        flag=flag(analyte, value) if value is not None else None,
+        reference_range=list(analyte.reference_range),
+        printed_value=printed_value,
+        printed_unit=printed_unit,
+        confidence=confidence,
+    )
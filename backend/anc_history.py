@@ -0,0 +1,290 @@
+import asyncio
+import hmac
+import os
+import sqlite3
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from metrics import ANC_HISTORY_WRITES
+from tracing import log
+
+# Per-patient ANC time series, so recommendations can see the trend and not just today's value.
+# Writes are queued in memory and committed in batches by a background task, off the request path.
+# ANC_HISTORY_DB_PATH         - SQLite file for the history; unset disables it
+# ANC_HISTORY_TOKEN           - secret GET /patients/{id}/anc requires in X-History-Token; unset keeps it closed
+# ANC_HISTORY_BATCH_SIZE      - points committed per transaction at most
+# ANC_HISTORY_FLUSH_INTERVAL  - seconds a point may wait for others to share its transaction
+# ANC_HISTORY_MAX_PENDING     - uncommitted points held in memory before new ones are dropped
+# ANC_TREND_WINDOW_DAYS       - how far back the trend passed to the recommendation looks
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_PENDING = 10_000
+DEFAULT_TREND_WINDOW_DAYS = 14.0
+# Points returned by GET /patients/{id}/anc before it switches to time buckets
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 10_000
+# Severe neutropenia
+SEVERE_ANC = 500.0
+
+DAY = 24 * 3600.0
+
+
+class HistoryPoint(NamedTuple):
+    patient_id: str
+    observed_at: float
+    anc_value: float
+
+
+def anc_trend(points: Sequence[Tuple[float, float]], window_days: float,
+              threshold: float = SEVERE_ANC) -> Dict[str, Any]:
+    """
+    Trend of (observed_at, anc_value) points in time order, the last being the current value.
+    decline_per_day is the least-squares slope in cells/µL per day, positive when the ANC falls.
+    days_below_500 interpolates linearly between samples, and days_to_500 extrapolates the
+    slope from the current value (only while it is still above the threshold and falling).
+    """
+    trend: Dict[str, Any] = {
+        "window_days": window_days,
+        "points": len(points),
+        "decline_per_day": None,
+        "days_below_500": 0.0,
+        "days_to_500": None,
+        "nadir_anc": None,
+        "nadir_at": None,
+    }
+    if not points:
+        return trend
+    nadir_at, nadir = min(points, key=lambda point: (point[1], -point[0]))
+    trend["nadir_anc"], trend["nadir_at"] = nadir, nadir_at
+
+    below = 0.0
+    for (t0, v0), (t1, v1) in zip(points, points[1:]):
+        if v0 < threshold and v1 < threshold:
+            below += t1 - t0
+        elif (v0 < threshold) != (v1 < threshold):
+            # The part of the segment on the low side of where it crosses the threshold
+            crossing = t0 + (t1 - t0) * (threshold - v0) / (v1 - v0)
+            below += (crossing - t0) if v0 < threshold else (t1 - crossing)
+    trend["days_below_500"] = round(below / DAY, 2)
+
+    first_at = points[0][0]
+    if len(points) >= 2 and points[-1][0] > first_at:
+        days = [(t - first_at) / DAY for t, _ in points]
+        values = [v for _, v in points]
+        mean_day, mean_value = sum(days) / len(days), sum(values) / len(values)
+        spread = sum((d - mean_day) ** 2 for d in days)
+        slope = sum((d - mean_day) * (v - mean_value) for d, v in zip(days, values)) / spread
+        trend["decline_per_day"] = round(-slope, 1)
+        current = values[-1]
+        if slope < 0 and current >= threshold:
+            trend["days_to_500"] = round((current - threshold) / -slope, 1)
+    return trend
+
+
+class AncHistory:
+    """
+    ANC history in a SQLite table clustered by (patient_id, observed_at), so a patient's range
+    query or trend window reads one contiguous run of the primary-key B-tree however many rows
+    other patients have. `record` only appends to an in-memory list; a background task commits
+    the list in batches, and reads merge (or first flush) what is not committed yet.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING,
+                 trend_window_days: float = DEFAULT_TREND_WINDOW_DAYS, token: Optional[str] = None):
+        self.db_path = db_path
+        self.token = token
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.trend_window_days = trend_window_days
+        # Accepted but not yet committed, oldest first; only the writer removes from the front
+        self._pending: List[HistoryPoint] = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._writer: Optional[asyncio.Task] = None
+        self._init_db()
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, patient_id: str, observed_at: float, anc_value: float) -> bool:
+        """Queue a point for the next batch; returns False if it was dropped because the queue is full."""
+        if len(self._pending) >= self.max_pending:
+            ANC_HISTORY_WRITES.inc(outcome="dropped")
+            log(f"ANC history queue full ({self.max_pending} points); dropped a point for patient {patient_id}")
+            return False
+        self._pending.append(HistoryPoint(patient_id, float(observed_at), float(anc_value)))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_loop())
+        self._wake.set()
+        return True
+
+    async def flush(self) -> None:
+        """Commit every queued point."""
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                try:
+                    await asyncio.to_thread(self._db_insert, batch)
+                    ANC_HISTORY_WRITES.inc(len(batch), outcome="written")
+                except sqlite3.IntegrityError as e:
+                    # One bad point must not cost the other patients theirs: retry the batch row by row
+                    log(f"ANC history batch of {len(batch)} points rejected, retrying one at a time: {str(e)}")
+                    try:
+                        written = await asyncio.to_thread(self._db_insert_each, batch)
+                        ANC_HISTORY_WRITES.inc(written, outcome="written")
+                        ANC_HISTORY_WRITES.inc(len(batch) - written, outcome="failed")
+                    except sqlite3.Error as e:
+                        ANC_HISTORY_WRITES.inc(len(batch), outcome="failed")
+                        log(f"ANC history write of {len(batch)} points failed: {str(e)}")
+                except sqlite3.Error as e:
+                    ANC_HISTORY_WRITES.inc(len(batch), outcome="failed")
+                    log(f"ANC history write of {len(batch)} points failed: {str(e)}")
+                del self._pending[:len(batch)]
+
+    async def close(self) -> None:
+        """Stop the writer and commit what it had not written yet."""
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        await self.flush()
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            if len(self._pending) < self.batch_size:
+                # Give other uploads a moment to share the transaction
+                await asyncio.sleep(self.flush_interval)
+            self._wake.clear()
+            await self.flush()
+
+    async def trend(self, patient_id: str, observed_at: float, anc_value: float) -> Dict[str, Any]:
+        """The trend over the last window up to a new (not yet recorded) value."""
+        start = observed_at - self.trend_window_days * DAY
+        rows = await asyncio.to_thread(self._db_points, patient_id, start, observed_at)
+        queued = [(p.observed_at, p.anc_value) for p in self._pending
+                  if p.patient_id == patient_id and start <= p.observed_at < observed_at]
+        earlier = sorted({t: v for t, v in rows + queued if t < observed_at}.items())
+        return anc_trend(earlier + [(observed_at, anc_value)], self.trend_window_days)
+
+    async def query(self, patient_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                    max_points: int = DEFAULT_MAX_POINTS) -> Dict[str, Any]:
+        """
+        A patient's points between `start` and `end` (epoch seconds, inclusive). Longer series are
+        downsampled in SQLite into at most `max_points` equal time buckets, each with the mean,
+        min (so a nadir is never averaged away) and max ANC and the number of samples.
+        """
+        if any(p.patient_id == patient_id for p in self._pending):
+            await self.flush()
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        return await asyncio.to_thread(self._db_query, patient_id, start, end, max(1, max_points))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS anc_history ("
+                "patient_id TEXT NOT NULL, observed_at REAL NOT NULL, anc_value REAL NOT NULL, "
+                "PRIMARY KEY (patient_id, observed_at)) WITHOUT ROWID"
+            )
+
+    def _db_insert(self, points: Sequence[HistoryPoint]) -> None:
+        with self._connect() as conn:
+            # Safe with WAL: a crash can lose the last commits but never corrupts the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # A point only replaces one at the same instant: observed_at defaults to the upload
+            # time, so uploading the same report again adds a second point
+            conn.executemany(
+                "INSERT OR REPLACE INTO anc_history (patient_id, observed_at, anc_value) VALUES (?, ?, ?)", points
+            )
+
+    def _db_insert_each(self, points: Sequence[HistoryPoint]) -> int:
+        """Insert points one statement each, skipping those the table rejects; returns how many were written."""
+        written = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for point in points:
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO anc_history (patient_id, observed_at, anc_value) VALUES (?, ?, ?)",
+                        point,
+                    )
+                    written += 1
+                except sqlite3.IntegrityError as e:
+                    # A failed statement is rolled back on its own; the transaction and other rows stand
+                    log(f"ANC history point for patient {point.patient_id} rejected: {str(e)}")
+        return written
+
+    def _db_points(self, patient_id: str, start: float, end: float) -> List[Tuple[float, float]]:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT observed_at, anc_value FROM anc_history "
+                "WHERE patient_id = ? AND observed_at BETWEEN ? AND ? ORDER BY observed_at",
+                (patient_id, start, end),
+            ).fetchall()
+
+    def _db_query(self, patient_id: str, start: float, end: float, max_points: int) -> Dict[str, Any]:
+        where = "WHERE patient_id = ? AND observed_at BETWEEN ? AND ?"
+        with self._connect() as conn:
+            count, first, last = conn.execute(
+                f"SELECT COUNT(*), MIN(observed_at), MAX(observed_at) FROM anc_history {where}",
+                (patient_id, start, end),
+            ).fetchone()
+            result: Dict[str, Any] = {"patient_id": patient_id, "count": count, "first_at": first,
+                                      "last_at": last, "downsampled": False, "bucket_seconds": None}
+            if count <= max_points:
+                rows = conn.execute(
+                    f"SELECT observed_at, anc_value FROM anc_history {where} ORDER BY observed_at",
+                    (patient_id, start, end),
+                ).fetchall()
+                result["points"] = [{"observed_at": t, "anc_value": v} for t, v in rows]
+                return result
+
+            width = (last - first) / max_points
+            rows = conn.execute(
+                "SELECT MIN(CAST((observed_at - ?) / ? AS INTEGER), ?) AS bucket, AVG(observed_at), "
+                f"AVG(anc_value), MIN(anc_value), MAX(anc_value), COUNT(*) FROM anc_history {where} "
+                "GROUP BY bucket ORDER BY bucket",
+                (first, width, max_points - 1, patient_id, start, end),
+            ).fetchall()
+        result["downsampled"], result["bucket_seconds"] = True, width
+        result["points"] = [
+            {"observed_at": t, "anc_value": round(mean, 1), "min": low, "max": high, "count": n}
+            for _, t, mean, low, high, n in rows
+        ]
+        return result
+
+
+_history: Optional[AncHistory] = None
+
+
+def get_anc_history() -> Optional[AncHistory]:
+    """Get or create the process-wide ANC history, or None when ANC_HISTORY_DB_PATH is not set."""
+    global _history
+    if _history is None:
+        db_path = os.getenv("ANC_HISTORY_DB_PATH")
+        if not db_path:
+            return None
+        _history = AncHistory(
+            db_path,
+            batch_size=int(os.getenv("ANC_HISTORY_BATCH_SIZE", str(DEFAULT_BATCH_SIZE))),
+            flush_interval=float(os.getenv("ANC_HISTORY_FLUSH_INTERVAL", str(DEFAULT_FLUSH_INTERVAL))),
+            max_pending=int(os.getenv("ANC_HISTORY_MAX_PENDING", str(DEFAULT_MAX_PENDING))),
+            trend_window_days=float(os.getenv("ANC_TREND_WINDOW_DAYS", str(DEFAULT_TREND_WINDOW_DAYS))),
+            token=os.getenv("ANC_HISTORY_TOKEN") or None,
+        )
+    return _history
+
+
+async def close_anc_history() -> None:
+    """Commit queued points at shutdown."""
+    if _history is not None:
+        await _history.close()
@@ -0,0 +1,130 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from analytes import ANALYTES, Analyte, is_excluded, label_pattern, to_canonical, unit_factor, unit_pattern
+from pdf_text import PDFSyntaxError, PDFTooLarge, iter_page_texts
+from tracing import log
+
+# Deterministic CBC reader for report text (the text layer of digital PDFs), following the
+# unit rules of prompts/anc_extraction_prompt.txt: K/µL, ×10³/µL and 10^9/L mean thousands,
+# commas are thousands separators, and percentages are not absolute counts. Labels and units
+# come from the analyte registry (analytes.py). Only a single unambiguous value with a known
+# unit counts as a match; everything else goes to the model.
+
+NEUTROPHIL_LABEL = label_pattern(ANALYTES["anc"])
+
+_NUMBER = re.compile(r"(?<![\w.,])(?P<value>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![\w])")
+# Context that disqualifies a number as the result: reference range bounds, percentages,
+# comparison limits and decimal commas ("2,03")
+_RANGE_BEFORE = re.compile(r"(?:[-–]|\bto)\s*$", re.IGNORECASE)
+_RANGE_AFTER = re.compile(r"\s*(?:[-–]|to\b)\s*\d", re.IGNORECASE)
+_LIMIT_BEFORE = re.compile(r"[<>≤≥]\s*$")
+_PERCENT_AFTER = re.compile(r"\s*%")
+_DECIMAL_COMMA_AFTER = re.compile(r",\d{1,2}(?!\d)")
+
+# ANC values above this (per microliter) are treated as misreads
+MAX_PLAUSIBLE_ANC = ANALYTES["anc"].max_plausible
+
+
+class LocalMatch(NamedTuple):
+    normalized: float                # in the analyte's canonical unit
+    value: float
+    unit: str
+    multiplier: float
+    line: str
+
+
+def _line_candidate(analyte: Analyte, line: str, label_end: int) -> Optional[LocalMatch]:
+    """The analyte's value on one labelled line, or None if it has no number with a known unit."""
+    units = list(unit_pattern(analyte).finditer(line, label_end))
+    if not units:
+        return None
+    for number in _NUMBER.finditer(line, label_end):
+        start, end = number.span()
+        if any(unit.start() <= start < unit.end() for unit in units):
+            continue
+        before, after = line[:start], line[end:]
+        if (_RANGE_BEFORE.search(before) or _RANGE_AFTER.match(after) or _LIMIT_BEFORE.search(before)
+                or _PERCENT_AFTER.match(after)):
+            continue
+        if _DECIMAL_COMMA_AFTER.match(after):
+            return None
+        unit = next((unit for unit in units if unit.start() >= end), units[0])
+        value = float(number.group("value").replace(",", ""))
+        multiplier = unit_factor(analyte, unit)
+        return LocalMatch(to_canonical(value, multiplier), value, unit.group().strip(), multiplier, line.strip())
+    return None
+
+
+def find_analyte_in_text(text: str, analyte: Analyte) -> Tuple[Optional[LocalMatch], str]:
+    """
+    Look for one analyte in report text.
+
+    Returns:
+        (match, outcome); outcome is "hit", "no_label" (no line names the analyte), "no_value"
+        (no number with a known unit, e.g. only a percentage) or "ambiguous" (several values)
+    """
+    candidates: List[LocalMatch] = []
+    labelled = False
+    label = label_pattern(analyte)
+    for line in text.splitlines():
+        found = label.search(line)
+        if found is None or is_excluded(analyte, line):
+            continue
+        labelled = True
+        candidate = _line_candidate(analyte, line, found.end())
+        if candidate is not None:
+            candidates.append(candidate)
+    if not labelled:
+        return None, "no_label"
+    if not candidates:
+        return None, "no_value"
+    if len({candidate.normalized for candidate in candidates}) > 1:
+        return None, "ambiguous"
+    if not 0 <= candidates[0].normalized <= analyte.max_plausible:
+        return None, "ambiguous"
+    return candidates[0], "hit"
+
+
+def find_anc_in_text(text: str) -> Tuple[Optional[LocalMatch], str]:
+    """find_analyte_in_text for the absolute neutrophil count."""
+    return find_analyte_in_text(text, ANALYTES["anc"])
+
+
+def find_panel_in_pdf(pdf_bytes: bytes, analytes: Sequence[Analyte],
+                      max_pages: Optional[int] = None) -> Tuple[Dict[str, Tuple[Optional[LocalMatch], str]], int]:
+    """
+    Read the PDF's text layer page by page and parse every analyte on the first page that
+    mentions neutrophils (the CBC table); later pages are never extracted.
+
+    Returns:
+        ({analyte key: (match, outcome)}, pages_read); outcomes are find_analyte_in_text's, or
+        "no_text" (no text layer, e.g. a scanned report, or one past a pdf_text budget such as
+        MAX_DECODED_BYTES or MAX_CONTENT_TOKENS) or "unreadable"
+    """
+    pages_read = 0
+    has_text = False
+    try:
+        for page_text in iter_page_texts(pdf_bytes, max_pages):
+            pages_read += 1
+            has_text = has_text or bool(page_text.strip())
+            if NEUTROPHIL_LABEL.search(page_text):
+                return {analyte.key: find_analyte_in_text(page_text, analyte) for analyte in analytes}, pages_read
+        outcome = "no_label" if has_text else "no_text"
+    except PDFTooLarge as e:
+        # Treated like a scan: the model reads the document, nothing here inflates or interprets it further
+        log(f"PDF text layer skipped: {e}")
+        outcome = "no_text"
+    except Exception as e:
+        # A damaged or exotic file is the model's job, never a failed upload
+        if not isinstance(e, PDFSyntaxError):
+            log(f"PDF text layer unreadable: {e!r}")
+        outcome = "unreadable"
+    return {analyte.key: (None, outcome) for analyte in analytes}, pages_read
+
+
+def find_anc_in_pdf(pdf_bytes: bytes, max_pages: Optional[int] = None) -> Tuple[Optional[LocalMatch], str, int]:
+    """find_panel_in_pdf for the absolute neutrophil count alone: (match, outcome, pages_read)."""
+    found, pages_read = find_panel_in_pdf(pdf_bytes, (ANALYTES["anc"],), max_pages)
+    match, outcome = found["anc"]
+    return match, outcome, pages_read
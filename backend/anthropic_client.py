@@ -0,0 +1,317 @@
+import asyncio
+import os
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from hedging import DEFAULT_MAX_EXTRA, DEFAULT_PERCENTILE, Hedger
+from metrics import MODEL_CALLS_IN_FLIGHT, MODEL_COST, MODEL_TOKENS
+from rate_limit import (
+    DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_BREAKER_RESET_SECONDS, DEFAULT_BURST,
+    DEFAULT_FAILURE_THRESHOLD, DEFAULT_RETRY_DEADLINE, AdaptiveRateLimiter, CircuitBreaker, call_with_retries
+)
+from tracing import log, record_stage, span
+
+if TYPE_CHECKING:
+    import anthropic
+    import httpx
+
+# Shared async Anthropic client for the whole worker process.
+# Set your API key in environment variable: ANTHROPIC_API_KEY or .env file
+# ANTHROPIC_MAX_CONCURRENCY      - how many model calls may be in flight at once
+# ANTHROPIC_MAX_CONNECTIONS      - connection pool size
+# ANTHROPIC_KEEPALIVE_SECONDS    - how long idle pooled connections are kept open
+# ANTHROPIC_CONNECT_TIMEOUT      - seconds to establish a connection
+# ANTHROPIC_READ_TIMEOUT         - seconds to wait for a response
+# ANTHROPIC_WARMUP_CONNECTIONS   - connections opened at startup, before /ready succeeds
+# ANTHROPIC_HEDGE                - "1" to duplicate calls slower than the recent p95
+# ANTHROPIC_HEDGE_PERCENTILE     - latency percentile after which a hedge is sent
+# ANTHROPIC_HEDGE_MAX_EXTRA      - cap on hedges as a share of all calls
+# ANTHROPIC_RATE_LIMIT_RPM       - starting client-side request rate (default: learned from the API's headers)
+# ANTHROPIC_RATE_LIMIT_BURST     - calls that may start back to back before the rate applies
+# ANTHROPIC_RETRY_DEADLINE       - seconds a model call may spend on retries (429/529/5xx) in total
+# ANTHROPIC_BACKOFF_BASE / _MAX  - full-jitter exponential backoff between retries, in seconds
+# ANTHROPIC_BREAKER_FAILURES     - consecutive upstream failures that open the circuit breaker
+# ANTHROPIC_BREAKER_RESET_SECONDS - how long an open breaker fails calls fast before probing again
+# The SDK (and httpx) are imported when the client is first built (by the startup warm-up, in a
+# thread), not with this module: they are most of the app's import time, which a cold start waits for.
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_WARMUP_CONNECTIONS = 4
+
+# USD per million input / output tokens, used to estimate spend
+MODEL_PRICES = {
+    "claude-haiku-4-5-20251001": (1.0, 5.0),
+    "claude-sonnet-4-5-20250929": (3.0, 15.0),
+    "claude-opus-4-1-20250805": (15.0, 75.0),
+}
+
+_anthropic_client: Optional["anthropic.AsyncAnthropic"] = None
+_anthropic_semaphore: Optional[asyncio.Semaphore] = None
+_hedger: Optional[Hedger] = None
+_rate_limiter: Optional[AdaptiveRateLimiter] = None
+_breaker: Optional[CircuitBreaker] = None
+
+
+def _import_sdk() -> None:
+    import anthropic  # noqa: F401
+
+
+def _http_client() -> "httpx.AsyncClient":
+    """Pooled HTTP client with explicit keep-alive, pool limits and timeouts."""
+    import anthropic
+    import httpx
+    from model_recordings import recording_transport
+
+    max_connections = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS)))
+    connect_timeout = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", str(DEFAULT_CONNECT_TIMEOUT)))
+    read_timeout = float(os.getenv("ANTHROPIC_READ_TIMEOUT", str(DEFAULT_READ_TIMEOUT)))
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=float(os.getenv("ANTHROPIC_KEEPALIVE_SECONDS", str(DEFAULT_KEEPALIVE_SECONDS))),
+    )
+    # MODEL_RECORDINGS_MODE=record/replay puts the recording transport under the client
+    transport = recording_transport(limits)
+    return anthropic.DefaultAsyncHttpxClient(
+        limits=limits,
+        # The pool timeout covers waiting for a free connection when all are busy
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout),
+        **({"transport": transport} if transport is not None else {}),
+    )
+
+
+def get_anthropic_client() -> Optional["anthropic.AsyncAnthropic"]:
+    """Get or create the shared async Anthropic client if API key is available."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        api_key = os.getenv("ANTHROPIC_API_KEY", "")
+        if api_key:
+            import anthropic
+
+            try:
+                # Retries are handled by create_message (rate limiter, backoff, circuit breaker)
+                _anthropic_client = anthropic.AsyncAnthropic(
+                    api_key=api_key, http_client=_http_client(), max_retries=0
+                )
+            except Exception as e:
+                log(f"Warning: Could not initialize Anthropic client: {e}")
+                return None
+        else:
+            log("Warning: ANTHROPIC_API_KEY not found in environment variables or .env file")
+    return _anthropic_client
+
+
+def estimate_cost(model: str, usage: Optional[Dict[str, int]]) -> float:
+    """Estimated USD cost of a call from its token usage (0 for unknown models)."""
+    if not usage or model not in MODEL_PRICES:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[model]
+    return (usage.get("input_tokens", 0) * input_price + usage.get("output_tokens", 0) * output_price) / 1e6
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _anthropic_semaphore
+    if _anthropic_semaphore is None:
+        limit = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY)))
+        _anthropic_semaphore = asyncio.Semaphore(max(1, limit))
+    return _anthropic_semaphore
+
+
+def _get_hedger() -> Optional[Hedger]:
+    global _hedger
+    if _hedger is None and os.getenv("ANTHROPIC_HEDGE", "0") == "1":
+        _hedger = Hedger(
+            percentile=float(os.getenv("ANTHROPIC_HEDGE_PERCENTILE", str(DEFAULT_PERCENTILE))),
+            max_extra=float(os.getenv("ANTHROPIC_HEDGE_MAX_EXTRA", str(DEFAULT_MAX_EXTRA))),
+        )
+    return _hedger
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        rpm = os.getenv("ANTHROPIC_RATE_LIMIT_RPM")
+        _rate_limiter = AdaptiveRateLimiter(
+            rate=float(rpm) / 60.0 if rpm else None,
+            burst=float(os.getenv("ANTHROPIC_RATE_LIMIT_BURST", str(DEFAULT_BURST))),
+        )
+    return _rate_limiter
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("ANTHROPIC_BREAKER_FAILURES", str(DEFAULT_FAILURE_THRESHOLD))),
+            reset_timeout=float(os.getenv("ANTHROPIC_BREAKER_RESET_SECONDS", str(DEFAULT_BREAKER_RESET_SECONDS))),
+        )
+    return _breaker
+
+
+def upstream_stats() -> Dict[str, Dict[str, Any]]:
+    """Current rate limiter and circuit breaker state, for /metrics."""
+    return {"rate_limiter": get_rate_limiter().stats(), "circuit_breaker": get_circuit_breaker().stats()}
+
+
+async def create_message(client: "anthropic.AsyncAnthropic", **kwargs: Any) -> Any:
+    """
+    Send a Messages API request without blocking the event loop.
+    At most ANTHROPIC_MAX_CONCURRENCY calls run at once; the rest wait their turn.
+    Time spent waiting for a slot and the round-trip itself are recorded as separate stages.
+    With hedging on, a call slower than the recent p95 for the same model and token budget
+    gets a duplicate (sharing its concurrency slot, and only if the rate limiter has a token
+    to spare right away) and the first answer wins.
+    Calls pass a client-side rate limiter and circuit breaker; 429/529/5xx answers are retried
+    with jittered backoff until ANTHROPIC_RETRY_DEADLINE, after which (or while the breaker is
+    open) rate_limit.UpstreamUnavailable is raised.
+    """
+    import httpx
+
+    hedger = _get_hedger()
+    read_timeout = float(os.getenv("ANTHROPIC_READ_TIMEOUT", str(DEFAULT_READ_TIMEOUT)))
+    connect_timeout = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", str(DEFAULT_CONNECT_TIMEOUT)))
+
+    async def attempt(remaining: float) -> Any:
+        # No single attempt may outlive the retry deadline
+        connect = min(connect_timeout, remaining)
+        options = dict(kwargs, timeout=httpx.Timeout(min(read_timeout, remaining), connect=connect, pool=connect))
+        queued = time.perf_counter()
+        async with _get_semaphore():
+            record_stage("model_queue", time.perf_counter() - queued)
+            MODEL_CALLS_IN_FLIGHT.inc()
+            try:
+                with span("model_call"):
+                    if hedger is None:
+                        return await client.messages.with_raw_response.create(**options)
+                    return await hedger.run(
+                        (kwargs.get("model"), kwargs.get("max_tokens")),
+                        lambda: client.messages.with_raw_response.create(**options),
+                        admit=get_rate_limiter().try_acquire,
+                    )
+            finally:
+                MODEL_CALLS_IN_FLIGHT.dec()
+
+    response = await call_with_retries(
+        attempt, get_rate_limiter(), get_circuit_breaker(),
+        deadline_seconds=float(os.getenv("ANTHROPIC_RETRY_DEADLINE", str(DEFAULT_RETRY_DEADLINE))),
+        backoff_base=float(os.getenv("ANTHROPIC_BACKOFF_BASE", str(DEFAULT_BACKOFF_BASE))),
+        backoff_max=float(os.getenv("ANTHROPIC_BACKOFF_MAX", str(DEFAULT_BACKOFF_MAX))),
+    )
+    message = response.parse()
+    _record_usage(kwargs.get("model", ""), message)
+    return message
+
+
+class StreamInterrupted(Exception):
+    """A streamed response broke off after events were delivered; it is not retried."""
+
+
+async def stream_message(client: "anthropic.AsyncAnthropic", on_event: Callable[[Any], None],
+                         **kwargs: Any) -> Any:
+    """
+    create_message for the streaming Messages API: each stream event (text and input_json
+    deltas with their snapshots, content_block_stop, ...) is passed to `on_event` as it arrives,
+    and the accumulated Message is returned at the end. The concurrency limit, rate limiter,
+    breaker and retries are the same, but only failures before the response starts are retried
+    (a retry would deliver the events again), and streams are never hedged.
+    """
+    import anthropic
+    import httpx
+    from anthropic.lib.streaming import AsyncMessageStream
+
+    read_timeout = float(os.getenv("ANTHROPIC_READ_TIMEOUT", str(DEFAULT_READ_TIMEOUT)))
+    connect_timeout = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", str(DEFAULT_CONNECT_TIMEOUT)))
+    streamed: Dict[str, Any] = {}
+
+    async def attempt(remaining: float) -> Any:
+        connect = min(connect_timeout, remaining)
+        options = dict(kwargs, timeout=httpx.Timeout(min(read_timeout, remaining), connect=connect, pool=connect))
+        queued = time.perf_counter()
+        async with _get_semaphore():
+            record_stage("model_queue", time.perf_counter() - queued)
+            MODEL_CALLS_IN_FLIGHT.inc()
+            try:
+                with span("model_call"):
+                    started = time.perf_counter()
+                    response = await client.messages.with_raw_response.create(stream=True, **options)
+                    stream = AsyncMessageStream(response.parse(), output_format=anthropic.NOT_GIVEN)
+                    try:
+                        first = True
+                        async for event in stream:
+                            if first and event.type in ("text", "input_json"):
+                                record_stage("model_first_token", time.perf_counter() - started)
+                                first = False
+                            on_event(event)
+                        streamed["message"] = await stream.get_final_message()
+                    except Exception as e:
+                        raise StreamInterrupted(f"Model response stream broke off: {e}") from e
+                    finally:
+                        await stream.close()
+                return response
+            finally:
+                MODEL_CALLS_IN_FLIGHT.dec()
+
+    await call_with_retries(
+        attempt, get_rate_limiter(), get_circuit_breaker(),
+        deadline_seconds=float(os.getenv("ANTHROPIC_RETRY_DEADLINE", str(DEFAULT_RETRY_DEADLINE))),
+        backoff_base=float(os.getenv("ANTHROPIC_BACKOFF_BASE", str(DEFAULT_BACKOFF_BASE))),
+        backoff_max=float(os.getenv("ANTHROPIC_BACKOFF_MAX", str(DEFAULT_BACKOFF_MAX))),
+    )
+    message = streamed["message"]
+    _record_usage(kwargs.get("model", ""), message)
+    return message
+
+
+def _record_usage(model: str, message: Any) -> None:
+    usage = getattr(message, "usage", None)
+    if usage is not None:
+        MODEL_TOKENS.observe(usage.input_tokens, model=model, direction="input")
+        MODEL_TOKENS.observe(usage.output_tokens, model=model, direction="output")
+        MODEL_COST.inc(
+            estimate_cost(model, {"input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens}),
+            model=model
+        )
+
+
+async def warm_up_anthropic_client() -> Dict[str, Any]:
+    """
+    Create the shared client and open ANTHROPIC_WARMUP_CONNECTIONS pooled connections
+    (DNS, TCP and TLS) with cheap concurrent model-list requests, so the first uploads
+    after a deploy or cold start do not pay for them. Never raises; returns a summary.
+    """
+    started = time.perf_counter()
+    # The SDK import takes most of a second of CPU; in a thread, requests are served meanwhile
+    await asyncio.to_thread(_import_sdk)
+    client = get_anthropic_client()
+    if client is None:
+        return {"status": "unavailable", "connections": 0, "elapsed_ms": 0.0}
+    count = max(0, int(os.getenv("ANTHROPIC_WARMUP_CONNECTIONS", str(DEFAULT_WARMUP_CONNECTIONS))))
+    results = await asyncio.gather(
+        *[client.models.list(limit=1) for _ in range(count)], return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    summary = {
+        "status": "warm" if not errors else "degraded",
+        "connections": count - len(errors),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if errors:
+        summary["error"] = str(errors[0])
+        log(f"Warning: Anthropic client warm-up failed: {errors[0]}")
+    return summary
+
+
+async def close_anthropic_client() -> None:
+    """Close the shared client and release its connection pool."""
+    global _anthropic_client, _anthropic_semaphore, _hedger, _rate_limiter, _breaker
+    client = _anthropic_client
+    _anthropic_client = None
+    _anthropic_semaphore = None
+    _hedger = None
+    _rate_limiter = None
+    _breaker = None
+    if client is not None:
+        await client.close()
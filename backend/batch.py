@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+import zipfile
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, IO, List, NamedTuple, Tuple
+
+from tracing import log
+
+# Batch processing of many reports in one request.
+# BATCH_CONCURRENCY - reports from one batch processed at the same time
+# BATCH_MAX_FILES   - reports accepted in one batch (zip entries included)
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_FILES = 500
+DEFAULT_MAX_FILE_BYTES = 20 * 1024 * 1024
+
+ReportHandler = Callable[[bytes, str, str], Awaitable[Dict[str, Any]]]
+
+
+class BatchItem(NamedTuple):
+    """One report in a batch; `load` returns its contents and content type."""
+    file_name: str
+    load: Callable[[], Awaitable[Tuple[bytes, str]]]
+
+
+def is_zip_upload(content_type: str, file_name: str) -> bool:
+    return content_type in ("application/zip", "application/x-zip-compressed") or file_name.lower().endswith(".zip")
+
+
+def items_from_zip(fileobj: IO[bytes], sniff: Callable[[bytes], str],
+                   max_file_bytes: int = DEFAULT_MAX_FILE_BYTES) -> List[BatchItem]:
+    """
+    Expand a zip archive into batch items, one per regular file.
+    Entries are decompressed lazily, and entries whose declared size exceeds
+    `max_file_bytes` fail on their own instead of being inflated.
+    Raises zipfile.BadZipFile if the archive cannot be read.
+    """
+    archive = zipfile.ZipFile(fileobj)
+    items = []
+    for info in archive.infolist():
+        base_name = info.filename.rsplit("/", 1)[-1]
+        if info.is_dir() or base_name.startswith(".") or info.filename.startswith("__MACOSX/"):
+            continue
+
+        async def load(info: zipfile.ZipInfo = info) -> Tuple[bytes, str]:
+            if info.file_size > max_file_bytes:
+                raise ValueError(f"File is larger than the {max_file_bytes} byte limit")
+            contents = await asyncio.to_thread(archive.read, info)
+            return contents, sniff(contents)
+
+        items.append(BatchItem(info.filename, load))
+    return items
+
+
+async def run_batch(items: List[BatchItem], handler: ReportHandler,
+                    concurrency: int = DEFAULT_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Process batch items with at most `concurrency` in flight, yielding one record per item
+    in completion order. A failing item yields a "failed" record and never stops the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index: int, item: BatchItem) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            record: Dict[str, Any] = {"index": index, "file_name": item.file_name}
+            try:
+                contents, content_type = await item.load()
+                record["result"] = await handler(contents, content_type, item.file_name)
+                record["status"] = "succeeded"
+            except Exception as e:
+                log(f"Batch item {item.file_name} failed: {str(e)}")
+                record["status"] = "failed"
+                record["error"] = str(e)
+            record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return record
+
+    tasks = [asyncio.create_task(run_one(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away or the stream was closed early: stop the remaining work
+        for task in tasks:
+            task.cancel()
+
+
+async def stream_batch_ndjson(items: List[BatchItem], handler: ReportHandler,
+                              concurrency: int = DEFAULT_CONCURRENCY) -> AsyncIterator[bytes]:
+    """
+    NDJSON stream of per-item records as they complete, followed by a summary line.
+    """
+    started = time.perf_counter()
+    counts = {"succeeded": 0, "failed": 0}
+    async for record in run_batch(items, handler, concurrency):
+        counts[record["status"]] += 1
+        yield (json.dumps(record) + "\n").encode("utf-8")
+
+    summary = {
+        "total": len(items),
+        **counts,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    yield (json.dumps({"summary": summary}) + "\n").encode("utf-8")
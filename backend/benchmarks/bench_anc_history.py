@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+ANC history store: write throughput, request-path cost, and query latency at millions of rows.
+
+Fills a SQLite history with `--patients` series of `--points` CBCs each (one every two to four
+days), plus one patient monitored hourly for years, then measures:
+  - commits: points per second written one per transaction vs in batches of the writer's size
+  - record(): what an upload pays to queue a point (the write itself happens in the background)
+  - trend window, a whole typical series, and the heavy series downsampled to `--max-points`,
+    each as p50/p99 over random patients
+
+    python benchmarks/bench_anc_history.py
+    python benchmarks/bench_anc_history.py --patients 50000 --points 40 --db /tmp/history.sqlite3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Tuple
+
+from load_test import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anc_history import DAY, DEFAULT_BATCH_SIZE, AncHistory  # noqa: E402
+
+HEAVY_PATIENT = "heavy"
+
+
+def series(rng: random.Random, points: int) -> List[Tuple[float, float]]:
+    """A patient's CBCs: chemotherapy cycles pulling the ANC down to a nadir and back."""
+    observed_at, rows = 1.7e9 + rng.uniform(0, 30 * DAY), []
+    for i in range(points):
+        rows.append((observed_at, round(max(50.0, 3000 - 2500 * abs(((i % 7) - 3) / 3) ** 0.5 + rng.gauss(0, 150)))))
+        observed_at += rng.uniform(2, 4) * DAY
+    return rows
+
+
+def fill(history: AncHistory, patients: int, points: int, heavy_points: int, rng: random.Random) -> float:
+    started = time.perf_counter()
+    batch: List[Tuple[str, float, float]] = []
+    for patient in range(patients):
+        batch.extend((f"patient-{patient}", t, v) for t, v in series(rng, points))
+        if len(batch) >= 50_000:
+            history._db_insert(batch)
+            batch = []
+    batch.extend((HEAVY_PATIENT, 1.6e9 + hour * 3600.0, 500 + 2000 * rng.random()) for hour in range(heavy_points))
+    history._db_insert(batch)
+    return time.perf_counter() - started
+
+
+def commit_rate(history: AncHistory, batch_size: int, total: int, rng: random.Random) -> float:
+    rows = [(f"writer-{batch_size}", 1.9e9 + i, rng.uniform(100, 4000)) for i in range(total)]
+    started = time.perf_counter()
+    for i in range(0, total, batch_size):
+        history._db_insert(rows[i:i + batch_size])
+    return total / (time.perf_counter() - started)
+
+
+async def time_calls(call: Callable[[], Awaitable[object]], repeat: int) -> Tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return percentile(timings, 0.5), percentile(timings, 0.99)
+
+
+async def measure(history: AncHistory, patients: int, points: int, max_points: int, rng: random.Random) -> None:
+    # Queueing a point: the whole cost an upload pays for the history write
+    started = time.perf_counter()
+    for i in range(10_000):
+        history.record(f"patient-{i % patients}", 2.0e9 + i, 1000.0)
+    record_us = (time.perf_counter() - started) * 1e6 / 10_000
+    flush_started = time.perf_counter()
+    await history.flush()
+    flush_s = time.perf_counter() - flush_started
+    print(f"record(): {record_us:.1f} µs per point on the request path; "
+          f"background flush of 10,000 points in {flush_s * 1000:.0f} ms")
+
+    def patient() -> str:
+        return f"patient-{rng.randrange(patients)}"
+
+    async def trend() -> object:
+        return await history.trend(patient(), 1.7e9 + points * 3 * DAY * rng.random(), 1200.0)
+
+    async def whole_series() -> object:
+        return await history.query(patient())
+
+    async def heavy() -> object:
+        return await history.query(HEAVY_PATIENT, max_points=max_points)
+
+    print(f"\n{'query (ms)':<40}{'p50':>8}{'p99':>8}")
+    for label, call in ((f"trend ({history.trend_window_days:g}-day window)", trend),
+                        (f"whole series ({points} points)", whole_series),
+                        (f"heavy series -> {max_points} buckets", heavy)):
+        p50, p99 = await time_calls(call, 300)
+        print(f"{label:<40}{p50:>8.2f}{p99:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--points", type=int, default=100, help="CBCs per patient")
+    parser.add_argument("--heavy-points", type=int, default=100_000, help="points of the hourly monitored patient")
+    parser.add_argument("--max-points", type=int, default=500)
+    parser.add_argument("--db", help="SQLite file to create (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(18)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = args.db or os.path.join(directory, "anc_history.sqlite3")
+        history = AncHistory(db_path)
+        fill_s = fill(history, args.patients, args.points, args.heavy_points, rng)
+        rows = args.patients * args.points + args.heavy_points
+        print(f"history: {rows:,} points, loaded in {fill_s:.1f} s, "
+              f"{os.path.getsize(db_path) / 1e6:.0f} MB on disk")
+
+        print(f"\n{'commits':<40}{'points/s':>12}")
+        for batch_size in (1, 16, DEFAULT_BATCH_SIZE):
+            print(f"{f'{batch_size} per transaction':<40}{commit_rate(history, batch_size, 2000, rng):>12,.0f}")
+
+        asyncio.run(measure(history, args.patients, args.points, args.max_points, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Average latency and estimated spend per report: single model vs the two-tier cascade.
+
+Runs process_medical_report over synthetic report photos against the local fake Anthropic
+API (base latency plus a per-output-token delay, image input tokens estimated from pixel
+count). The first-pass answers follow a configurable mix of clean reads, values near a
+severity cutoff, unclear images and low-confidence reads, so the escalation rate - and
+with it the cascade's savings - can be explored offline.
+
+    python benchmarks/bench_cascade.py
+    python benchmarks/bench_cascade.py --reports 100 --unsure 0.3 --escalation-model claude-sonnet-4-5-20250929
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from PIL import Image
+
+from compare_extraction_modes import FAKE_REASONING_RESPONSE
+from fake_anthropic import FakeAnthropicServer
+from load_test import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every report must reach the model, so keep the result cache out of the measurement
+os.environ["ANC_CACHE_MAX_ENTRIES"] = "0"
+os.environ.pop("ANC_CACHE_DB_PATH", None)
+
+import anthropic_client  # noqa: E402
+from report_processor import ANC_EXTRACTION_MODEL, process_medical_report  # noqa: E402
+
+CLEAN = {"value": 2.03, "unit": "K/uL", "multiplier": 1000, "status": "success", "confidence": 0.95}
+UNSURE_READS = [
+    {"value": 0.98, "unit": "K/uL", "multiplier": 1000, "status": "success", "confidence": 0.9},
+    {"value": None, "unit": None, "multiplier": 1, "status": "unclear", "confidence": 0.3},
+    {"value": 2.03, "unit": "K/uL", "multiplier": 1000, "status": "success", "confidence": 0.5},
+]
+
+
+def phone_photo(seed: int) -> bytes:
+    image = Image.effect_noise((3000, 2250), 25).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue() + seed.to_bytes(4, "big")
+
+
+async def run(reports: List[bytes], concurrency: int) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = []
+
+    async def one(contents: bytes) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            parsed = await process_medical_report(contents, "image/jpeg", "cbc.jpg")
+            rows.append({"seconds": time.perf_counter() - started, "anc_extraction": parsed["anc_extraction"]})
+
+    try:
+        await asyncio.gather(*[one(contents) for contents in reports])
+    finally:
+        await anthropic_client.close_anthropic_client()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=40)
+    parser.add_argument("--unsure", type=float, default=0.2, help="share of first-pass reads that should escalate")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--escalation-model", default=ANC_EXTRACTION_MODEL)
+    parser.add_argument("--latency", type=float, default=0.4, help="fake API base latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.006, help="fake API seconds per output token")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    fake = FakeAnthropicServer(latency=args.latency, answer_text=FAKE_REASONING_RESPONSE,
+                               token_latency=args.token_latency)
+    unsure = round(args.unsure * args.reports)
+    fake.tool_inputs = [UNSURE_READS[i % len(UNSURE_READS)] for i in range(unsure)] + [CLEAN] * (args.reports - unsure)
+    rng.shuffle(fake.tool_inputs)
+    fake.start()
+    os.environ.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url,
+                      ANC_CASCADE_ESCALATION_MODEL=args.escalation_model)
+    reports = [phone_photo(i) for i in range(args.reports)]
+
+    results = {}
+    try:
+        for label, cascade in (("single model", "0"), ("cascade", "1")):
+            os.environ["ANC_CASCADE"] = cascade
+            results[label] = asyncio.run(run(reports, args.concurrency))
+    finally:
+        fake.stop()
+
+    print(f"reports: {args.reports}  unsure first passes: {args.unsure:.0%}  escalation model: {args.escalation_model}")
+    print(f"{'':<14}{'mean ms':>10}{'p95 ms':>10}{'USD/report':>12}{'escalated':>11}")
+    for label, rows in results.items():
+        latencies = sorted(row["seconds"] * 1000 for row in rows)
+        if label == "cascade":
+            costs = [row["anc_extraction"]["cascade"]["cost_usd"] for row in rows]
+            escalated = sum(row["anc_extraction"]["cascade"]["tier"] == 2 for row in rows) / len(rows)
+        else:
+            costs = [anthropic_client.estimate_cost(ANC_EXTRACTION_MODEL, row["anc_extraction"]["usage"]) for row in rows]
+            escalated = 0.0
+        p95 = percentile(latencies, 0.95)
+        print(f"{label:<14}{statistics.mean(latencies):>10.0f}{p95:>10.0f}{statistics.mean(costs):>12.6f}"
+              f"{escalated:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
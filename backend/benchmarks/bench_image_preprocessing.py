@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark the image pre-processing stage.
+
+Reports, per sample image, the request payload (base64) before and after pre-processing,
+the time spent in each pre-processing step, and the estimated upload time saved.
+
+Usage:
+    python benchmarks/bench_image_preprocessing.py                  # synthetic 12 MP report photos
+    python benchmarks/bench_image_preprocessing.py photo1.jpg ...   # your own sample images
+    python benchmarks/bench_image_preprocessing.py --uplink-mbps 2
+"""
+
+import argparse
+import base64
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_preprocessing import preprocess_image  # noqa: E402
+
+
+def synthetic_report_photo(seed: int, size=(4032, 3024)) -> bytes:
+    """A phone-camera-like photo of a printed CBC table: tinted paper, sensor noise, dense text."""
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 24).convert("RGB")
+    paper = Image.new("RGB", size, (238, 232, 220))
+    image = Image.blend(paper, image, 0.25)
+    draw = ImageDraw.Draw(image)
+    for row in range(60):
+        y = 120 + row * 45
+        for col in range(6):
+            x = 150 + col * 620
+            text = f"{rng.choice(['WBC', 'ANC', 'HGB', 'PLT', 'RBC'])} {rng.uniform(0.5, 9.9):.2f} K/uL"
+            draw.text((x, y), text, fill=(20, 20, 30))
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.save(buffer, format="JPEG", quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="sample images (default: synthetic photos)")
+    parser.add_argument("--samples", type=int, default=5, help="number of synthetic photos")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per image")
+    parser.add_argument("--uplink-mbps", type=float, default=5.0, help="uplink bandwidth for upload estimates")
+    args = parser.parse_args()
+
+    if args.images:
+        samples = [(Path(p).name, Path(p).read_bytes()) for p in args.images]
+    else:
+        samples = [(f"synthetic-{i}.jpg", synthetic_report_photo(i)) for i in range(args.samples)]
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    print(f"{'image':<22}{'payload in':>12}{'payload out':>13}{'ratio':>8}{'prep ms':>9}{'upload saved ms':>17}")
+    step_totals = {}
+    net_savings = []
+    for name, data in samples:
+        durations = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            output, _, stats = preprocess_image(data)
+            durations.append((time.perf_counter() - started) * 1000)
+            for step, ms in stats["timings_ms"].items():
+                step_totals.setdefault(step, []).append(ms)
+        payload_in = len(base64.b64encode(data))
+        payload_out = len(base64.b64encode(output))
+        prep_ms = statistics.median(durations)
+        saved_ms = (payload_in - payload_out) / bytes_per_second * 1000
+        net_savings.append(saved_ms - prep_ms)
+        print(
+            f"{name:<22}{payload_in / 1e6:>10.2f}MB{payload_out / 1e6:>11.2f}MB"
+            f"{payload_in / payload_out:>7.1f}x{prep_ms:>9.1f}{saved_ms:>17.0f}"
+        )
+
+    print("\nmedian time per step (ms):")
+    for step, values in step_totals.items():
+        print(f"  {step:<18}{statistics.median(values):>8.2f}")
+    print(f"\nmedian net latency saving per upload at {args.uplink_mbps} Mbit/s: "
+          f"{statistics.median(net_savings):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash near-duplicate detection: accuracy and lookup latency.
+
+Accuracy: renders synthetic CBC reports and copies each one the ways a report gets re-sent
+(re-encoded at a lower resolution, a bordered screenshot, a new photo with a small tilt,
+crop, blur and different lighting). For every hash function and Hamming threshold it
+reports how many copies match their original, and how often a *different* report matches:
+one from another lab layout, and the dangerous case, the next patient's report on the
+same lab's layout.
+
+Latency: fills the multi-index Hamming index with random hashes and times lookups that
+miss and lookups of stored hashes with a few flipped bits, against a linear scan.
+
+    python benchmarks/bench_near_duplicates.py
+    python benchmarks/bench_near_duplicates.py --reports 40 --entries 1000000
+"""
+
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+from load_test import percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from near_duplicates import HASH_BITS, HASH_FUNCTIONS, HammingIndex, photo_hash  # noqa: E402
+
+TESTS = ("WBC", "RBC", "Hemoglobin", "Hematocrit", "MCV", "Neutrophils %", "Neutrophils, Absolute",
+         "Lymphocytes, Absolute", "Monocytes", "Eosinophils", "Platelets", "MPV")
+
+
+def render_report(rng: random.Random, layout: int) -> Image.Image:
+    """A CBC report page; `layout` fixes the lab's header, row order and column positions."""
+    layout_rng = random.Random(layout)
+    rows = list(TESTS)
+    layout_rng.shuffle(rows)
+    columns = [60, layout_rng.randint(380, 520), layout_rng.randint(650, 760), layout_rng.randint(900, 1000)]
+    header_height = layout_rng.randint(120, 260)
+    image = Image.new("L", (1240, 1754), 255)
+    draw = ImageDraw.Draw(image)
+    title_font = ImageFont.load_default(size=layout_rng.randint(40, 56))
+    font = ImageFont.load_default(size=30)
+    draw.rectangle((0, 0, 1240, header_height), fill=layout_rng.randint(150, 230))
+    draw.text((60, 40), f"Laboratory {layout} - Complete Blood Count", font=title_font, fill=0)
+    draw.text((60, header_height + 30), f"Patient: {rng.randint(10000, 99999)}  Age: {rng.randint(2, 80)}",
+              font=font, fill=0)
+    y = header_height + 110
+    for name in rows:
+        draw.text((columns[0], y), name, font=font, fill=0)
+        draw.text((columns[1], y), f"{rng.uniform(0.2, 400):.1f}", font=font, fill=0)
+        draw.text((columns[2], y), "ref", font=font, fill=60)
+        draw.text((columns[3], y), "K/uL", font=font, fill=0)
+        draw.line((40, y + 50, 1200, y + 50), fill=200, width=2)
+        y += 95
+    return image
+
+
+def retake(image: Image.Image, rng: random.Random) -> Image.Image:
+    """The same page photographed again: tilted, cropped, rescaled, blurred, lit differently."""
+    width, height = image.size
+    photo = image.rotate(rng.uniform(-3, 3), resample=Image.Resampling.BICUBIC, expand=False, fillcolor=235)
+    dx, dy = int(width * rng.uniform(0, 0.04)), int(height * rng.uniform(0, 0.04))
+    photo = photo.crop((dx, dy, width - int(width * rng.uniform(0, 0.04)), height - int(height * rng.uniform(0, 0.04))))
+    scale = rng.uniform(0.5, 1.2)
+    photo = photo.resize((int(photo.width * scale), int(photo.height * scale)), Image.Resampling.BILINEAR)
+    photo = photo.filter(ImageFilter.GaussianBlur(rng.uniform(0, 2)))
+    photo = ImageEnhance.Brightness(photo).enhance(rng.uniform(0.8, 1.15))
+    return ImageEnhance.Contrast(photo).enhance(rng.uniform(0.8, 1.2))
+
+
+def screenshot(image: Image.Image, rng: random.Random) -> Image.Image:
+    """A screenshot of the report shown in a viewer: smaller, with a border around it."""
+    page = image.resize((image.width // 2, image.height // 2), Image.Resampling.LANCZOS)
+    border = rng.randint(10, 40)
+    canvas = Image.new("L", (page.width + 2 * border, page.height + 2 * border), 90)
+    canvas.paste(page, (border, border))
+    return canvas
+
+
+def jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def accuracy(reports: int, thresholds: List[int], rng: random.Random) -> None:
+    originals: List[bytes] = []
+    # Same report: should match
+    same = {"re-encoded": [], "screenshot": [], "retake": []}
+    # Different report: must not match
+    different = {"same layout": [], "same layout, photo": [], "other layout": []}
+    for i in range(reports):
+        layout = i % max(2, reports // 4)
+        report = render_report(random.Random(i), layout)
+        originals.append(jpeg(report))
+        same["re-encoded"].append(jpeg(report.resize((report.width * 3 // 4, report.height * 3 // 4)), 60))
+        same["screenshot"].append(jpeg(screenshot(report, rng)))
+        same["retake"].append(jpeg(retake(report, rng), rng.randint(60, 90)))
+        # The next patient's report from the same lab, as a PDF export and as a photo
+        next_patient = render_report(random.Random(10_000 + i), layout)
+        different["same layout"].append(jpeg(next_patient))
+        different["same layout, photo"].append(jpeg(retake(next_patient, rng), 80))
+        different["other layout"].append(jpeg(retake(render_report(random.Random(20_000 + i), 1000 + i), rng), 80))
+
+    print(f"accuracy: {reports} reports; share of pairs within each Hamming distance of the original")
+    categories = {**same, **different}
+    for name in HASH_FUNCTIONS:
+        started = time.perf_counter()
+        original_hashes = [photo_hash(contents, name) for contents in originals]
+        hash_ms = (time.perf_counter() - started) * 1000 / len(originals)
+        distances = {
+            category: [hamming(original_hashes[i], photo_hash(contents, name)) for i, contents in enumerate(photos)]
+            for category, photos in categories.items()
+        }
+        print(f"\n{name} ({hash_ms:.1f} ms per photo)   same report: {', '.join(same)}   "
+              f"different report: {', '.join(different)}")
+        print(f"{'threshold':>10}" + "".join(f"{category:>20}" for category in categories))
+        print(f"{'median':>10}" + "".join(f"{statistics.median(d):>20}" for d in distances.values()))
+        for threshold in thresholds:
+            print(f"{threshold:>10}" + "".join(
+                f"{sum(distance <= threshold for distance in d) / len(d):>20.0%}" for d in distances.values()
+            ))
+
+
+def time_queries(search: Callable[[int], object], queries: List[int]) -> Tuple[float, float]:
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return percentile(timings, 0.5), percentile(timings, 0.99)
+
+
+def latency(entries: int, max_distance: int, rng: random.Random) -> None:
+    index = HammingIndex(max_distance=max_distance, max_entries=entries)
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(entries)]
+    started = time.perf_counter()
+    for i, value in enumerate(stored):
+        index.add(value, i)
+    build_s = time.perf_counter() - started
+
+    def flipped(value: int) -> int:
+        for bit in rng.sample(range(HASH_BITS), rng.randint(0, max_distance)):
+            value ^= 1 << bit
+        return value
+
+    misses = [rng.getrandbits(HASH_BITS) for _ in range(2000)]
+    hits = [flipped(rng.choice(stored)) for _ in range(2000)]
+    assert all(index.search(query) is not None for query in hits)
+
+    def linear_scan(query: int) -> object:
+        return min(((hamming(value, query), value) for value in stored), default=None)
+
+    print(f"\nlatency: {entries:,} hashes, radius {max_distance}, index built in {build_s:.1f} s")
+    print(f"{'':<24}{'p50 µs':>10}{'p99 µs':>10}")
+    for label, search, queries in (("index, miss", index.search, misses), ("index, hit", index.search, hits),
+                                   ("linear scan", linear_scan, misses[:5])):
+        p50, p99 = time_queries(search, queries)
+        print(f"{label:<24}{p50:>10.1f}{p99:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=24)
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[0, 2, 4, 6, 8, 10, 12])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--max-distance", type=int, nargs="+", default=[4, 7])
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    accuracy(args.reports, args.thresholds, rng)
+    for max_distance in args.max_distance:
+        latency(args.entries, max_distance, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CBC panel extraction: one record_cbc_panel call vs the single-analyte ANC call.
+
+Sends synthetic report photos to the local fake Anthropic API (fixed latency plus a delay per
+output token) three ways: the ANC alone with the structured record_anc call, the whole panel
+(ANC, WBC, hemoglobin, platelets) in one record_cbc_panel call, and one record_anc-sized call
+per analyte, which is what reading the panel analyte by analyte would cost.
+
+    python benchmarks/bench_panel_extraction.py
+    python benchmarks/bench_panel_extraction.py --reports 100 --latency 0.8 --token-latency 0.006
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import percentile, sample_report_photo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every call must reach the model, so keep the result cache out of the measurement
+os.environ["ANC_CACHE_MAX_ENTRIES"] = "0"
+os.environ.pop("ANC_CACHE_DB_PATH", None)
+
+import anthropic_client  # noqa: E402
+from analytes import ANALYTES  # noqa: E402
+from report_processor import extract_anc_from_cbc_image  # noqa: E402
+
+PANEL = tuple(ANALYTES)
+
+
+async def anc_only(photo: bytes) -> List[Dict[str, Any]]:
+    return [await extract_anc_from_cbc_image(photo, mode="structured", analytes=("anc",))]
+
+
+async def panel(photo: bytes) -> List[Dict[str, Any]]:
+    return [await extract_anc_from_cbc_image(photo, analytes=PANEL)]
+
+
+async def call_per_analyte(photo: bytes) -> List[Dict[str, Any]]:
+    # Concurrent, so this is the best latency the per-analyte approach could have
+    return list(await asyncio.gather(*[
+        extract_anc_from_cbc_image(photo, mode="structured", analytes=("anc",)) for _ in PANEL
+    ]))
+
+
+async def run(extract, photos: List[bytes], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    calls, input_tokens, output_tokens = [], [], []
+
+    async def one(photo: bytes) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            results = await extract(photo)
+            latencies.append(time.perf_counter() - started)
+            calls.append(len(results))
+            input_tokens.append(sum(result["usage"]["input_tokens"] for result in results))
+            output_tokens.append(sum(result["usage"]["output_tokens"] for result in results))
+
+    try:
+        await asyncio.gather(*[one(photo) for photo in photos])
+    finally:
+        await anthropic_client.close_anthropic_client()
+    ms = sorted(seconds * 1000 for seconds in latencies)
+    return {
+        "mean_ms": statistics.mean(ms),
+        "p50_ms": percentile(ms, 0.50),
+        "p95_ms": percentile(ms, 0.95),
+        "calls": statistics.mean(calls),
+        "input_tokens": statistics.mean(input_tokens),
+        "output_tokens": statistics.mean(output_tokens),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.6, help="fake API latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.006,
+                        help="fake API seconds per output token (default ~165 tokens/s)")
+    args = parser.parse_args()
+
+    photo = sample_report_photo()
+    photos = [photo + i.to_bytes(4, "big") for i in range(args.reports)]
+    fake = FakeAnthropicServer(latency=args.latency, token_latency=args.token_latency)
+    fake.start()
+    os.environ.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url)
+    results = {}
+    try:
+        for label, extract in (("ANC only", anc_only), ("panel, one call", panel),
+                               ("call per analyte", call_per_analyte)):
+            results[label] = asyncio.run(run(extract, photos, args.concurrency))
+    finally:
+        fake.stop()
+
+    print(f"reports: {args.reports}  analytes: {', '.join(PANEL)}  fake latency: {args.latency}s "
+          f"+ {args.token_latency * 1000:.0f} ms/output token")
+    print(f"{'':<18}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'calls':>7}{'in tokens':>11}{'out tokens':>12}")
+    for label, result in results.items():
+        print(f"{label:<18}{result['mean_ms']:>10.0f}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}"
+              f"{result['calls']:>7.0f}{result['input_tokens']:>11.0f}{result['output_tokens']:>12.0f}")
+    single, combined = results["ANC only"]["mean_ms"], results["panel, one call"]["mean_ms"]
+    print(f"panel vs ANC only: {combined / single - 1:+.0%} mean latency")
+
+
+if __name__ == "__main__":
+    main()
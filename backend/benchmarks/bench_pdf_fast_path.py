@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+PDF reports: local text-layer fast path vs sending every PDF to the model.
+
+Builds synthetic lab-report PDFs (a cover page, then the CBC table; a configurable share has
+only a neutrophil percentage, so the local parser must fall back to the model) and runs
+process_medical_report over them with PDF_LOCAL_PARSER on and off against the local fake
+Anthropic API.
+
+    python benchmarks/bench_pdf_fast_path.py
+    python benchmarks/bench_pdf_fast_path.py --reports 200 --unparsable 0.1 --latency 1.5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import percentile
+from sample_pdfs import CBC_PAGE, COVER_PAGE, lab_report_pdf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every report must be processed, so keep the result cache out of the measurement
+os.environ["ANC_CACHE_MAX_ENTRIES"] = "0"
+os.environ.pop("ANC_CACHE_DB_PATH", None)
+
+import anthropic_client  # noqa: E402
+from anc_text import find_anc_in_pdf  # noqa: E402
+from metrics import PDF_LOCAL_EXTRACTIONS  # noqa: E402
+from report_processor import process_medical_report  # noqa: E402
+
+PERCENT_ONLY_PAGE = [row for row in CBC_PAGE if row[0] != "Neutrophils, Absolute"]
+
+
+def sample_reports(count: int, unparsable: float, rng: random.Random) -> List[bytes]:
+    fallbacks = round(count * unparsable)
+    reports = []
+    for i in range(count):
+        page = PERCENT_ONLY_PAGE if i < fallbacks else CBC_PAGE
+        # A unique cover line per report, so no two files are identical
+        cover = COVER_PAGE + [f"Accession: {i:08d}"]
+        reports.append(lab_report_pdf([cover, page], font=rng.choice(["type0", "type1"])))
+    rng.shuffle(reports)
+    return reports
+
+
+async def run(reports: List[bytes], concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(contents: bytes) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await process_medical_report(contents, "application/pdf", "cbc.pdf")
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*[one(contents) for contents in reports])
+    finally:
+        await anthropic_client.close_anthropic_client()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=100)
+    parser.add_argument("--unparsable", type=float, default=0.1, help="share of PDFs without an absolute count")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake API latency in seconds")
+    args = parser.parse_args()
+
+    reports = sample_reports(args.reports, args.unparsable, random.Random(7))
+    parse_ms = []
+    for contents in reports:
+        started = time.perf_counter()
+        find_anc_in_pdf(contents)
+        parse_ms.append((time.perf_counter() - started) * 1000)
+
+    fake = FakeAnthropicServer(latency=args.latency)
+    fake.start()
+    os.environ.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url)
+    results = {}
+    model_calls = {}
+    try:
+        for label, local in (("model only", "0"), ("local fast path", "1")):
+            os.environ["PDF_LOCAL_PARSER"] = local
+            before = fake.request_count
+            results[label] = sorted(asyncio.run(run(reports, args.concurrency)))
+            model_calls[label] = fake.request_count - before
+    finally:
+        fake.stop()
+
+    hits = PDF_LOCAL_EXTRACTIONS.value(outcome="hit")
+    print(f"reports: {args.reports}  without an absolute count: {args.unparsable:.0%}  "
+          f"fake model latency: {args.latency}s")
+    print(f"local parse: p50 {statistics.median(parse_ms):.2f} ms  p95 {percentile(sorted(parse_ms), 0.95):.2f} ms  "
+          f"hit rate {hits / args.reports:.0%}")
+    print(f"{'':<17}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'model calls':>13}")
+    for label, latencies in results.items():
+        ms = [seconds * 1000 for seconds in latencies]
+        print(f"{label:<17}{statistics.mean(ms):>10.1f}{percentile(ms, 0.5):>10.1f}{percentile(ms, 0.95):>10.1f}"
+              f"{model_calls[label]:>13}")
+
+
+if __name__ == "__main__":
+    main()
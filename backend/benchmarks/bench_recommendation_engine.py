@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: recommendation engine over synthetic parsed reports.
+
+Compares the original per-call implementation (keyword lists rebuilt on every call,
+two `any(keyword in text)` scans) with the compiled matcher and the batch API.
+
+Usage:
+    python benchmarks/bench_recommendation_engine.py [--reports 100000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recommendation_engine import RecommendationType, get_recommendation, get_recommendations  # noqa: E402
+
+_FILLER = [
+    "Absolute Neutrophil Count (ANC): {v} per microliter", "Normal neutrophil count", "Mild neutropenia",
+    "Hemoglobin 13.2 g/dL", "Platelets within range", "General discomfort", "Fatigue", "Mild symptoms",
+    "Painful joints", "Recurrent infections", "BP 120/80", "Follow up in two weeks", "Elevated CRP",
+    "No acute distress", "Chest pain on exertion", "Slight fever", "Patient is stable", "WBC 6.1 K/uL",
+]
+
+
+def legacy_get_recommendation(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The recommendation logic as it was before the compiled matcher, kept as a reference."""
+    severity = parsed_data.get("severity", "low").lower()
+    conditions = parsed_data.get("conditions", [])
+    symptoms = parsed_data.get("symptoms", [])
+    test_results = parsed_data.get("test_results", [])
+
+    critical_keywords = [
+        "severe", "critical", "emergency", "urgent", "acute",
+        "heart attack", "stroke", "pneumonia", "sepsis", "infection",
+        "high fever", "chest pain", "difficulty breathing", "unconscious",
+        "blood pressure", "bp", "heart rate", "pulse", "surgery"
+    ]
+    moderate_keywords = [
+        "moderate", "abnormal", "elevated", "increased", "decreased",
+        "pain", "discomfort", "infection", "inflammation", "fever",
+        "consult", "follow up", "examination", "test results"
+    ]
+
+    is_critical = severity in ["critical", "high"]
+    is_moderate = severity == "moderate"
+    all_text = " ".join(conditions + symptoms + test_results).lower()
+    critical_found = any(keyword in all_text for keyword in critical_keywords)
+    moderate_found = any(keyword in all_text for keyword in moderate_keywords)
+
+    if is_critical or critical_found:
+        recommendation = RecommendationType.ADMISSION
+        reasoning = "Based on the severity and critical indicators in your report, immediate hospital admission is recommended."
+        suggested_actions = [
+            "Seek immediate medical attention at the nearest hospital",
+            "Call emergency services if symptoms worsen",
+            "Do not delay treatment",
+            "Inform family members about your condition"
+        ]
+        confidence = 0.85
+    elif is_moderate or moderate_found:
+        recommendation = RecommendationType.DOCTOR_VISIT
+        reasoning = "Your medical report indicates moderate concerns that require professional medical consultation."
+        suggested_actions = [
+            "Schedule an appointment with your doctor as soon as possible",
+            "Bring this report to your consultation",
+            "Follow any prescribed medication or treatment plan",
+            "Monitor your symptoms and report any changes"
+        ]
+        confidence = 0.75
+    else:
+        recommendation = RecommendationType.HOME_MEDICATION
+        reasoning = "Based on your report, the condition appears manageable with appropriate home care and medication."
+        suggested_actions = [
+            "Follow the recommended medication schedule",
+            "Rest and maintain good hydration",
+            "Monitor your symptoms",
+            "Contact a healthcare provider if symptoms persist or worsen"
+        ]
+        confidence = 0.65
+
+    if parsed_data.get("anc_extraction").get("status") == "success":
+        anc_value = parsed_data.get("anc_extraction", None).get("anc_value", None)
+    else:
+        anc_value = None
+
+    return {
+        "recommendation": recommendation.value,
+        "confidence": confidence,
+        "reasoning": reasoning,
+        "suggested_actions": suggested_actions,
+        "anc_value": anc_value,
+        "severity": parsed_data.get("severity", "low")
+    }
+
+
+def synthetic_reports(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Parsed reports shaped like process_medical_report output, with a mix of keywords."""
+    rng = random.Random(seed)
+    reports = []
+    for _ in range(count):
+        anc = round(rng.uniform(100, 6000), 1)
+        status = rng.choice(["success"] * 8 + ["not_found", "unclear"])
+        texts = [rng.choice(_FILLER).format(v=anc) for _ in range(rng.randint(1, 5))]
+        reports.append({
+            "conditions": texts[:1],
+            "symptoms": texts[1:3],
+            "test_results": texts[3:],
+            "severity": rng.choice(["low", "low", "moderate", "high", "critical", "LOW"]),
+            "summary": "",
+            "anc_extraction": {"status": status, "anc_value": anc if status == "success" else None},
+        })
+    return reports
+
+
+def _time(label: str, fn, baseline: float = 0.0, repeat: int = 3) -> float:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    elapsed = min(runs)
+    speedup = f"  ({baseline / elapsed:.2f}x)" if baseline else ""
+    print(f"{label:<34}{elapsed * 1000:>9.1f} ms{speedup}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=100_000)
+    args = parser.parse_args()
+
+    reports = synthetic_reports(args.reports)
+    print(f"{args.reports} synthetic parsed reports")
+    legacy = _time("legacy get_recommendation loop", lambda: [legacy_get_recommendation(r) for r in reports])
+    _time("get_recommendation loop", lambda: [get_recommendation(r) for r in reports], legacy)
+    _time("get_recommendations(batch)", lambda: get_recommendations(reports), legacy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cold start: import time of the app and time to the first 200s of a fresh server process.
+
+  - import: `import main` in a fresh interpreter (median of --runs); --top also lists the
+    slowest modules from `python -X importtime`
+  - start: spawns uvicorn against the local fake Anthropic API and polls every few
+    milliseconds, timing from the spawn to the first 200 of GET / (serving), of GET /ready
+    (warm-up done: SDK imported, connections opened) and of a POST /upload sent as soon as
+    the server listens
+
+Point --backend-dir at another checkout to compare revisions:
+
+    git worktree add /tmp/nadircare-before <old-commit>
+    python benchmarks/bench_startup.py --backend-dir /tmp/nadircare-before/backend
+    python benchmarks/bench_startup.py --runs 10 --top 15 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import BACKEND_DIR, _git_revision, free_port, sample_report_photo
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+POLL_INTERVAL = 0.005
+
+
+def import_seconds(backend_dir: str) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=backend_dir, capture_output=True,
+                            text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(backend_dir: str, top: int) -> List[Tuple[str, float]]:
+    """The modules main imports, by cumulative import time (ms), from python -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=backend_dir,
+                            capture_output=True, text=True, check=True).stderr
+    # Each import is listed after the imports it made, one level deeper (two more spaces)
+    children: List[Tuple[str, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        if depth == 1:
+            if name.strip() == "main":
+                return sorted(children, key=lambda item: -item[1])[:top]
+            children = []
+        elif depth == 3:
+            children.append((name.strip(), int(cumulative) / 1000))
+    return []
+
+
+def time_to_first_200s(backend_dir: str, fake_url: str, photo: bytes) -> Dict[str, float]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake_url, ANC_CACHE_MAX_ENTRIES="0")
+    env.pop("ANC_CACHE_DB_PATH", None)
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir, env=env, stdout=subprocess.DEVNULL,
+    )
+    timings: Dict[str, float] = {}
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            def first_200(path: str) -> None:
+                while time.perf_counter() - started < 60:
+                    try:
+                        if client.get(path).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    time.sleep(POLL_INTERVAL)
+                timings[f"GET {path}"] = time.perf_counter() - started
+
+            first_200("/")
+            # An upload arriving the moment the server listens, warm-up still running
+            client.post("/upload", files={"file": ("cbc.jpg", photo, "image/jpeg")}).raise_for_status()
+            timings["POST /upload"] = time.perf_counter() - started
+            first_200("/ready")
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend-dir", default=str(BACKEND_DIR), help="backend checkout to measure")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest modules imported by main")
+    parser.add_argument("--json", help="write the result to this file")
+    args = parser.parse_args()
+
+    imports = [import_seconds(args.backend_dir) for _ in range(args.runs)]
+    fake = FakeAnthropicServer()
+    fake.start()
+    photo = sample_report_photo()
+    try:
+        starts = [time_to_first_200s(args.backend_dir, fake.base_url, photo) for _ in range(args.runs)]
+    finally:
+        fake.stop()
+
+    result = {
+        "revision": _git_revision(args.backend_dir),
+        "backend": args.backend_dir,
+        "import_main_ms": round(statistics.median(imports) * 1000, 1),
+        "first_200_ms": {key: round(statistics.median(run[key] for run in starts) * 1000, 1) for key in starts[0]},
+    }
+    print(f"backend {result['backend']} at {result['revision']}, median of {args.runs} fresh processes")
+    print(f"{'import main':<28}{result['import_main_ms']:>10.0f} ms")
+    for key, ms in result["first_200_ms"].items():
+        print(f"{'first 200, ' + key:<28}{ms:>10.0f} ms after spawn")
+    if args.top:
+        print(f"\n{'slowest imports':<40}{'ms':>10}")
+        for name, ms in slowest_imports(args.backend_dir, args.top):
+            print(f"{name:<40}{ms:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
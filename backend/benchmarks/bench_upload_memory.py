@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Peak server memory while handling many large concurrent uploads.
+
+Starts the fake Anthropic API in-process and the backend under uvicorn in a subprocess,
+fires N concurrent /upload requests with an M-megabyte photo each, and reports the
+server's peak RSS. Point --backend-dir at another checkout to compare revisions:
+
+    git worktree add /tmp/nadircare-before <old-commit>
+    python benchmarks/bench_upload_memory.py --backend-dir /tmp/nadircare-before/backend
+    python benchmarks/bench_upload_memory.py
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+from fake_anthropic import FakeAnthropicServer
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def large_photo(megabytes: float) -> bytes:
+    """A noisy JPEG of roughly the requested size (sensor noise keeps it from compressing)."""
+    side = int((megabytes * 1024 * 1024 / 1.1) ** 0.5)
+    image = Image.effect_noise((side, side), 90).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Peak resident set size of a running process (Linux /proc; 0 if unavailable)."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+async def fire(url: str, photo: bytes, count: int):
+    limits = httpx.Limits(max_connections=count)
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        return await asyncio.gather(*[
+            client.post(f"{url}/upload", files={"file": (f"cbc-{i}.jpg", photo, "image/jpeg")})
+            for i in range(count)
+        ])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend-dir", default=str(BACKEND_DIR), help="backend checkout to measure")
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--model-latency", type=float, default=0.5, help="fake model latency in seconds")
+    args = parser.parse_args()
+
+    photo = large_photo(args.megabytes)
+    fake = FakeAnthropicServer(latency=args.model_latency)
+    fake.start()
+    port = free_port()
+    env = dict(
+        os.environ,
+        ANTHROPIC_API_KEY="fake",
+        ANTHROPIC_BASE_URL=fake.base_url,
+        ANTHROPIC_MAX_CONCURRENCY=str(args.uploads),
+        ANC_CACHE_MAX_ENTRIES="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=args.backend_dir, env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_up(url))
+        idle_rss = peak_rss_mb(server.pid)
+        started = time.perf_counter()
+        responses = asyncio.run(fire(url, photo, args.uploads))
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+        fake.stop()
+    if not peak:
+        # Not Linux: fall back to the finished child's high-water mark (KB on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    print(f"backend:        {args.backend_dir}")
+    print(f"uploads:        {args.uploads} x {len(photo) / 1e6:.1f} MB, concurrent")
+    print(f"statuses:       {statuses}")
+    print(f"wall time:      {elapsed:.1f} s")
+    if idle_rss:
+        print(f"idle peak RSS:  {idle_rss:.0f} MB")
+    print(f"peak RSS:       {peak:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Time to first result: POST /upload vs POST /upload/stream.
+
+Starts the backend under uvicorn against the local fake Anthropic API (fixed latency before
+the first token, then `--token-latency` per output token) and uploads distinct report photos
+one at a time to both endpoints. For /upload the only result is the full response; for the
+stream it reports when the first event arrived (the app can drop its spinner), when the ANC
+"answer" event arrived (read from the model's stream) and when the final recommendation did.
+
+Reasoning mode answers after a paragraph of reasoning, so the answer comes near the end of
+the output; the panel's record_cbc_panel call writes the ANC first.
+
+    python benchmarks/bench_upload_stream.py
+    python benchmarks/bench_upload_stream.py --requests 40 --latency 1.5 --token-latency 0.006
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import BACKEND_DIR, free_port, percentile, sample_report_photo, wait_until_up
+
+REASONING = (
+    "I'll look for the white blood cell differential in the report. The table lists Neutrophils as a "
+    "percentage (62.1 %) and, two rows below, \"Neutrophils, Absolute\" with the value 2.03 and the unit "
+    "K/uL. K/uL means thousands per microliter, so the absolute count is 2.03 x 1000 = 2030 cells per "
+    "microliter. The reference range printed next to it (1.80 - 7.70) uses the same unit, which confirms "
+    "the reading. The value is within the normal range.\n"
+    "<answer>\n2030 per microliter\n</answer>"
+)
+
+
+async def run(url: str, photo: bytes, requests: int) -> Dict[str, List[float]]:
+    timings: Dict[str, List[float]] = {"upload": [], "first event": [], "answer": [], "recommendation": []}
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        for i in range(requests):
+            # Distinct bytes per request, so neither the cache nor single-flight answers
+            files = {"file": ("cbc.jpg", photo + i.to_bytes(4, "big"), "image/jpeg")}
+            started = time.perf_counter()
+            response = await client.post("/upload", files=files)
+            response.raise_for_status()
+            timings["upload"].append(time.perf_counter() - started)
+
+            files = {"file": ("cbc.jpg", photo + (requests + i).to_bytes(4, "big"), "image/jpeg")}
+            started = time.perf_counter()
+            async with client.stream("POST", "/upload/stream", files=files) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("event: "):
+                        continue
+                    event = line[len("event: "):]
+                    now = time.perf_counter() - started
+                    if len(timings["first event"]) <= i:
+                        timings["first event"].append(now)
+                    if event in ("answer", "recommendation") and len(timings[event]) <= i:
+                        timings[event].append(now)
+    return timings
+
+
+def report(label: str, timings: Dict[str, List[float]]) -> None:
+    print(f"\n{label}")
+    print(f"{'':<34}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, values in (("/upload response", timings["upload"]),
+                         ("/upload/stream first event", timings["first event"]),
+                         ("/upload/stream answer (ANC)", timings["answer"]),
+                         ("/upload/stream recommendation", timings["recommendation"])):
+        values = sorted(values)
+        print(f"{name:<34}{percentile(values, 0.5) * 1000:>10.0f}{percentile(values, 0.95) * 1000:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="uploads per endpoint and mode")
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.006, help="fake model seconds per output token")
+    args = parser.parse_args()
+
+    fake = FakeAnthropicServer(latency=args.latency, token_latency=args.token_latency, answer_text=REASONING)
+    fake.start()
+    photo = sample_report_photo()
+    try:
+        for label, panel in (("reasoning mode (answer after the reasoning)", "anc"),
+                             ("CBC panel (record_cbc_panel, ANC first)", "all")):
+            port = free_port()
+            env = dict(os.environ, ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url,
+                       ANC_CACHE_MAX_ENTRIES="0", CBC_PANEL=panel)
+            env.pop("ANC_CACHE_DB_PATH", None)
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=str(BACKEND_DIR), env=env, stdout=subprocess.DEVNULL,
+            )
+            url = f"http://127.0.0.1:{port}"
+            try:
+                asyncio.run(wait_until_up(url))
+                report(label, asyncio.run(run(url, photo, args.requests)))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
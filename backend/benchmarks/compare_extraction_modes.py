@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Compare the ANC extraction modes (reasoning vs structured) on a labelled sample set.
+
+The sample directory holds the report images and a labels.json mapping each file name to
+the expected ANC in cells per microliter (null when the report has no ANC):
+
+    {"cbc-001.jpg": 2030, "cbc-002.png": 480, "blank.jpg": null}
+
+Reports accuracy, latency percentiles, output tokens and status counts per mode. Calls the
+real API (ANTHROPIC_API_KEY) unless --fake is given, in which case a synthetic photo is
+sent to the local fake API with a per-output-token delay, to check the plumbing offline.
+
+    python benchmarks/compare_extraction_modes.py --samples ~/cbc-samples
+    python benchmarks/compare_extraction_modes.py --fake
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import percentile, sample_report_photo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every call must reach the model, so keep the result cache out of the measurement
+os.environ["ANC_CACHE_MAX_ENTRIES"] = "0"
+os.environ.pop("ANC_CACHE_DB_PATH", None)
+
+import anthropic_client  # noqa: E402
+from report_processor import ANC_EXTRACTION_MODES, extract_anc_from_cbc_image  # noqa: E402
+
+# A typical free-form response: a few sentences of reasoning before the answer tag
+FAKE_REASONING_RESPONSE = (
+    "I can see a CBC report laid out as a table with test names, results, units and reference ranges. "
+    "Scanning the white cell differential, there is a row for Neutrophils given as a percentage (58 %) "
+    "and a separate row labelled 'Neutrophils, Absolute' with a value of 2.03 and the unit K/uL. "
+    "The absolute count is the one required. Since the unit is K/uL, the value has to be multiplied "
+    "by 1000 to express it per microliter: 2.03 x 1000 = 2030. The reference range printed next to it "
+    "(1.8 - 7.7 K/uL) is consistent with this reading, so the value is within the normal range.\n\n"
+    "<answer>\n2030 per microliter\n</answer>"
+)
+
+
+def is_correct(result: Dict[str, Any], expected: Optional[float]) -> bool:
+    if expected is None:
+        return result["status"] == "not_found"
+    value = result.get("anc_value")
+    return result["status"] == "success" and value is not None and abs(value - expected) <= 0.005 * expected
+
+
+async def run_mode(mode: str, samples: List[Tuple[str, bytes, Optional[float]]], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    rows: List[Dict[str, Any]] = []
+
+    async def one(name: str, contents: bytes, expected: Optional[float]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await extract_anc_from_cbc_image(contents, mode=mode)
+            except Exception as e:
+                result = {"status": f"error: {type(e).__name__}", "anc_value": None}
+            rows.append({
+                "file": name,
+                "seconds": time.perf_counter() - started,
+                "correct": is_correct(result, expected),
+                "status": result["status"],
+                "output_tokens": result.get("usage", {}).get("output_tokens", 0),
+            })
+
+    await asyncio.gather(*[one(*sample) for sample in samples])
+    latencies = sorted(row["seconds"] for row in rows)
+    statuses: Dict[str, int] = {}
+    for row in rows:
+        statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+    return {
+        "mode": mode,
+        "accuracy": sum(row["correct"] for row in rows) / len(rows),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_output_tokens": statistics.mean(row["output_tokens"] for row in rows),
+        "statuses": statuses,
+        "misses": [row["file"] for row in rows if not row["correct"]],
+    }
+
+
+def load_samples(directory: Path) -> List[Tuple[str, bytes, Optional[float]]]:
+    labels = json.loads((directory / "labels.json").read_text())
+    return [(name, (directory / name).read_bytes(), expected) for name, expected in sorted(labels.items())]
+
+
+async def compare(modes: List[str], samples, concurrency: int) -> List[Dict[str, Any]]:
+    try:
+        return [await run_mode(mode, samples, concurrency) for mode in modes]
+    finally:
+        await anthropic_client.close_anthropic_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, help="directory with report images and labels.json")
+    parser.add_argument("--modes", nargs="+", choices=ANC_EXTRACTION_MODES, default=list(ANC_EXTRACTION_MODES))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fake", action="store_true", help="use the local fake API and synthetic samples")
+    parser.add_argument("--fake-samples", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.006,
+                        help="fake API seconds per output token (default ~165 tokens/s)")
+    args = parser.parse_args()
+
+    fake = None
+    if args.fake:
+        fake = FakeAnthropicServer(latency=0.4, answer_text=FAKE_REASONING_RESPONSE, token_latency=args.token_latency)
+        fake.start()
+        os.environ.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url)
+        photo = sample_report_photo()
+        samples = [(f"synthetic-{i}.jpg", photo + i.to_bytes(4, "big"), 2030.0) for i in range(args.fake_samples)]
+    elif args.samples:
+        samples = load_samples(args.samples)
+    else:
+        parser.error("give --samples DIR (real API) or --fake")
+
+    try:
+        results = asyncio.run(compare(args.modes, samples, args.concurrency))
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    print(f"samples: {len(samples)}  concurrency: {args.concurrency}  {'(fake API)' if fake else ''}")
+    print(f"{'mode':<12}{'accuracy':>10}{'p50 ms':>10}{'p95 ms':>10}{'out tokens':>12}  statuses")
+    for result in results:
+        print(f"{result['mode']:<12}{result['accuracy']:>10.1%}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}"
+              f"{result['mean_output_tokens']:>12.0f}  {result['statuses']}")
+    for result in results:
+        if result["misses"]:
+            print(f"{result['mode']} misses: {', '.join(result['misses'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic Messages API, used by the tests and benchmarks.
+
+Usage:
+    python benchmarks/fake_anthropic.py --port 8900 --latency 2.0 --jitter 0.5
+    python benchmarks/fake_anthropic.py --answer "<answer>420 per microliter</answer>" --answer "<answer>not found</answer>"
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8900 ANTHROPIC_API_KEY=fake uvicorn main:app
+"""
+
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Set
+
+from PIL import Image
+
+
+ERROR_TYPES = {429: "rate_limit_error", 500: "api_error", 529: "overloaded_error"}
+
+
+class _Server(ThreadingHTTPServer):
+    # Concurrency tests open many connections at once; the default backlog of 5 drops SYNs
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def estimate_input_tokens(body: dict) -> int:
+    """Rough input token count: about (width * height) / 750 per image plus four characters per token of text."""
+    tokens = len(body.get("system") or "") // 4
+    for message in body.get("messages", []):
+        content = message.get("content")
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content or []
+        for block in blocks:
+            if block.get("type") == "text":
+                tokens += len(block["text"]) // 4
+            elif block.get("type") == "image":
+                try:
+                    width, height = Image.open(io.BytesIO(base64.b64decode(block["source"]["data"]))).size
+                    tokens += width * height // 750
+                except Exception:
+                    tokens += 1600
+    return max(1, tokens)
+
+
+class FakeAnthropicServer:
+    """
+    Minimal local stand-in for the Anthropic Messages API.
+    Every request sleeps for `latency` seconds (plus up to `jitter` more, uniformly, plus
+    `token_latency` per output token) and answers with `answer_text`, or with the canned
+    `answers` in turn when those are given.
+    Requests that force a tool call get a tool_use block carrying `tool_input` instead (or the
+    `tool_inputs` in turn); record_cbc_panel calls get the `panel_input` entries of the analytes
+    they ask for, "not_found" for the others. Requests whose sequence number is in `slow_requests` take
+    `slow_latency` instead, to simulate stragglers. Connections are kept alive (HTTP/1.1) and
+    counted in `connections_opened`.
+    While `errors` holds status codes (e.g. 429, 529), each request pops the first one and gets
+    that error (with `error_headers`, e.g. retry-after) instead of an answer. `response_headers`
+    (e.g. anthropic-ratelimit-*) are sent with every answer.
+    Requests with "stream": true get the answer as server-sent events: the latency passes
+    before message_start, then the output arrives about one token (four characters) per
+    `token_latency`, so streamed and plain requests take the same total time.
+    """
+
+    def __init__(self, latency: float = 0.0, answer_text: str = "<answer>\n2030 per microliter\n</answer>",
+                 jitter: float = 0.0, answers: Sequence[str] = (), token_latency: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.answer_text = answer_text
+        self.answers = list(answers)
+        self.tool_input = {"value": 2.03, "unit": "K/uL", "multiplier": 1000, "status": "success", "confidence": 0.95}
+        self.tool_inputs: List[dict] = []
+        self.panel_input = {"anc": "2.03 K/uL", "wbc": "4.8 K/uL", "hemoglobin": "12.9 g/dL",
+                            "platelets": "231 K/uL", "confidence": 0.95}
+        self.tool_request_count = 0
+        self.slow_requests: Set[int] = set()
+        self.slow_latency = 5.0
+        self.errors: List[int] = []
+        self.error_headers: Dict[str, str] = {}
+        self.response_headers: Dict[str, str] = {}
+        self.error_count = 0
+        self.connections_opened = 0
+        self.models_requests = 0
+        self.last_request: Optional[dict] = None
+        self.request_count = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections_opened += 1
+
+            def _send_json(self, payload: bytes, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, message: dict, output: str, headers: Dict[str, str]) -> None:
+                """The message as Messages API stream events, in chunked encoding so the connection stays open."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+                def send_event(event: dict) -> None:
+                    data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                block = message["content"][0]
+                tool = block["type"] == "tool_use"
+                send_event({"type": "message_start", "message": dict(
+                    message, content=[], stop_reason=None, usage=dict(message["usage"], output_tokens=1)
+                )})
+                send_event({"type": "content_block_start", "index": 0,
+                            "content_block": dict(block, input={}) if tool else dict(block, text="")})
+                for start in range(0, len(output), 4):
+                    time.sleep(server.token_latency)
+                    chunk = output[start:start + 4]
+                    delta = ({"type": "input_json_delta", "partial_json": chunk} if tool
+                             else {"type": "text_delta", "text": chunk})
+                    send_event({"type": "content_block_delta", "index": 0, "delta": delta})
+                send_event({"type": "content_block_stop", "index": 0})
+                send_event({"type": "message_delta", "delta": {"stop_reason": message["stop_reason"],
+                                                               "stop_sequence": None},
+                            "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+                send_event({"type": "message_stop"})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                # Models API, used by the client warm-up
+                with server._lock:
+                    server.models_requests += 1
+                self._send_json(json.dumps({
+                    "data": [{"type": "model", "id": "claude-haiku-4-5-20251001", "display_name": "Claude Haiku 4.5",
+                              "created_at": "2025-10-01T00:00:00Z"}],
+                    "has_more": False, "first_id": "claude-haiku-4-5-20251001", "last_id": "claude-haiku-4-5-20251001",
+                }).encode())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.last_request = body
+                    sequence = server.request_count
+                    server.request_count += 1
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                    error = server.errors.pop(0) if server.errors else None
+                    if error is not None:
+                        server.error_count += 1
+                try:
+                    if error is not None:
+                        time.sleep(server.latency)
+                        self._send_json(json.dumps({
+                            "type": "error",
+                            "error": {"type": ERROR_TYPES.get(error, "api_error"), "message": f"Fake error {error}"},
+                        }).encode(), status=error, headers=server.error_headers)
+                        return
+                    tool_choice = body.get("tool_choice") or {}
+                    if tool_choice.get("type") == "tool":
+                        with server._lock:
+                            tool_sequence = server.tool_request_count
+                            server.tool_request_count += 1
+                        if tool_choice["name"] == "record_cbc_panel":
+                            requested = body["tools"][0]["input_schema"]["properties"]
+                            tool_input = {key: server.panel_input.get(key, "not_found") for key in requested}
+                        else:
+                            tool_input = (server.tool_inputs[tool_sequence % len(server.tool_inputs)]
+                                          if server.tool_inputs else server.tool_input)
+                        content = [{"type": "tool_use", "id": "toolu_fake", "name": tool_choice["name"],
+                                    "input": tool_input}]
+                        output_text = json.dumps(tool_input)
+                        stop_reason = "tool_use"
+                    else:
+                        output_text = server.answers[sequence % len(server.answers)] if server.answers else server.answer_text
+                        content = [{"type": "text", "text": output_text}]
+                        stop_reason = "end_turn"
+                    # Roughly four characters per token
+                    output_tokens = max(1, len(output_text) // 4)
+                    streamed_tokens = output_tokens if body.get("stream") else 0
+                    if sequence in server.slow_requests:
+                        time.sleep(server.slow_latency)
+                    else:
+                        time.sleep(
+                            server.latency + random.uniform(0, server.jitter)
+                            + (output_tokens - streamed_tokens) * server.token_latency
+                        )
+                    message = {
+                        "id": "msg_fake",
+                        "type": "message",
+                        "role": "assistant",
+                        "model": body.get("model", "fake"),
+                        "content": content,
+                        "stop_reason": stop_reason,
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": estimate_input_tokens(body), "output_tokens": output_tokens},
+                    }
+                    if body.get("stream"):
+                        self._send_stream(message, output_text, server.response_headers)
+                    else:
+                        self._send_json(json.dumps(message).encode(), headers=server.response_headers)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+        self._httpd = _Server((host, port), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="extra seconds per output token")
+    parser.add_argument("--answer", action="append", default=[],
+                        help="canned response text, used in turn (repeatable; default: 2030 per microliter)")
+    args = parser.parse_args()
+
+    server = FakeAnthropicServer(latency=args.latency, jitter=args.jitter, answers=args.answer,
+                                 token_latency=args.token_latency)
+    server.start(args.host, args.port)
+    print(f"Fake Anthropic API listening on {server.base_url} (latency {args.latency}s + up to {args.jitter}s)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Offline accuracy and latency regression suite over a golden dataset of reports.
+
+A dataset is a directory of report photos and PDFs with a golden.json manifest:
+
+    {"cases": [
+        {"id": "cbc-001", "file": "cbc-001.jpg", "expected_anc": 2030},
+        {"id": "severe-scan", "file": "scan-17.pdf", "expected_anc": 420, "expected_band": "critical"},
+        {"id": "lipid-panel", "file": "lipid.png", "expected_anc": null}
+    ]}
+
+expected_anc is in cells per microliter, null when the report has no ANC. expected_status
+defaults to "success" (or "not_found" without an ANC) and expected_band, the severity the
+pipeline should assign (critical / high / moderate / low, or none without an ANC), defaults
+to the band of expected_anc. A case is correct when the status matches and the ANC is within
+0.5 %.
+
+Every case goes through process_medical_report, the whole upload pipeline (sniffing, the
+PDF text layer, pre-processing, the model call, answer parsing, severity), with the model's
+HTTP responses recorded once (--record, with ANTHROPIC_API_KEY) and replayed from
+<dataset>/recordings afterwards (see model_recordings.py), so a run needs no network and a
+parsing change is re-evaluated in seconds. Changing a prompt, the model or the image
+pre-processing changes the requests: those cases report "missing_recording" until recorded
+again.
+
+Reports accuracy, the severity-band confusion matrix, per-stage timings (answer_parse,
+preprocess, ...; model_call_recorded is the latency the recorded call had) and payload sizes.
+--json saves the run with the git revision; --baseline compares against an earlier one.
+
+    python benchmarks/golden_suite.py --dataset ~/cbc-golden --record
+    python benchmarks/golden_suite.py --dataset ~/cbc-golden --json after.json --baseline before.json
+    python benchmarks/golden_suite.py --synthetic /tmp/golden   # synthetic dataset recorded from the fake API
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from fake_anthropic import FakeAnthropicServer
+from load_test import BACKEND_DIR, _git_revision, percentile
+from sample_pdfs import CBC_PAGE, COVER_PAGE, lab_report_pdf
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+import anthropic_client  # noqa: E402
+from ingest import SNIFF_BYTES, sniff_report_type  # noqa: E402
+from report_processor import ANC_SEVERITY_CUTOFFS, process_medical_report  # noqa: E402
+from tracing import bind_request  # noqa: E402
+
+MANIFEST = "golden.json"
+BANDS = ("none", "low", "moderate", "high", "critical")
+TOLERANCE = 0.005
+
+
+class GoldenCase(NamedTuple):
+    id: str
+    path: Path
+    expected_anc: Optional[float]
+    expected_status: str
+    expected_band: str
+
+
+def severity_band(anc_value: Optional[float]) -> str:
+    """The severity process_medical_report assigns to an ANC (ANC_SEVERITY_CUTOFFS)."""
+    if anc_value is None:
+        return "none"
+    for band, cutoff in zip(("critical", "high", "moderate"), ANC_SEVERITY_CUTOFFS):
+        if anc_value < cutoff:
+            return band
+    return "low"
+
+
+def load_dataset(directory: Path) -> List[GoldenCase]:
+    manifest = json.loads((directory / MANIFEST).read_text())
+    cases = []
+    for entry in manifest["cases"]:
+        expected = entry.get("expected_anc")
+        band = entry.get("expected_band", severity_band(expected))
+        if band not in BANDS:
+            raise ValueError(f"Case {entry['id']}: unknown expected_band {band!r}. Use one of: {', '.join(BANDS)}")
+        cases.append(GoldenCase(
+            id=entry["id"],
+            path=directory / entry["file"],
+            expected_anc=None if expected is None else float(expected),
+            expected_status=entry.get("expected_status", "success" if expected is not None else "not_found"),
+            expected_band=band,
+        ))
+    return cases
+
+
+def is_correct(case: GoldenCase, status: str, anc_value: Optional[float]) -> bool:
+    if status != case.expected_status:
+        return False
+    if case.expected_anc is None:
+        return anc_value is None
+    return anc_value is not None and abs(anc_value - case.expected_anc) <= TOLERANCE * case.expected_anc
+
+
+async def run_case(case: GoldenCase) -> Dict[str, Any]:
+    contents = case.path.read_bytes()
+    content_type = sniff_report_type(contents[:SNIFF_BYTES]) or "application/octet-stream"
+    timings = bind_request(f"golden-{case.id}")
+    row: Dict[str, Any] = {"id": case.id, "expected_anc": case.expected_anc, "expected_band": case.expected_band,
+                           "upload_bytes": len(contents), "model_bytes": 0, "input_tokens": 0, "output_tokens": 0}
+    started = time.perf_counter()
+    try:
+        parsed = await process_medical_report(contents, content_type, case.path.name)
+    except Exception as e:
+        missing = "No recorded response" in str(e)
+        row.update(status="missing_recording" if missing else f"error: {type(e).__name__}", anc_value=None,
+                   band="none", correct=False)
+    else:
+        extraction = parsed["anc_extraction"]
+        anc_value = extraction.get("anc_value") if extraction["status"] == "success" else None
+        usage = extraction.get("usage") or {}
+        preprocessing = extraction.get("preprocessing")
+        if preprocessing:
+            row["model_bytes"] = preprocessing["bytes_out"]
+        elif usage:
+            # A PDF the text layer could not answer goes to the model as it is
+            row["model_bytes"] = len(contents)
+        row.update(
+            status=extraction["status"], anc_value=anc_value,
+            band=parsed["severity"] if anc_value is not None else "none",
+            correct=is_correct(case, extraction["status"], anc_value),
+            input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0),
+        )
+    row["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    row["stages_ms"] = dict(timings)
+    return row
+
+
+async def run_cases(cases: Sequence[GoldenCase], fake: Optional[FakeAnthropicServer] = None,
+                    fake_answers: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """Run the cases one at a time (so stage timings are not inflated by each other)."""
+    rows = []
+    try:
+        for case in cases:
+            if fake is not None and fake_answers:
+                fake.answer_text = fake_answers.get(case.id, fake.answer_text)
+            rows.append(await run_case(case))
+    finally:
+        await anthropic_client.close_anthropic_client()
+    return rows
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    confusion = {expected: {band: 0 for band in BANDS} for expected in BANDS}
+    statuses: Dict[str, int] = {}
+    stages: Dict[str, List[float]] = {"total": []}
+    for row in rows:
+        confusion[row["expected_band"]][row["band"]] += 1
+        statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+        stages["total"].append(row["total_ms"])
+        for stage, ms in row["stages_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+
+    def spread(values: List[float]) -> Dict[str, float]:
+        values = sorted(values)
+        return {"p50": percentile(values, 0.50), "p95": percentile(values, 0.95), "max": values[-1] if values else 0.0}
+
+    return {
+        "cases": len(rows),
+        "accuracy": sum(row["correct"] for row in rows) / len(rows) if rows else 0.0,
+        "band_accuracy": sum(row["band"] == row["expected_band"] for row in rows) / len(rows) if rows else 0.0,
+        "statuses": statuses,
+        "band_confusion": confusion,
+        "stages_ms": {stage: spread(values) for stage, values in sorted(stages.items())},
+        "payload": {field: spread([float(row[field]) for row in rows])
+                    for field in ("upload_bytes", "model_bytes", "input_tokens", "output_tokens")},
+        "failures": [row["id"] for row in rows if not row["correct"]],
+    }
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    summary = result["summary"]
+    before = baseline["summary"] if baseline else None
+    print(f"revision {result['revision']}  dataset {result['dataset']}  ({result['recordings']})")
+    line = f"accuracy {summary['accuracy']:.1%}  severity band {summary['band_accuracy']:.1%}  of {summary['cases']} cases"
+    if before:
+        line += (f"   (was {before['accuracy']:.1%} / {before['band_accuracy']:.1%} "
+                 f"at {baseline['revision']})")
+    print(line)
+    print(f"statuses: {summary['statuses']}")
+
+    print("\nseverity band confusion (rows: expected, columns: assigned)")
+    print(f"{'':<10}" + "".join(f"{band:>10}" for band in BANDS))
+    for expected in BANDS:
+        counts = summary["band_confusion"][expected]
+        if any(counts.values()):
+            print(f"{expected:<10}" + "".join(f"{counts[band]:>10}" for band in BANDS))
+
+    print(f"\n{'stage (ms)':<28}{'p50':>10}{'p95':>10}{'max':>10}" + (f"{'p50 before':>12}" if before else ""))
+    for stage, spread in summary["stages_ms"].items():
+        line = f"{stage:<28}{spread['p50']:>10.2f}{spread['p95']:>10.2f}{spread['max']:>10.2f}"
+        if before and stage in before["stages_ms"]:
+            line += f"{before['stages_ms'][stage]['p50']:>12.2f}"
+        print(line)
+
+    print(f"\n{'payload':<28}{'p50':>10}{'p95':>10}{'max':>10}" + (f"{'p50 before':>12}" if before else ""))
+    for field, spread in summary["payload"].items():
+        line = f"{field:<28}{spread['p50']:>10,.0f}{spread['p95']:>10,.0f}{spread['max']:>10,.0f}"
+        if before and field in before["payload"]:
+            line += f"{before['payload'][field]['p50']:>12,.0f}"
+        print(line)
+
+    rows = {row["id"]: row for row in result["rows"]}
+    if summary["failures"]:
+        print("\nfailures:")
+        for case_id in summary["failures"]:
+            row = rows[case_id]
+            print(f"  {case_id}: expected {row['expected_anc']} ({row['expected_band']}), "
+                  f"got {row['anc_value']} ({row['band']}, {row['status']})")
+    if before:
+        was_correct = {row["id"]: row["correct"] for row in baseline["rows"]}
+        changed = [case_id for case_id, row in rows.items()
+                   if case_id in was_correct and row["correct"] != was_correct[case_id]]
+        for case_id in changed:
+            print(f"  changed since baseline: {case_id} is now {'correct' if rows[case_id]['correct'] else 'wrong'}")
+
+
+def _report_photo(anc_value: Optional[float], seed: int) -> bytes:
+    """A phone-photo-sized CBC table; the absolute neutrophil row is left out without an ANC."""
+    rows = [("WBC", f"{4.1 + seed * 0.3:.1f}", "K/uL"), ("Hemoglobin", f"{11.5 + seed * 0.2:.1f}", "g/dL"),
+            ("Neutrophils", f"{38.0 + seed:.1f}", "%")]
+    if anc_value is not None:
+        rows.append(("Neutrophils, Absolute", f"{anc_value / 1000:.2f}", "K/uL"))
+    rows += [("Lymphocytes, Absolute", "1.95", "K/uL"), ("Platelets", f"{180 + seed * 11}", "K/uL")]
+    image = Image.new("L", (1240, 1754), 250)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=32)
+    draw.text((60, 60), "City Hospital Laboratory - Complete Blood Count", font=font, fill=0)
+    for i, (test, value, unit) in enumerate(rows):
+        y = 200 + i * 90
+        for x, text in ((60, test), (560, value), (820, unit)):
+            draw.text((x, y), text, font=font, fill=0)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _answer(text: str) -> str:
+    return f"The table has a 'Neutrophils, Absolute' row.\n<answer>\n{text}\n</answer>"
+
+
+# (id, ANC printed on the report, what the fake model answers); None answers = local PDF path
+SYNTHETIC_CASES: Sequence[Tuple[str, Optional[float], Optional[str]]] = (
+    ("photo-normal", 2030, _answer("2030 per microliter")),
+    ("photo-thousands-separator", 4150, _answer("4,150 per microliter")),
+    ("photo-mild", 1210, _answer("1210 per microliter")),
+    ("photo-moderate", 760, _answer("760 cells per microliter")),
+    ("photo-severe", 420, _answer("420 per microliter")),
+    # The model forgot the K/uL multiplier: counted as wrong, and as critical instead of low
+    ("photo-missed-multiplier", 1850, _answer("1.85 per microliter")),
+    ("photo-no-anc", None, _answer("Absolute Neutrophil Count not found")),
+    ("pdf-normal", 2030, None),
+    ("pdf-severe", 380, None),
+)
+
+
+def write_synthetic_dataset(directory: Path) -> Dict[str, str]:
+    """Write the synthetic cases and their manifest; returns the fake model's answer per case."""
+    directory.mkdir(parents=True, exist_ok=True)
+    cases, answers = [], {}
+    for seed, (case_id, anc_value, answer) in enumerate(SYNTHETIC_CASES):
+        if answer is None:
+            page = [row if row[0] != "Neutrophils, Absolute" else (row[0], f"{anc_value / 1000:.2f}", *row[2:])
+                    for row in CBC_PAGE]
+            file_name, contents = f"{case_id}.pdf", lab_report_pdf((COVER_PAGE, page))
+        else:
+            file_name, contents = f"{case_id}.jpg", _report_photo(anc_value, seed)
+            answers[case_id] = answer
+        (directory / file_name).write_bytes(contents)
+        cases.append({"id": case_id, "file": file_name, "expected_anc": anc_value})
+    (directory / MANIFEST).write_text(json.dumps({"cases": cases}, indent=1))
+    return answers
+
+
+def run(dataset: Path, recordings: Path, record: bool, fake: Optional[FakeAnthropicServer] = None,
+        fake_answers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Run the dataset with the model recorded (or replayed) in `recordings`."""
+    cases = load_dataset(dataset)
+    # Every case must reach the extraction, so keep the result cache and the near-duplicate index out
+    os.environ["ANC_CACHE_MAX_ENTRIES"] = "0"
+    for name in ("ANC_CACHE_DB_PATH", "NEAR_DUP_MODE"):
+        os.environ.pop(name, None)
+    os.environ.update(MODEL_RECORDINGS_MODE="record" if record else "replay", MODEL_RECORDINGS_DIR=str(recordings))
+    if not record:
+        # Nothing leaves the process, but the client still wants a key
+        os.environ.setdefault("ANTHROPIC_API_KEY", "replay")
+    started = time.perf_counter()
+    rows = asyncio.run(run_cases(cases, fake, fake_answers))
+    return {
+        "revision": _git_revision(str(BACKEND_DIR)),
+        "dataset": str(dataset),
+        "recordings": f"{'recorded' if record else 'replayed'} from {recordings}",
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "summary": summarize(rows),
+        "rows": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=Path, help="directory with golden.json and the reports")
+    parser.add_argument("--recordings", type=Path, help="recorded model responses (default: <dataset>/recordings)")
+    parser.add_argument("--record", action="store_true", help="call the API and (re-)record every response")
+    parser.add_argument("--synthetic", type=Path, metavar="DIR",
+                        help="write a synthetic dataset to DIR, record it from the local fake API, then replay it")
+    parser.add_argument("--json", type=Path, help="save the run (with the git revision) to this file")
+    parser.add_argument("--baseline", type=Path, help="a run saved with --json to compare against")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        dataset = args.synthetic
+        recordings = args.recordings or dataset / "recordings"
+        fake = FakeAnthropicServer()
+        fake.start()
+        os.environ.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=fake.base_url)
+        try:
+            run(dataset, recordings, record=True, fake=fake, fake_answers=write_synthetic_dataset(dataset))
+        finally:
+            fake.stop()
+        result = run(dataset, recordings, record=False)
+    elif args.dataset:
+        result = run(args.dataset, args.recordings or args.dataset / "recordings", record=args.record)
+    else:
+        parser.error("give --dataset DIR or --synthetic DIR")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    report(result, baseline)
+    print(f"\n{result['summary']['cases']} cases in {result['elapsed_s']:.2f} s")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=1))
+
+
+if __name__ == "__main__":
+    main()
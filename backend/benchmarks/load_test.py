@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the backend API.
+
+Drives /upload, /upload/batch or /jobs either open-loop at a target request rate (--rps)
+or closed-loop with a fixed number of clients (--concurrency), then reports latency
+percentiles, error rate and throughput.
+
+Without --url the whole stack runs locally and offline: the fake Anthropic API in-process
+and the backend under uvicorn from --backend-dir. Save runs with --json and pass one as
+--baseline to compare commits:
+
+    python benchmarks/load_test.py --concurrency 32 --duration 20 --json before.json
+    python benchmarks/load_test.py --rps 40 --duration 20 --model-latency 1.5 --model-jitter 1
+    python benchmarks/load_test.py --endpoint jobs --concurrency 16 --baseline before.json
+    python benchmarks/load_test.py --url http://localhost:8000 --rps 5 --file cbc.jpg
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import httpx
+from PIL import Image, ImageDraw
+
+from bench_upload_memory import BACKEND_DIR, free_port, wait_until_up
+from fake_anthropic import FakeAnthropicServer
+
+ENDPOINTS = ("upload", "batch", "jobs")
+
+
+def sample_report_photo() -> bytes:
+    """A small phone-photo-sized JPEG of a table of numbers."""
+    image = Image.effect_noise((1600, 1200), 20).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for row in range(30):
+        draw.text((80, 60 + row * 36), f"WBC {row}   Neutrophils {1000 + row * 37}   cells/uL", fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class Payloads:
+    """
+    Upload bodies, cycled. Unless `repeat` is set, a request counter is appended after the
+    JPEG/PNG end marker (decoders ignore it) so every upload is distinct and neither the
+    result cache nor in-flight de-duplication can answer it.
+    """
+
+    def __init__(self, files: Sequence[Path], repeat: bool = False):
+        if files:
+            self.samples = [(path.name, path.read_bytes()) for path in files]
+        else:
+            self.samples = [("cbc.jpg", sample_report_photo())]
+        self.repeat = repeat
+        self._count = 0
+
+    def next(self) -> tuple:
+        name, contents = self.samples[self._count % len(self.samples)]
+        if not self.repeat:
+            contents = contents + self._count.to_bytes(8, "big")
+        self._count += 1
+        return name, contents
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def _call_upload(client: httpx.AsyncClient, payloads: Payloads, options: argparse.Namespace) -> str:
+    name, contents = payloads.next()
+    response = await client.post("/upload", files={"file": (name, contents, "application/octet-stream")})
+    return "ok" if response.status_code == 200 else str(response.status_code)
+
+
+async def _call_batch(client: httpx.AsyncClient, payloads: Payloads, options: argparse.Namespace) -> str:
+    files = [("files", (*payloads.next(), "application/octet-stream")) for _ in range(options.batch_size)]
+    async with client.stream("POST", "/upload/batch", files=files) as response:
+        if response.status_code != 200:
+            return str(response.status_code)
+        summary: Dict[str, Any] = {}
+        async for line in response.aiter_lines():
+            if line.startswith('{"summary"'):
+                summary = json.loads(line)["summary"]
+    return "ok" if summary.get("failed") == 0 else "item_failed"
+
+
+async def _call_jobs(client: httpx.AsyncClient, payloads: Payloads, options: argparse.Namespace) -> str:
+    name, contents = payloads.next()
+    response = await client.post("/jobs", files={"file": (name, contents, "application/octet-stream")})
+    if response.status_code != 202:
+        return str(response.status_code)
+    status_url = response.json()["status_url"]
+    while True:
+        await asyncio.sleep(options.poll_interval)
+        poll = await client.get(status_url)
+        if poll.status_code != 200:
+            return f"poll_{poll.status_code}"
+        job = poll.json()
+        if job["status"] == "succeeded":
+            return "ok"
+        if job["status"] == "failed":
+            return "job_failed"
+
+
+CALLS: Dict[str, Callable[[httpx.AsyncClient, Payloads, argparse.Namespace], Awaitable[str]]] = {
+    "upload": _call_upload,
+    "batch": _call_batch,
+    "jobs": _call_jobs,
+}
+
+
+async def run_load(client: httpx.AsyncClient, options: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run one load test with `client` and return the summary.
+
+    Open loop (options.rps): request i is due at i / rps seconds and its latency is measured
+    from that due time, so a slow server cannot hold back the offered load (no coordinated
+    omission). Closed loop (options.concurrency): each client sends its next request when the
+    previous one finishes. The run stops after options.duration seconds or options.requests
+    requests, whichever comes first.
+    """
+    call = CALLS[options.endpoint]
+    payloads = Payloads([Path(f) for f in options.file], options.repeat)
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    max_requests = options.requests or sys.maxsize
+    started = time.perf_counter()
+    deadline = started + options.duration
+
+    async def one(due: float) -> None:
+        try:
+            outcome = await call(client, payloads, options)
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        latencies.append(time.perf_counter() - due)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    if options.rps:
+        tasks = []
+        for index in range(max_requests):
+            due = started + index / options.rps
+            if due >= deadline:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(due)))
+        await asyncio.gather(*tasks)
+    else:
+        sent = 0
+
+        async def closed_loop_client() -> None:
+            nonlocal sent
+            while sent < max_requests and time.perf_counter() < deadline:
+                sent += 1
+                await one(time.perf_counter())
+
+        await asyncio.gather(*[closed_loop_client() for _ in range(options.concurrency)])
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    total = len(latencies)
+    errors = total - outcomes.get("ok", 0)
+    return {
+        "endpoint": options.endpoint,
+        "mode": f"open loop, {options.rps} rps" if options.rps else f"closed loop, {options.concurrency} clients",
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "outcomes": outcomes,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(outcomes.get("ok", 0) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(value * 1000, 1) for name, value in (
+                ("p50", percentile(latencies, 0.50)),
+                ("p95", percentile(latencies, 0.95)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", latencies[-1] if latencies else 0.0),
+            )
+        },
+    }
+
+
+def _git_revision(directory: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    def delta(now: float, before: Optional[float]) -> str:
+        if not before:
+            return ""
+        return f"   ({(now - before) / before * 100:+.1f}% vs {baseline.get('revision', 'baseline')})"
+
+    latency = result["latency_ms"]
+    old_latency = baseline["latency_ms"] if baseline else {}
+    print(f"target:       {result['target']} ({result.get('revision', 'unknown')})")
+    print(f"endpoint:     /{result['endpoint']}, {result['mode']}")
+    print(f"requests:     {result['requests']} in {result['elapsed_s']} s, outcomes {result['outcomes']}")
+    print(f"error rate:   {result['error_rate'] * 100:.2f}%")
+    print(f"throughput:   {result['throughput_rps']} req/s"
+          f"{delta(result['throughput_rps'], baseline and baseline['throughput_rps'])}")
+    for name in ("p50", "p95", "p99", "max"):
+        print(f"latency {name + ':':5} {latency[name]:>8.1f} ms{delta(latency[name], old_latency.get(name))}")
+
+
+async def _drive(url: str, options: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=options.max_connections, max_keepalive_connections=options.max_connections)
+    async with httpx.AsyncClient(base_url=url, timeout=options.timeout, limits=limits) as client:
+        return await run_load(client, options)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, help="open loop: requests started per second")
+    mode.add_argument("--concurrency", type=int, default=16, help="closed loop: parallel clients (default 16)")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="upload")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to generate load")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--file", action="append", default=[], help="report image(s) to upload, cycled")
+    parser.add_argument("--repeat", action="store_true", help="send identical bytes (exercises the result cache)")
+    parser.add_argument("--batch-size", type=int, default=10, help="reports per /upload/batch request")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between /jobs polls")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--url", help="existing server to test (default: start the backend locally)")
+    parser.add_argument("--backend-dir", default=str(BACKEND_DIR), help="backend checkout to start")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local backend")
+    parser.add_argument("--model-latency", type=float, default=1.0, help="fake model latency in seconds")
+    parser.add_argument("--model-jitter", type=float, default=0.5, help="extra random fake model latency")
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--baseline", help="earlier --json result to compare against")
+    options = parser.parse_args()
+    if options.rps:
+        options.concurrency = None
+
+    fake = server = None
+    url = options.url
+    if url is None:
+        fake = FakeAnthropicServer(latency=options.model_latency, jitter=options.model_jitter)
+        fake.start()
+        port = free_port()
+        env = dict(
+            os.environ,
+            ANTHROPIC_API_KEY="fake",
+            ANTHROPIC_BASE_URL=fake.base_url,
+        )
+        if options.workers > 1:
+            # Any worker may answer a /jobs poll, so job state has to be shared
+            env.update(JOB_STORE="sqlite", JOB_DB_PATH=os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+             "--workers", str(options.workers)],
+            cwd=options.backend_dir, env=env, stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_up(url))
+        result = asyncio.run(_drive(url, options))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if fake is not None:
+            fake.stop()
+
+    result["target"] = options.url or options.backend_dir
+    result["revision"] = _git_revision(options.backend_dir) if options.url is None else "remote"
+    if fake is not None:
+        result["model_calls"] = fake.request_count
+        result["model_latency_s"] = [options.model_latency, options.model_latency + options.model_jitter]
+    baseline = json.loads(Path(options.baseline).read_text()) if options.baseline else None
+    print_report(result, baseline)
+    if options.json:
+        Path(options.json).write_text(json.dumps(result, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Synthetic lab-report PDFs with a real text layer, for the tests and benchmarks.
+
+Rows are laid out the way browser "Save as PDF" exports do: every table cell is its own
+positioned text run on the row's baseline. With font="type0" the text is written as glyph
+ids of a composite font and only readable through its ToUnicode map (like most generated
+reports); font="type1" uses a standard font with plain WinAnsi strings.
+"""
+
+import zlib
+from typing import Dict, List, Sequence, Union
+
+Row = Union[str, Sequence[str]]
+
+CBC_PAGE: List[Row] = [
+    "City Hospital Laboratory - Complete Blood Count",
+    ("Test", "Result", "Reference range", "Units"),
+    ("WBC", "4.8", "4.0 - 11.0", "K/µL"),
+    ("Hemoglobin", "12.9", "12.0 - 16.0", "g/dL"),
+    ("Neutrophils", "42.3", "40 - 75", "%"),
+    ("Neutrophils, Absolute", "2.03", "1.50 - 8.00", "K/µL"),
+    ("Lymphocytes, Absolute", "1.95", "1.00 - 4.80", "K/µL"),
+    ("Platelets", "231", "150 - 400", "K/µL"),
+]
+COVER_PAGE: List[Row] = ["Patient report", "Name: Test Patient", "Collected: 2026-01-05 08:10"]
+
+
+def _escape(text: bytes) -> bytes:
+    return text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _content(rows: Sequence[Row], encode) -> bytes:
+    commands = []
+    y = 760
+    for row in rows:
+        cells = [row] if isinstance(row, str) else row
+        for column, cell in enumerate(cells):
+            commands.append(b"BT /F1 10 Tf 1 0 0 1 %d %d Tm %s Tj ET" % (40 + 140 * column, y, encode(cell)))
+        y -= 18
+    return b"\n".join(commands)
+
+
+def lab_report_pdf(pages: Sequence[Sequence[Row]] = (COVER_PAGE, CBC_PAGE), font: str = "type0",
+                   compress: bool = True) -> bytes:
+    """A PDF with one page per entry of `pages`, each a list of lines or table rows."""
+    glyphs: Dict[str, int] = {}
+
+    def encode_type0(text: str) -> bytes:
+        codes = [glyphs.setdefault(char, len(glyphs) + 3) for char in text]
+        return b"<" + b"".join(b"%04X" % code for code in codes) + b">"
+
+    def encode_type1(text: str) -> bytes:
+        return b"(" + _escape(text.encode("cp1252")) + b")"
+
+    encode = encode_type0 if font == "type0" else encode_type1
+    contents = [_content(rows, encode) for rows in pages]
+
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(data: bytes, extra: bytes = b"") -> bytes:
+        if compress:
+            data = zlib.compress(data)
+            extra += b" /Filter /FlateDecode"
+        return b"<< /Length %d%s >>\nstream\n%s\nendstream" % (len(data), extra, data)
+
+    catalog = add(b"")
+    pages_num = add(b"")
+    if font == "type0":
+        cmap = b"\n".join([
+            b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+            b"1 begincodespacerange <0000> <FFFF> endcodespacerange",
+            b"%d beginbfchar" % len(glyphs),
+            *[b"<%04X> <%s>" % (code, char.encode("utf-16-be").hex().upper().encode())
+              for char, code in glyphs.items()],
+            b"endbfchar endcmap CMapName currentdict /CMap defineresource pop end end",
+        ])
+        to_unicode = add(stream(cmap))
+        descendant = add(b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /Arial "
+                         b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> >>")
+        font_num = add(b"<< /Type /Font /Subtype /Type0 /BaseFont /Arial /Encoding /Identity-H "
+                       b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (descendant, to_unicode))
+    else:
+        font_num = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    page_nums = []
+    for content in contents:
+        content_num = add(stream(content))
+        page_nums.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                             b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_num, content_num, font_num)))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_num
+    objects[pages_num - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % num for num in page_nums), len(page_nums))
+
+    out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def form_bomb_pdf(levels: int = 1, draws: int = 1000, operators: int = 1000) -> bytes:
+    """
+    A hostile PDF of well under a KB: one page draws a form XObject `draws` times, each form
+    level draws the next one as often, and the innermost holds `operators` no-op operators.
+    Interpreting it naively costs draws**levels * operators operators.
+    """
+    def stream(data: bytes, extra: bytes) -> bytes:
+        data = zlib.compress(data, 9)
+        return b"<< /Length %d /Filter /FlateDecode%s >>\nstream\n%s\nendstream" % (len(data), extra, data)
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>", b"",
+               stream(b"q Q " * operators, b" /Subtype /Form")]
+    for _ in range(levels - 1):
+        objects.append(stream(b"/X Do " * draws, b" /Subtype /Form /Resources << /XObject << /X %d 0 R >> >>"
+                              % len(objects)))
+    objects.append(stream(b"/X Do " * draws, b""))
+    objects[2] = b"<< /Type /Page /Parent 2 0 R /Contents %d 0 R /Resources << /XObject << /X %d 0 R >> >> >>" % (
+        len(objects), len(objects) - 1)
+
+    out = bytearray(b"%PDF-1.7\n")
+    for num, body in enumerate(objects, start=1):
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\n%%%%EOF\n" % (len(objects) + 1)
+    return bytes(out)
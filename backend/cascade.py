@@ -0,0 +1,137 @@
+import bisect
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Sequence
+
+from anthropic_client import estimate_cost
+from metrics import CASCADE_ANSWERS
+from tracing import log
+
+# Two-tier model cascade for ANC extraction (ANC_CASCADE=1).
+# Tier 1 reads a downscaled image with the short structured prompt; tier 2 re-reads the
+# full-resolution image (optionally with a stronger model) only when tier 1 is unsure.
+# ANC_CASCADE_FAST_MODEL          - tier 1 model (default: the extraction model)
+# ANC_CASCADE_FAST_LONG_EDGE      - tier 1 image long edge in pixels
+# ANC_CASCADE_FAST_MAX_PIXELS     - tier 1 image pixel budget
+# ANC_CASCADE_ESCALATION_MODEL    - tier 2 model (default: the extraction model)
+# ANC_CASCADE_ESCALATION_MODE     - tier 2 extraction mode, "reasoning" or "structured"
+# ANC_CASCADE_MIN_CONFIDENCE      - tier 1 answers below this confidence escalate
+# ANC_CASCADE_CUTOFF_MARGIN       - relative margin around the severity cutoffs that escalates
+DEFAULT_FAST_LONG_EDGE = 1024
+DEFAULT_FAST_MAX_PIXELS = 600_000
+DEFAULT_MIN_CONFIDENCE = 0.8
+DEFAULT_CUTOFF_MARGIN = 0.1
+
+AncExtractor = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class CascadeConfig(NamedTuple):
+    fast_model: str
+    fast_long_edge: int
+    fast_max_pixels: int
+    escalation_model: str
+    escalation_mode: str
+    min_confidence: float
+    cutoff_margin: float
+
+
+def cascade_enabled() -> bool:
+    return os.getenv("ANC_CASCADE", "0") == "1"
+
+
+def cascade_config(default_model: str) -> CascadeConfig:
+    """Cascade settings from the environment; both tiers default to `default_model`."""
+    return CascadeConfig(
+        fast_model=os.getenv("ANC_CASCADE_FAST_MODEL", default_model),
+        fast_long_edge=int(os.getenv("ANC_CASCADE_FAST_LONG_EDGE", str(DEFAULT_FAST_LONG_EDGE))),
+        fast_max_pixels=int(os.getenv("ANC_CASCADE_FAST_MAX_PIXELS", str(DEFAULT_FAST_MAX_PIXELS))),
+        escalation_model=os.getenv("ANC_CASCADE_ESCALATION_MODEL", default_model),
+        escalation_mode=os.getenv("ANC_CASCADE_ESCALATION_MODE", "reasoning"),
+        min_confidence=float(os.getenv("ANC_CASCADE_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE))),
+        cutoff_margin=float(os.getenv("ANC_CASCADE_CUTOFF_MARGIN", str(DEFAULT_CUTOFF_MARGIN))),
+    )
+
+
+def escalation_reason(result: Dict[str, Any], config: CascadeConfig, cutoffs: Sequence[float]) -> Optional[str]:
+    """
+    Why a tier 1 result is not trusted, or None to accept it.
+
+    A value is "near a cutoff" when moving it by the configured margin either way would put
+    the report in a different severity band - a small misread there changes the advice.
+    """
+    if result["status"] == "not_found":
+        return None
+    if result["status"] != "success" or result.get("anc_value") is None:
+        return result["status"]
+    confidence = result.get("confidence")
+    if confidence is not None and confidence < config.min_confidence:
+        return "low_confidence"
+    value = result["anc_value"]
+    low = bisect.bisect_right(cutoffs, value * (1 - config.cutoff_margin))
+    high = bisect.bisect_right(cutoffs, value * (1 + config.cutoff_margin))
+    if low != high:
+        return "near_cutoff"
+    return None
+
+
+def _band(result: Dict[str, Any], cutoffs: Sequence[float]) -> Optional[int]:
+    if result["status"] != "success" or result.get("anc_value") is None:
+        return None
+    return bisect.bisect_right(cutoffs, result["anc_value"])
+
+
+async def run_cascade(image_bytes: bytes, extract: AncExtractor, config: CascadeConfig,
+                      cutoffs: Sequence[float]) -> Dict[str, Any]:
+    """
+    Extract the ANC with the cheap tier first and escalate only when needed.
+
+    The returned result is the answering tier's, with a "cascade" entry recording which tier
+    answered, why it escalated, whether the two tiers agreed on the severity band, and the
+    latency and estimated cost of each tier.
+    """
+    tiers = []
+
+    async def run_tier(tier: int, **options: Any) -> Dict[str, Any]:
+        started = time.perf_counter()
+        call_info: Dict[str, Any] = {}
+        result = await extract(image_bytes, call_info=call_info, **options)
+        # A cache hit repeats the original call's usage but costs nothing
+        cost = 0.0 if call_info.get("cached") else estimate_cost(options["model"], result.get("usage"))
+        tiers.append({
+            "tier": tier,
+            "model": options["model"],
+            "mode": result.get("mode"),
+            "status": result["status"],
+            "anc_value": result.get("anc_value"),
+            "confidence": result.get("confidence"),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cached": bool(call_info.get("cached")),
+            "cost_usd": round(cost, 6),
+        })
+        return result
+
+    first = await run_tier(
+        1, mode="structured", model=config.fast_model,
+        max_long_edge=config.fast_long_edge, max_pixels=config.fast_max_pixels
+    )
+    reason = escalation_reason(first, config, cutoffs)
+    answer, bands_agree = first, None
+    if reason is not None:
+        log(f"ANC cascade escalating ({reason})")
+        answer = await run_tier(2, mode=config.escalation_mode, model=config.escalation_model)
+        first_band, second_band = _band(first, cutoffs), _band(answer, cutoffs)
+        if first_band is not None and second_band is not None:
+            bands_agree = first_band == second_band
+
+    tier = tiers[-1]["tier"]
+    CASCADE_ANSWERS.inc(tier=str(tier), reason=reason or "accepted")
+    answer = dict(answer)
+    answer["cascade"] = {
+        "tier": tier,
+        "escalation_reason": reason,
+        "bands_agree": bands_agree,
+        "latency_ms": round(sum(t["latency_ms"] for t in tiers), 1),
+        "cost_usd": round(sum(t["cost_usd"] for t in tiers), 6),
+        "tiers": tiers,
+    }
+    return answer
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from tracing import bind_progress
+
+# Server-sent events (text/event-stream) for POST /upload/stream.
+# A comment line is sent after KEEPALIVE_SECONDS without events, so proxies and mobile
+# networks do not close a quiet connection while the model is still thinking.
+KEEPALIVE_SECONDS = 15.0
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def stream_progress(run: Callable[[], Awaitable[Dict[str, Any]]], result_event: str,
+                          describe_error: Callable[[Exception], Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Run `run()` with a progress sink bound and stream each progress event it emits as it
+    happens, then its return value as `result_event` ({"result": ...}) or, if it raised, an
+    `error` event with `describe_error(exception)`. Every event carries `elapsed_ms` since the
+    stream started. Closing the stream (the client went away) cancels the work.
+    """
+    started = time.perf_counter()
+    events: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def sink(event: str, data: Dict[str, Any]) -> None:
+        events.put_nowait((event, dict(data, elapsed_ms=elapsed_ms())))
+
+    async def work() -> Dict[str, Any]:
+        # Bound in the task's own context, so only this request's pipeline reports here
+        bind_progress(sink)
+        return await run()
+
+    task = asyncio.create_task(work())
+    task.add_done_callback(lambda _task: events.put_nowait(None))
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            yield sse_event(*item)
+        try:
+            result = task.result()
+        except Exception as e:
+            yield sse_event("error", dict(describe_error(e), elapsed_ms=elapsed_ms()))
+        else:
+            yield sse_event(result_event, {"result": result, "elapsed_ms": elapsed_ms()})
+    finally:
+        task.cancel()
@@ -0,0 +1,132 @@
+import asyncio
+import math
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from metrics import MODEL_HEDGES
+
+# Hedged requests: when a call is slower than the recent p95, send a duplicate and take
+# whichever answers first. A budget caps duplicates to a fraction of all calls, and a hedge
+# also needs an immediately available rate limiter token, so it never adds to 429 pressure.
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_MAX_EXTRA = 0.05
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 200
+
+
+class LatencyTracker:
+    """Recent call latencies; the percentile is recomputed at most every `refresh` samples."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW, min_samples: int = DEFAULT_MIN_SAMPLES, refresh: int = 10):
+        self.min_samples = min_samples
+        self.refresh = max(1, refresh)
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._since_refresh = 0
+        self._cached: Dict[float, float] = {}
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh:
+            self._since_refresh = 0
+            self._cached.clear()
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until `min_samples` latencies have been seen."""
+        if len(self._samples) < self.min_samples:
+            return None
+        if fraction not in self._cached:
+            ordered = sorted(self._samples)
+            self._cached[fraction] = ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+        return self._cached[fraction]
+
+
+class HedgeBudget:
+    """
+    Token bucket that earns `max_extra` of a hedge per call, so duplicates stay below that
+    share of traffic. `burst` bounds how many hedges can be saved up during quiet periods.
+    """
+
+    def __init__(self, max_extra: float = DEFAULT_MAX_EXTRA, burst: float = 5.0):
+        self.max_extra = max_extra
+        self.burst = burst
+        self._tokens = 0.0
+
+    def earn(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.max_extra)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0 - 1e-9:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def refund(self) -> None:
+        self._tokens = min(self.burst, self._tokens + 1.0)
+
+
+class Hedger:
+    """Runs calls with a hedge after the tracked p95 latency of calls with the same key."""
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, max_extra: float = DEFAULT_MAX_EXTRA,
+                 min_samples: int = DEFAULT_MIN_SAMPLES):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = HedgeBudget(max_extra)
+        self._trackers: Dict[Hashable, LatencyTracker] = {}
+
+    def tracker(self, key: Hashable) -> LatencyTracker:
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = LatencyTracker(min_samples=self.min_samples)
+        return tracker
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]],
+                  admit: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Await `call()`; if it is still running after the p95 delay and the budget allows,
+        start a second `call()` and return the first successful result. The loser is cancelled.
+        `admit()`, when given, must also agree (without waiting) before the hedge is sent;
+        it is the rate limiter's try_acquire, so hedges only use spare request capacity.
+        Fails only when every started call failed (with the first call's error).
+        """
+        tracker = self.tracker(key)
+        self.budget.earn()
+        loop = asyncio.get_running_loop()
+
+        async def timed() -> Any:
+            started = loop.time()
+            result = await call()
+            tracker.add(loop.time() - started)
+            return result
+
+        primary = asyncio.ensure_future(timed())
+        tasks = [primary]
+        try:
+            delay = tracker.percentile(self.percentile)
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if not self.budget.try_spend():
+                MODEL_HEDGES.inc(outcome="over_budget")
+                return await primary
+            if admit is not None and not admit():
+                self.budget.refund()
+                MODEL_HEDGES.inc(outcome="rate_limited")
+                return await primary
+
+            tasks.append(asyncio.ensure_future(timed()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        MODEL_HEDGES.inc(outcome="primary_won" if task is primary else "hedge_won")
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
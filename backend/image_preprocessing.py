@@ -0,0 +1,158 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Vision models downscale anything larger than this before looking at it, so sending more
+# pixels only costs upload time. See Anthropic's vision docs ("Evaluate image size").
+# IMAGE_MAX_LONG_EDGE    - longest edge in pixels after downsampling
+# IMAGE_MAX_PIXELS       - total pixel budget after downsampling
+# IMAGE_JPEG_QUALITY     - JPEG quality used when re-encoding
+# IMAGE_PREPROCESSING    - set to "0" to send uploads unchanged
+# IMAGE_PREPROCESS_WORKERS - size of the thread pool the stage runs in
+DEFAULT_MAX_LONG_EDGE = 1568
+DEFAULT_MAX_PIXELS = 1_150_000
+DEFAULT_JPEG_QUALITY = 80
+ORIENTATION_TAG = 0x0112
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _config() -> Tuple[int, int, int]:
+    return (
+        int(os.getenv("IMAGE_MAX_LONG_EDGE", str(DEFAULT_MAX_LONG_EDGE))),
+        int(os.getenv("IMAGE_MAX_PIXELS", str(DEFAULT_MAX_PIXELS))),
+        int(os.getenv("IMAGE_JPEG_QUALITY", str(DEFAULT_JPEG_QUALITY))),
+    )
+
+
+def preprocessing_enabled() -> bool:
+    return os.getenv("IMAGE_PREPROCESSING", "1") != "0"
+
+
+def sniff_image_type(image_bytes: bytes) -> Optional[str]:
+    """Identify a supported image format from its magic bytes, or None if it is not one."""
+    if image_bytes.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if image_bytes.startswith(b'GIF87a') or image_bytes.startswith(b'GIF89a'):
+        return "image/gif"
+    if len(image_bytes) >= 12 and image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return "image/webp"
+    return None
+
+
+def detect_media_type(image_bytes: bytes) -> str:
+    """Detect the image media type from its magic bytes."""
+    # Default to JPEG if format cannot be determined
+    return sniff_image_type(image_bytes) or "image/jpeg"
+
+
+def _target_size(width: int, height: int, max_long_edge: int, max_pixels: int) -> Tuple[int, int]:
+    scale = min(1.0, max_long_edge / max(width, height), (max_pixels / (width * height)) ** 0.5)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def preprocess_image(image_bytes: bytes, max_long_edge: Optional[int] = None,
+                     max_pixels: Optional[int] = None) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Shrink a report photo to what the vision model actually uses.
+    Decodes once, applies EXIF orientation, converts to grayscale, downsamples to the
+    model's effective resolution (or the smaller limits given) and re-encodes as JPEG.
+
+    Returns:
+        (image bytes to send, media type, stats with bytes in/out and per-step timings in ms)
+    """
+    default_long_edge, default_max_pixels, quality = _config()
+    max_long_edge = max_long_edge or default_long_edge
+    max_pixels = max_pixels or default_max_pixels
+    timings: Dict[str, float] = {}
+    stats: Dict[str, Any] = {"bytes_in": len(image_bytes), "timings_ms": timings}
+    started = time.perf_counter()
+
+    def mark(step: str) -> None:
+        nonlocal started
+        now = time.perf_counter()
+        timings[step] = round((now - started) * 1000, 3)
+        started = now
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        original_size = image.size
+        target_size = _target_size(*original_size, max_long_edge, max_pixels)
+        # Let the JPEG decoder do most of the downscaling (DCT scaling) and skip colour conversion
+        if image.format == "JPEG":
+            image.draft("L", target_size)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        stats.update({"skipped": f"decode failed: {e}", "bytes_out": len(image_bytes)})
+        return image_bytes, detect_media_type(image_bytes), stats
+    mark("decode")
+
+    orientation = image.getexif().get(ORIENTATION_TAG, 1)
+    if orientation != 1:
+        ImageOps.exif_transpose(image, in_place=True)
+    mark("exif_orientation")
+
+    # Transparent areas would turn black in grayscale, hiding dark text; put them on white paper
+    flattened = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if flattened:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    if image.mode != "L":
+        image = image.convert("L")
+    mark("grayscale")
+
+    target_size = _target_size(*image.size, max_long_edge, max_pixels)
+    if target_size != image.size:
+        image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    mark("downsample")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    output = buffer.getvalue()
+    mark("encode")
+
+    stats.update({
+        "original_size": list(original_size),
+        "output_size": list(image.size),
+        "exif_orientation": orientation,
+        "flattened_transparency": flattened,
+    })
+    # A small, already-compressed upload can grow when re-encoded; send the original then
+    if len(output) >= len(image_bytes) and orientation == 1 and image.size == original_size and not flattened:
+        stats.update({"skipped": "re-encoded image was not smaller", "bytes_out": len(image_bytes)})
+        return image_bytes, detect_media_type(image_bytes), stats
+
+    stats["bytes_out"] = len(output)
+    return output, "image/jpeg", stats
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+        _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image-preprocess")
+    return _executor
+
+
+async def preprocess_image_async(image_bytes: bytes, max_long_edge: Optional[int] = None,
+                                 max_pixels: Optional[int] = None) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Run `preprocess_image` in the pre-processing thread pool so decoding never blocks the event loop.
+    When pre-processing is disabled the upload is passed through unchanged.
+    """
+    if not preprocessing_enabled():
+        size = len(image_bytes)
+        return image_bytes, detect_media_type(image_bytes), {
+            "bytes_in": size, "bytes_out": size, "timings_ms": {}, "skipped": "disabled"
+        }
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), preprocess_image, image_bytes, max_long_edge, max_pixels)
@@ -0,0 +1,159 @@
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import UploadFile
+
+from image_preprocessing import sniff_image_type
+from pdf_text import PDF_MAGIC
+from metrics import UPLOAD_BYTES
+from tracing import span
+
+# Upload size limits.
+# MAX_UPLOAD_BYTES         - largest single report accepted (default 20 MB)
+# BATCH_MAX_REQUEST_BYTES  - largest /upload/batch request body (default 512 MB)
+DEFAULT_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+DEFAULT_BATCH_MAX_REQUEST_BYTES = 512 * 1024 * 1024
+# Room for the multipart boundaries and part headers around a single file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+SNIFF_BYTES = 16
+
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png")
+ALLOWED_REPORT_TYPES = ALLOWED_IMAGE_TYPES + ("application/pdf",)
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):g}"
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"File is larger than the {_megabytes(limit)} MB upload limit")
+        self.limit = limit
+
+
+class UnsupportedUpload(ValueError):
+    pass
+
+
+def sniff_report_type(head: bytes) -> Optional[str]:
+    """Identify an image or PDF report from its magic bytes, or None."""
+    if head.startswith(PDF_MAGIC):
+        return "application/pdf"
+    return sniff_image_type(head)
+
+
+def max_upload_bytes() -> int:
+    return int(os.getenv("MAX_UPLOAD_BYTES", str(DEFAULT_MAX_UPLOAD_BYTES)))
+
+
+def batch_max_request_bytes() -> int:
+    return int(os.getenv("BATCH_MAX_REQUEST_BYTES", str(DEFAULT_BATCH_MAX_REQUEST_BYTES)))
+
+
+async def read_image_upload(file: UploadFile, max_bytes: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Read an uploaded report (image or PDF) with exactly one in-memory copy.
+
+    The multipart parser has already spooled the part to a temporary file (on disk once it
+    passes 1 MB), so the size is checked and the format sniffed from the first bytes before
+    the body is loaded. The declared content type is ignored: the magic bytes decide.
+
+    Returns:
+        (file contents, sniffed media type)
+    Raises:
+        UploadTooLarge, UnsupportedUpload
+    """
+    limit = max_bytes if max_bytes is not None else max_upload_bytes()
+
+    head = await file.read(SNIFF_BYTES)
+    with span("media_type_sniff"):
+        media_type = sniff_report_type(head)
+    if media_type not in ALLOWED_REPORT_TYPES:
+        declared = (file.content_type or "unknown").lower()
+        raise UnsupportedUpload(
+            f"File type {media_type or declared} not supported. Please upload JPG, PNG or PDF."
+        )
+
+    size = file.size
+    if size is None:
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+    if size > limit:
+        raise UploadTooLarge(limit)
+
+    with span("upload_read"):
+        await file.seek(0)
+        contents = await file.read()
+    UPLOAD_BYTES.observe(len(contents))
+    return contents, media_type
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware that refuses oversized request bodies with 413 before they are buffered.
+
+    A Content-Length above the limit is rejected without reading the body; chunked bodies are
+    counted as they stream in and cut off as soon as they pass the limit.
+    """
+
+    def __init__(self, app: Any, limit_for_path: Callable[[str], int]):
+        self.app = app
+        self.limit_for_path = limit_for_path
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]],
+                       send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for_path(scope["path"])
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await _send_413(send, limit)
+            return
+
+        state = {"received": 0, "too_large": False, "replied": False}
+
+        async def limited_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > limit:
+                    state["too_large"] = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Dict[str, Any]) -> None:
+            # The framework turns the aborted body read into its own error response; replace it
+            if state["too_large"]:
+                if not state["replied"]:
+                    state["replied"] = True
+                    await _send_413(send, limit)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not state["replied"]:
+                await _send_413(send, limit)
+
+
+async def _send_413(send: Callable[[Dict[str, Any]], Awaitable[None]], limit: int) -> None:
+    body = json.dumps({"detail": f"Request body is larger than the {_megabytes(limit)} MB limit"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tracing import bind_request, log
+
+# Asynchronous report-processing jobs.
+# JOB_WORKERS       - number of jobs processed concurrently per worker process
+# JOB_MAX_QUEUE     - queued jobs accepted before POST /jobs answers 429
+# JOB_STORE         - "memory" (default) or "sqlite"
+# JOB_DB_PATH       - SQLite file used when JOB_STORE=sqlite
+# JOB_TTL_SECONDS   - how long finished jobs are kept for polling
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_DB_PATH = "jobs.sqlite3"
+
+JobHandler = Callable[[bytes, str, str], Awaitable[Dict[str, Any]]]
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue is at its depth limit."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class JobStore(ABC):
+    """Interface for job state storage."""
+
+    @abstractmethod
+    async def create(self, job: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def prune(self, finished_before: float) -> int:
+        """Delete finished jobs older than `finished_before`; returns how many were removed."""
+
+
+class MemoryJobStore(JobStore):
+    """Job state in a dict; visible only to the worker process that created the job."""
+
+    def __init__(self) -> None:
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def prune(self, finished_before: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in FINISHED_STATUSES and job["finished_at"] < finished_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """Job state in a SQLite file, so any uvicorn worker can answer GET /jobs/{id}."""
+
+    _COLUMNS = ("job_id", "status", "file_name", "created_at", "started_at", "finished_at", "result", "error")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, file_name TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    async def create(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO jobs (job_id, status, file_name, created_at) VALUES (?, ?, ?, ?)",
+            (job["job_id"], job["status"], job["file_name"], job["created_at"]),
+        )
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields if name in self._COLUMNS)
+        values = tuple(value for name, value in fields.items() if name in self._COLUMNS)
+        await asyncio.to_thread(self._write, f"UPDATE jobs SET {assignments} WHERE job_id = ?", values + (job_id,))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, job_id)
+
+    async def prune(self, finished_before: float) -> int:
+        return await asyncio.to_thread(
+            self._write, "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,)
+        )
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self._COLUMNS, row))
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+
+class JobManager:
+    """
+    Bounded in-process worker pool for report-processing jobs.
+    Submissions beyond `max_queue` waiting jobs are refused with JobQueueFull.
+    """
+
+    def __init__(self, handler: JobHandler, store: JobStore, workers: int = DEFAULT_WORKERS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.handler = handler
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.ttl_seconds = ttl_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Jobs accepted but not yet picked up by a worker; counted before any await so the limit is exact
+        self._waiting = 0
+        # Moving average of job duration, used to estimate Retry-After
+        self._avg_duration = 5.0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up."""
+        waves = self.queue_depth() / self.workers
+        return max(1, int(round(waves * self._avg_duration)))
+
+    async def submit(self, file_contents: bytes, content_type: str, file_name: str) -> Dict[str, Any]:
+        queue = self._ensure_started()
+        if self._waiting >= self.max_queue:
+            raise JobQueueFull(self.retry_after())
+        self._waiting += 1
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "file_name": file_name,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            await self.store.create(job)
+        except BaseException:
+            self._waiting -= 1
+            raise
+        queue.put_nowait((job["job_id"], file_contents, content_type, file_name))
+        await self.store.prune(time.time() - self.ttl_seconds)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id)
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            job_id, file_contents, content_type, file_name = await queue.get()
+            self._waiting -= 1
+            started = time.time()
+            # Log lines and stage timings of this job carry the job id
+            bind_request(f"job-{job_id[:12]}")
+            try:
+                await self.store.update(job_id, status="running", started_at=started)
+                result = await self.handler(file_contents, content_type, file_name)
+                await self.store.update(job_id, status="succeeded", result=result, finished_at=time.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log(f"Job {job_id} failed: {str(e)}")
+                await self.store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.time() - started)
+                queue.task_done()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._waiting = 0
+
+
+def create_job_store() -> JobStore:
+    """Build the job store selected by JOB_STORE."""
+    kind = os.getenv("JOB_STORE", "memory").lower()
+    if kind == "sqlite":
+        return SQLiteJobStore(os.getenv("JOB_DB_PATH", DEFAULT_DB_PATH))
+    if kind != "memory":
+        raise ValueError(f"Unknown JOB_STORE: {kind}. Use 'memory' or 'sqlite'.")
+    return MemoryJobStore()
+
+
+def create_job_manager(handler: JobHandler) -> JobManager:
+    """Build a JobManager configured from the environment."""
+    return JobManager(
+        handler,
+        create_job_store(),
+        workers=int(os.getenv("JOB_WORKERS", str(DEFAULT_WORKERS))),
+        max_queue=int(os.getenv("JOB_MAX_QUEUE", str(DEFAULT_MAX_QUEUE))),
+        ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+    )
@@ -1,11 +1,64 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import asyncio
+import math
+import os
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, File, Form, Header, Query, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
+import metrics
+from anc_history import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, close_anc_history, get_anc_history
+from anthropic_client import close_anthropic_client, upstream_stats, warm_up_anthropic_client
 from report_processor import process_medical_report
 from recommendation_engine import get_recommendation
+from result_cache import get_result_cache
+from jobs import JobManager, JobQueueFull, create_job_manager
+from batch import BatchItem, DEFAULT_CONCURRENCY, DEFAULT_MAX_FILES, is_zip_upload, items_from_zip, stream_batch_ndjson
+from ingest import (
+    ALLOWED_REPORT_TYPES, MULTIPART_OVERHEAD_BYTES, RequestSizeLimitMiddleware, UnsupportedUpload, UploadTooLarge,
+    batch_max_request_bytes, max_upload_bytes, read_image_upload, sniff_report_type
+)
+from rate_limit import BREAKER_STATES, UpstreamUnavailable
+from event_stream import stream_progress
+from profiling import ProfilingMiddleware, RequestProfiler, get_request_profiler
+from tracing import RequestContextMiddleware, emit_progress, log, span
+
+# Set once the startup warm-up has finished; GET /ready answers 503 until then
+_readiness: Dict[str, Any] = {"ready": False}
+
+
+async def _warm_up() -> None:
+    _readiness["model_client"] = await warm_up_anthropic_client()
+    _readiness["ready"] = True
+    log(f"Ready: model client {_readiness['model_client']}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup: build the pooled model client and open its connections in the background,
+    so the first uploads after a deploy don't pay for DNS/TLS. Shutdown: stop the job
+    workers, commit queued ANC history points and close the connection pool.
+    """
+    _readiness.clear()
+    _readiness["ready"] = False
+    warm_up = asyncio.create_task(_warm_up())
+    try:
+        yield
+    finally:
+        _readiness["ready"] = False
+        warm_up.cancel()
+        if _job_manager is not None:
+            await _job_manager.stop()
+        await close_anc_history()
+        await close_anthropic_client()
+
 
-app = FastAPI(title="NadirCare API", version="1.0.0")
+app = FastAPI(title="NadirCare API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -16,54 +69,325 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def _request_size_limit(path: str) -> int:
+    if path == "/upload/batch":
+        return batch_max_request_bytes()
+    return max_upload_bytes() + MULTIPART_OVERHEAD_BYTES
+
+
+# Reject oversized uploads with 413 while they stream in, before they are buffered
+app.add_middleware(RequestSizeLimitMiddleware, limit_for_path=_request_size_limit)
+
+# On-demand upload profiles (X-Profile-Token or PROFILE_SAMPLE_EVERY); a pass-through when off
+app.add_middleware(ProfilingMiddleware)
+
+# Request ids, per-request stage timings and HTTP metrics (outermost, so it sees every response)
+app.add_middleware(RequestContextMiddleware)
+
+
+async def analyze_report(contents: bytes, content_type: str, file_name: str, patient_id: Optional[str] = None,
+                         observed_at: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Full report pipeline shared by /upload and /jobs: extraction followed by the recommendation.
+    With a patient id and the ANC history enabled, the recommendation also sees the patient's
+    ANC trend, and the new value is queued for the history (written after the response).
+    """
+    log(f"Processing file: {file_name} ({content_type})")
+    parsed_data = await process_medical_report(contents, content_type, file_name)
+    history = get_anc_history() if patient_id else None
+    anc_extraction = parsed_data.get("anc_extraction") or {}
+    if history is not None and anc_extraction.get("status") == "success":
+        observed_at = time.time() if observed_at is None else observed_at
+        with span("anc_trend"):
+            parsed_data["anc_trend"] = await history.trend(patient_id, observed_at, anc_extraction["anc_value"])
+        history.record(patient_id, observed_at, anc_extraction["anc_value"])
+    with span("recommendation"):
+        return get_recommendation(parsed_data)
+
+
+def _history_patient(patient_id: Optional[str], observed_at: Optional[float],
+                     token: Optional[str]) -> Optional[str]:
+    """
+    The patient whose ANC history an upload may read (the trend) and extend, checked before the
+    upload is processed. The trend is as much protected health data as GET /patients/{id}/anc,
+    so it takes the same X-History-Token; with the history disabled `patient_id` is ignored.
+    """
+    if observed_at is not None and not math.isfinite(observed_at):
+        raise HTTPException(status_code=422, detail="observed_at must be a finite number of epoch seconds")
+    history = get_anc_history() if patient_id else None
+    if history is None:
+        return None
+    if not history.authorized(token):
+        raise HTTPException(status_code=403, detail="patient_id requires a valid X-History-Token header")
+    return patient_id
+
+
+async def read_upload(file: UploadFile) -> Tuple[bytes, str, str]:
+    """
+    Validate the uploaded file (size limit, image or PDF type sniffed from its magic bytes) and read its contents.
+    """
+    try:
+        contents, content_type = await read_image_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return contents, content_type, file.filename or "report"
+
+
+def _batch_items(files: List[UploadFile]) -> List[BatchItem]:
+    """
+    Turn the uploaded files (images, PDFs and/or zip archives of them) into batch items.
+    Problems with a single file become a failed item instead of failing the whole batch.
+    """
+    def sniff(contents: bytes) -> str:
+        return sniff_report_type(contents) or "application/octet-stream"
+
+    def failing(file_name: str, message: str) -> BatchItem:
+        async def load() -> Tuple[bytes, str]:
+            raise ValueError(message)
+        return BatchItem(file_name, load)
+
+    def checked(item: BatchItem) -> BatchItem:
+        async def load() -> Tuple[bytes, str]:
+            contents, content_type = await item.load()
+            if content_type not in ALLOWED_REPORT_TYPES:
+                raise ValueError(f"File type {content_type} not supported. Please upload JPG, PNG or PDF.")
+            return contents, content_type
+        return BatchItem(item.file_name, load)
+
+    items: List[BatchItem] = []
+    for file in files:
+        file_name = file.filename or "report"
+        content_type = (file.content_type or "").lower()
+        if is_zip_upload(content_type, file_name):
+            try:
+                items.extend(checked(item) for item in items_from_zip(file.file, sniff, max_upload_bytes()))
+            except zipfile.BadZipFile:
+                items.append(failing(file_name, "Not a valid zip archive"))
+            continue
+
+        async def load(file: UploadFile = file) -> Tuple[bytes, str]:
+            return await read_image_upload(file)
+        items.append(BatchItem(file_name, load))
+    return items
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Get or create the worker pool that runs asynchronous jobs."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = create_job_manager(analyze_report)
+    return _job_manager
+
+
 @app.get("/")
 async def root():
     return {"message": "NadirCare API is running"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until startup warm-up is done, then 200 with the warm-up summary.
+    GET / stays a pure liveness check.
+    """
+    if not _readiness.get("ready"):
+        return JSONResponse(status_code=503, content={"ready": False})
+    return _readiness
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the ANC extraction result cache.
+    """
+    return get_result_cache().stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics for this worker process: request and per-stage latency histograms,
+    payload and token sizes, extraction status counters and in-flight gauges.
+    """
+    for counter, value in get_result_cache().stats().items():
+        if isinstance(value, (int, float)):
+            metrics.RESULT_CACHE.set(value, counter=counter)
+    if _job_manager is not None:
+        metrics.JOBS_QUEUED.set(_job_manager.queue_depth())
+    history = get_anc_history()
+    if history is not None:
+        metrics.ANC_HISTORY_PENDING.set(history.pending())
+    upstream = upstream_stats()
+    for field, value in upstream["rate_limiter"].items():
+        metrics.MODEL_RATE_LIMITER.set(value, field=field)
+    metrics.MODEL_BREAKER_STATE.set(BREAKER_STATES[upstream["circuit_breaker"]["state"]])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/upload")
-async def upload_report(file: UploadFile = File(...)):
+async def upload_report(file: UploadFile = File(...), patient_id: Optional[str] = Form(None, max_length=128),
+                        observed_at: Optional[float] = Form(None), x_history_token: Optional[str] = Header(None)):
     """
     Upload a medical report (image or PDF) and get recommendations.
+    `patient_id` (with X-History-Token) adds the ANC to that patient's history; `observed_at`
+    (epoch seconds) is when the blood was drawn, defaulting to now.
     """
+    patient_id = _history_patient(patient_id, observed_at, x_history_token)
     try:
-        # Validate file type
-        if not file.content_type:
-            raise HTTPException(status_code=400, detail="File type not recognized")
-        
-        content_type = file.content_type.lower()
-        allowed_types = [
-            "image/jpeg", "image/jpg", "image/png"
-            # "application/pdf"
-        ]
-        
-        if content_type not in allowed_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type {content_type} not supported. Please upload JPG or PNG."
-            )
-        
-        # Read file contents
-        contents = await file.read()
-        file_name = file.filename or "report"
-        
-        # Process the medical report
-        print(f"Processing file: {file_name} ({content_type})")
-        parsed_data = await process_medical_report(contents, content_type, file_name)
-        
-        # Get recommendation based on parsed data
-        recommendation = get_recommendation(parsed_data)
-        
+        contents, content_type, file_name = await read_upload(file)
+        recommendation = await analyze_report(contents, content_type, file_name, patient_id, observed_at)
         return JSONResponse(content=recommendation)
     
     except HTTPException:
         raise
-    except ValueError as e:
-        print(f"Setup error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        print(f"Error processing file: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing report: {str(e)}")
+        raise _processing_error(e)
+
+def _processing_error(e: Exception) -> HTTPException:
+    """The HTTP error an upload answers with when processing the report failed."""
+    if isinstance(e, UpstreamUnavailable):
+        log(f"Model API unavailable: {str(e)}")
+        return HTTPException(
+            status_code=503,
+            detail="Report analysis is temporarily unavailable. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, ValueError):
+        log(f"Setup error: {str(e)}")
+        return HTTPException(status_code=500, detail=str(e))
+    log(f"Error processing file: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Error processing report: {str(e)}")
+
+def _stream_error(e: Exception) -> Dict[str, Any]:
+    """The status and detail /upload would have answered with, for the stream's error event."""
+    error = _processing_error(e)
+    event = {"status": error.status_code, "detail": error.detail}
+    if error.headers and "Retry-After" in error.headers:
+        event["retry_after"] = int(error.headers["Retry-After"])
+    return event
+
+@app.post("/upload/stream")
+async def upload_report_stream(file: UploadFile = File(...),
+                               patient_id: Optional[str] = Form(None, max_length=128),
+                               observed_at: Optional[float] = Form(None),
+                               x_history_token: Optional[str] = Header(None)):
+    """
+    /upload as server-sent events: progress events as each stage happens (received,
+    preprocessed, model_started, model_streaming, answer, parsed), then the same body
+    /upload returns as a "recommendation" event, or an "error" event.
+    Upload errors (413, 400, 403, 422) are still plain HTTP errors, before the stream starts.
+    """
+    patient_id = _history_patient(patient_id, observed_at, x_history_token)
+    contents, content_type, file_name = await read_upload(file)
+
+    async def run() -> Dict[str, Any]:
+        emit_progress("received", file_name=file_name, content_type=content_type, bytes=len(contents))
+        return await analyze_report(contents, content_type, file_name, patient_id, observed_at)
+
+    return StreamingResponse(
+        stream_progress(run, "recommendation", _stream_error),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/patients/{patient_id}/anc")
+async def patient_anc_history(patient_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                              max_points: int = Query(DEFAULT_MAX_POINTS, ge=1, le=MAX_POINTS_LIMIT),
+                              x_history_token: Optional[str] = Header(None)):
+    """
+    A patient's ANC values between `start` and `end` (epoch seconds), oldest first.
+    More than `max_points` values are returned as that many time buckets (mean, min, max, count).
+    Requires the ANC_HISTORY_TOKEN secret in X-History-Token; without it the endpoint does not exist.
+    """
+    history = get_anc_history()
+    if history is None:
+        raise HTTPException(status_code=404, detail="ANC history is not enabled (set ANC_HISTORY_DB_PATH)")
+    if not history.authorized(x_history_token):
+        # Same answer as a missing route, so patient ids cannot be probed
+        raise HTTPException(status_code=404, detail="Not Found")
+    return await history.query(patient_id, start, end, max_points)
+
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """
+    Upload many medical reports (images, PDFs and/or zip archives of them) in one request.
+    Streams one NDJSON line per report as soon as it is processed, then a summary line.
+    """
+    items = _batch_items(files)
+    max_files = int(os.getenv("BATCH_MAX_FILES", str(DEFAULT_MAX_FILES)))
+    if not items:
+        raise HTTPException(status_code=400, detail="No reports found in the upload")
+    if len(items) > max_files:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch contains {len(items)} reports; the limit is {max_files} per request."
+        )
+    
+    concurrency = int(os.getenv("BATCH_CONCURRENCY", str(DEFAULT_CONCURRENCY)))
+    return StreamingResponse(
+        stream_batch_ndjson(items, analyze_report, concurrency),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """
+    Queue a medical report for processing and return a job id immediately.
+    Poll GET /jobs/{job_id} for the result.
+    """
+    contents, content_type, file_name = await read_upload(file)
+    try:
+        job = await get_job_manager().submit(contents, content_type, file_name)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many reports are waiting to be processed. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['job_id']}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a queued job, with the recommendation once it has succeeded.
+    """
+    job = await get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+def _profile_admin(token: Optional[str]) -> RequestProfiler:
+    profiler = get_request_profiler()
+    if profiler is None or not profiler.token:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled (set PROFILE_TOKEN)")
+    if not profiler.authorized(token):
+        raise HTTPException(status_code=403, detail="A valid X-Profile-Token header is required")
+    return profiler
+
+@app.get("/admin/profiles")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    """
+    Captured upload profiles, newest first (admin only: X-Profile-Token).
+    """
+    profiler = _profile_admin(x_profile_token)
+    return {"profiles": await asyncio.to_thread(profiler.store.list)}
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """
+    Download one profile as collapsed stacks (flamegraph.pl / speedscope input; admin only).
+    """
+    path = _profile_admin(x_profile_token).store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
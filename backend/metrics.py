@@ -0,0 +1,186 @@
+import bisect
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Minimal Prometheus metrics (text exposition format 0.0.4) without extra dependencies.
+# Each uvicorn worker process keeps its own values; scrape every worker when running several.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2e7)
+TOKEN_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600, 3200)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics exported by the API ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "nadircare_http_request_duration_seconds", "HTTP request latency.", ("method", "path", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("nadircare_http_requests_in_flight", "HTTP requests being served.")
+STAGE_DURATION = Histogram(
+    "nadircare_stage_duration_seconds", "Time spent in each report-processing stage.", ("stage",)
+)
+UPLOAD_BYTES = Histogram("nadircare_upload_bytes", "Size of uploaded report files.", buckets=BYTES_BUCKETS)
+MODEL_PAYLOAD_BYTES = Histogram(
+    "nadircare_model_payload_bytes", "Size of the base64 image sent to the model.", buckets=BYTES_BUCKETS
+)
+MODEL_TOKENS = Histogram(
+    "nadircare_model_tokens", "Model tokens per call.", ("model", "direction"), buckets=TOKEN_BUCKETS
+)
+MODEL_CALLS_IN_FLIGHT = Gauge("nadircare_model_calls_in_flight", "Anthropic API calls awaiting a response.")
+ANC_EXTRACTIONS = Counter("nadircare_anc_extractions_total", "ANC extractions by result status.", ("status",))
+EXTRACTIONS_IN_FLIGHT = Gauge(
+    "nadircare_extractions_in_flight", "Distinct report extractions running (after in-flight de-duplication)."
+)
+COALESCED_UPLOADS = Counter(
+    "nadircare_coalesced_uploads_total", "Uploads that joined an identical extraction already in flight."
+)
+JOBS_QUEUED = Gauge("nadircare_jobs_queued", "Jobs waiting for a worker.")
+RESULT_CACHE = Gauge("nadircare_result_cache", "ANC result cache counters.", ("counter",))
+CASCADE_ANSWERS = Counter(
+    "nadircare_cascade_answers_total", "ANC extractions by answering cascade tier and escalation reason.",
+    ("tier", "reason")
+)
+MODEL_COST = Counter("nadircare_model_cost_usd_total", "Estimated model spend in USD.", ("model",))
+MODEL_HEDGES = Counter(
+    "nadircare_model_hedges_total", "Model calls that outlived the p95 latency, by hedge outcome.", ("outcome",)
+)
+MODEL_RETRIES = Counter("nadircare_model_retries_total", "Model calls retried after a failure, by reason.", ("reason",))
+MODEL_FAST_FAILURES = Counter(
+    "nadircare_model_fast_failures_total", "Model calls refused without reaching the API (503), by reason.",
+    ("reason",)
+)
+MODEL_BREAKER_STATE = Gauge(
+    "nadircare_model_circuit_breaker_state", "Model API circuit breaker: 0 closed, 1 half-open, 2 open."
+)
+MODEL_RATE_LIMITER = Gauge("nadircare_model_rate_limiter", "Client-side model API rate limiter state.", ("field",))
+PDF_LOCAL_EXTRACTIONS = Counter(
+    "nadircare_pdf_local_extractions_total",
+    "PDF reports by outcome of the local text-layer parser: hit, or why the model was asked.", ("outcome",)
+)
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    "nadircare_near_duplicate_lookups_total",
+    "Photo uploads by perceptual-hash cross-check outcome: miss, agree or disagree.", ("outcome",)
+)
+ANC_HISTORY_WRITES = Counter(
+    "nadircare_anc_history_points_total", "ANC history points by outcome: written, dropped or failed.", ("outcome",)
+)
+ANC_HISTORY_PENDING = Gauge("nadircare_anc_history_pending", "ANC history points waiting to be committed.")
+PROFILES_CAPTURED = Counter(
+    "nadircare_profiles_total", "Upload profiles written to the profile ring, by trigger: header or sampled.", ("trigger",)
+)
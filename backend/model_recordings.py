@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+
+from tracing import record_stage
+
+# Record/replay of the model API's HTTP responses, so the golden-dataset suite
+# (benchmarks/golden_suite.py) and local development can run without network or API key.
+# A response is stored under a hash of its request (method, path and canonical JSON body),
+# so it is replayed exactly while the request the pipeline builds is unchanged: editing the
+# answer parsing keeps every recording valid, editing a prompt, the model, the options or the
+# image pre-processing makes the affected requests miss until they are recorded again.
+# MODEL_RECORDINGS_MODE  - off (default); record: call the API and save every response;
+#                          replay: answer only from saved responses (unknown requests get a 404)
+# MODEL_RECORDINGS_DIR   - directory of the saved responses, one JSON file per request
+RECORDING_MODES = ("off", "record", "replay")
+# Response headers worth keeping; the body is stored decoded, so transfer headers must go
+_KEPT_HEADERS = ("content-type", "request-id")
+
+
+def request_key(request: httpx.Request) -> str:
+    """Stable hash of a request: key order and whitespace of the JSON body do not matter."""
+    body = request.content
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        pass
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.url.raw_path, body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _summary(request: httpx.Request) -> Dict[str, Any]:
+    """What the recording was for, so a directory of recordings can be inspected by hand."""
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return {}
+    return {key: body[key] for key in ("model", "max_tokens", "temperature", "stream") if key in body}
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that saves each response of the wrapped transport (mode "record") or
+    answers from the saved responses without any network (mode "replay"). A replayed call
+    adds a "model_call_recorded" stage with the latency the original call had, so timings
+    of a replayed run still show where the model time would go.
+    """
+
+    def __init__(self, mode: str, directory: Path, transport: Optional[httpx.AsyncBaseTransport] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown recording mode {mode!r}")
+        if mode == "record" and transport is None:
+            raise ValueError("Recording needs a transport to the API")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._transport = transport
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        if self.mode == "replay":
+            return self._replay(request, key)
+
+        started = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+        headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+        # Rate limits and outages are not what the request would normally get
+        if response.status_code < 500 and response.status_code != 429:
+            recording = {
+                "key": key,
+                "method": request.method,
+                "path": request.url.path,
+                "request": _summary(request),
+                "request_bytes": len(request.content),
+                "status": response.status_code,
+                "headers": headers,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "body": content.decode("utf-8"),
+            }
+            temporary = self.path(key).with_suffix(".tmp")
+            temporary.write_text(json.dumps(recording, indent=1))
+            os.replace(temporary, self.path(key))
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def _replay(self, request: httpx.Request, key: str) -> httpx.Response:
+        try:
+            recording = json.loads(self.path(key).read_text())
+        except FileNotFoundError:
+            # A 404 is not retried, so a miss fails fast with a message saying what to do
+            return httpx.Response(404, request=request, json={"type": "error", "error": {
+                "type": "not_found_error",
+                "message": f"No recorded response for request {key} in {self.directory}; "
+                           f"record it again with MODEL_RECORDINGS_MODE=record",
+            }})
+        record_stage("model_call_recorded", recording["elapsed_ms"] / 1000)
+        return httpx.Response(recording["status"], headers=recording["headers"],
+                              content=recording["body"].encode("utf-8"), request=request)
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            await self._transport.aclose()
+
+
+def recording_transport(limits: httpx.Limits) -> Optional[RecordingTransport]:
+    """The transport MODEL_RECORDINGS_MODE asks for, or None to use the client's default one."""
+    mode = os.getenv("MODEL_RECORDINGS_MODE", "off").strip().lower()
+    if mode not in RECORDING_MODES:
+        raise ValueError(f"Unknown MODEL_RECORDINGS_MODE {mode!r}. Use one of: {', '.join(RECORDING_MODES)}")
+    if mode == "off":
+        return None
+    directory = os.getenv("MODEL_RECORDINGS_DIR")
+    if not directory:
+        raise ValueError("MODEL_RECORDINGS_DIR must be set when MODEL_RECORDINGS_MODE is record or replay")
+    inner = httpx.AsyncHTTPTransport(limits=limits) if mode == "record" else None
+    return RecordingTransport(mode, Path(directory), inner)
@@ -0,0 +1,233 @@
+import asyncio
+import copy
+import io
+import math
+import os
+from itertools import combinations
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Perceptual-hash index over previously processed report photos, so a retake or a new
+# screenshot of a report is recognised even though its bytes (and so its result-cache key)
+# differ. A near-duplicate is only ever used to cross-check the model's read, never to answer
+# instead of it: reports of different patients printed on the same lab's template hash as
+# close as two photos of one report (see benchmarks/bench_near_duplicates.py).
+# NEAR_DUP_MODE           - off (default) or cross_check: compare the model's answer with the
+#                           extraction of the closest earlier photo and record whether they agree
+# NEAR_DUP_HASH           - phash (DCT hash, default) or dhash (gradient hash, about twice as fast)
+# NEAR_DUP_MAX_DISTANCE   - Hamming distance, out of 64 bits, that still counts as the same report
+# NEAR_DUP_MIN_CONFIDENCE - extractions reporting a lower confidence are not indexed
+# NEAR_DUP_INDEX_UNSCORED - set to "1" to also index successful extractions that report no
+#                           confidence at all (reasoning mode); by default only scored ones are
+# NEAR_DUP_MAX_ENTRIES    - hashes kept in memory per worker (oldest dropped first)
+NEAR_DUP_MODES = ("off", "cross_check")
+HASH_FUNCTIONS = ("dhash", "phash")
+DEFAULT_MAX_DISTANCE = 4
+DEFAULT_MIN_CONFIDENCE = 0.9
+DEFAULT_MAX_ENTRIES = 100_000
+HASH_BITS = 64
+# A prior agrees with a new read when the ANC values are within this fraction of each other
+AGREEMENT_TOLERANCE = 0.01
+
+_PHASH_SIZE = 32
+# DCT-II basis for the 8 lowest frequencies of a 32-sample row, computed once
+_DCT = [[math.cos(math.pi * (2 * x + 1) * u / (2 * _PHASH_SIZE)) for x in range(_PHASH_SIZE)] for u in range(8)]
+
+
+class NearDuplicateConfig(NamedTuple):
+    mode: str
+    hash_function: str
+    max_distance: int
+    min_confidence: float
+    max_entries: int
+    index_unscored: bool
+
+
+def near_duplicate_config() -> NearDuplicateConfig:
+    config = NearDuplicateConfig(
+        mode=os.getenv("NEAR_DUP_MODE", "off").lower(),
+        hash_function=os.getenv("NEAR_DUP_HASH", "phash").lower(),
+        max_distance=int(os.getenv("NEAR_DUP_MAX_DISTANCE", str(DEFAULT_MAX_DISTANCE))),
+        min_confidence=float(os.getenv("NEAR_DUP_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE))),
+        max_entries=int(os.getenv("NEAR_DUP_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+        index_unscored=os.getenv("NEAR_DUP_INDEX_UNSCORED", "0") == "1",
+    )
+    if config.mode not in NEAR_DUP_MODES:
+        raise ValueError(f"Unknown NEAR_DUP_MODE: {config.mode}. Use {', '.join(NEAR_DUP_MODES)}.")
+    if config.hash_function not in HASH_FUNCTIONS:
+        raise ValueError(f"Unknown NEAR_DUP_HASH: {config.hash_function}. Use {', '.join(HASH_FUNCTIONS)}.")
+    return config
+
+
+def _grayscale_thumbnail(image_bytes: bytes, size: Tuple[int, int]) -> Optional[Image.Image]:
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.format == "JPEG":
+            # Decode at 1/2-1/8 scale straight into grayscale; only a thumbnail is needed
+            image.draft("L", (size[0] * 8, size[0] * 8))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+    image = ImageOps.exif_transpose(image)
+    return image.convert("L").resize(size, Image.Resampling.BOX)
+
+
+def dhash(image_bytes: bytes) -> Optional[int]:
+    """64-bit gradient hash: whether each pixel of a 9x8 thumbnail is darker than its right neighbour."""
+    image = _grayscale_thumbnail(image_bytes, (9, 8))
+    if image is None:
+        return None
+    pixels = image.tobytes()
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            value = (value << 1) | (left < right)
+    return value
+
+
+def phash(image_bytes: bytes) -> Optional[int]:
+    """64-bit DCT hash: the 8x8 lowest frequencies of a 32x32 thumbnail compared to their median."""
+    image = _grayscale_thumbnail(image_bytes, (_PHASH_SIZE, _PHASH_SIZE))
+    if image is None:
+        return None
+    pixels = image.tobytes()
+    rows = [pixels[y * _PHASH_SIZE:(y + 1) * _PHASH_SIZE] for y in range(_PHASH_SIZE)]
+    # Separable 2-D DCT, keeping only the frequencies the hash uses
+    row_coefficients = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    coefficients = [
+        sum(_DCT[v][y] * row_coefficients[y][u] for y in range(_PHASH_SIZE))
+        for v in range(8) for u in range(8)
+    ]
+    # The DC term only measures overall brightness
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def photo_hash(image_bytes: bytes, hash_function: str = "phash") -> Optional[int]:
+    """The configured perceptual hash of a photo, or None if it cannot be decoded."""
+    return dhash(image_bytes) if hash_function == "dhash" else phash(image_bytes)
+
+
+async def photo_hash_async(image_bytes: bytes, hash_function: str = "phash") -> Optional[int]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, photo_hash, image_bytes, hash_function)
+
+
+class HammingIndex:
+    """
+    Nearest-neighbour search over 64-bit hashes within a fixed Hamming radius, by multi-index
+    hashing: each hash is cut into a few substrings, each kept in its own hash table. Two
+    hashes within distance r differ in at most r // chunks bits of at least one substring
+    (pigeonhole), so a lookup only probes those few substring neighbourhoods and checks the
+    candidates it finds with a popcount instead of scanning every hash. Substrings are about
+    log2(max_entries) bits long, so a probe finds about one entry however full the index is.
+    Entries live in a ring of `max_entries` slots; the oldest is overwritten first.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 chunks: Optional[int] = None):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        if chunks is None:
+            chunks = max(1, HASH_BITS // max(8, math.ceil(math.log2(max(2, max_entries)))))
+        widths = [HASH_BITS // chunks + (i < HASH_BITS % chunks) for i in range(chunks)]
+        self._layout = [(sum(widths[:i]), (1 << width) - 1) for i, width in enumerate(widths)]
+        # Every bit flip pattern a substring is probed with
+        chunk_radius = max_distance // chunks
+        self._probes = [
+            [sum(1 << bit for bit in bits)
+             for flips in range(chunk_radius + 1) for bits in combinations(range(width), flips)]
+            for width in widths
+        ]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes: List[Optional[int]] = []
+        self._payloads: List[Any] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _chunks(self, value: int) -> List[int]:
+        return [(value >> shift) & mask for shift, mask in self._layout]
+
+    def add(self, value: int, payload: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        slot = self._next % self.max_entries
+        self._next += 1
+        if slot == len(self._hashes):
+            self._hashes.append(value)
+            self._payloads.append(payload)
+        else:
+            for table, chunk in zip(self._tables, self._chunks(self._hashes[slot])):
+                bucket = table[chunk]
+                bucket.remove(slot)
+                if not bucket:
+                    del table[chunk]
+            self._hashes[slot], self._payloads[slot] = value, payload
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(slot)
+
+    def search(self, value: int) -> Optional[Tuple[int, int, Any]]:
+        """The closest stored (distance, hash, payload) within max_distance, newest on ties, or None."""
+        hashes = self._hashes
+        best_distance, best_age, best_slot = self.max_distance + 1, 0, -1
+        for table, chunk, probes in zip(self._tables, self._chunks(value), self._probes):
+            for probe in probes:
+                for slot in table.get(chunk ^ probe, ()):
+                    distance = (hashes[slot] ^ value).bit_count()
+                    if distance < best_distance or (distance == best_distance and self._age(slot) < best_age):
+                        best_distance, best_age, best_slot = distance, self._age(slot), slot
+        if best_slot < 0:
+            return None
+        return best_distance, hashes[best_slot], self._payloads[best_slot]
+
+    def _age(self, slot: int) -> int:
+        """How many entries were added after the one in `slot`."""
+        return (self._next - 1 - slot) % self.max_entries
+
+
+def worth_indexing(result: Dict[str, Any], min_confidence: float, index_unscored: bool = False) -> bool:
+    """
+    Whether an extraction is sure enough to cross-check later photos against: a success with
+    a confidence of at least `min_confidence`. Unscored successes only with `index_unscored`.
+    """
+    if result.get("status") != "success":
+        return False
+    confidence = result.get("confidence")
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool):
+        return confidence >= min_confidence
+    return confidence is None and index_unscored
+
+
+def agrees(result: Dict[str, Any], prior: Dict[str, Any]) -> bool:
+    """Whether a new extraction matches the near-duplicate's (same status, ANC within 1%)."""
+    if result.get("status") != prior.get("status"):
+        return False
+    value, prior_value = result.get("anc_value"), prior.get("anc_value")
+    if value is None or prior_value is None:
+        return value == prior_value
+    return abs(value - prior_value) <= AGREEMENT_TOLERANCE * max(abs(prior_value), 1.0)
+
+
+def prior_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of an extraction worth keeping in the index (no raw model output or timings)."""
+    return copy.deepcopy({key: value for key, value in result.items()
+                          if key not in ("raw_response", "answer_section", "preprocessing", "cascade", "usage")})
+
+
+_index: Optional[HammingIndex] = None
+
+
+def get_near_duplicate_index() -> HammingIndex:
+    """Get or create the process-wide index configured from the environment."""
+    global _index
+    if _index is None:
+        config = near_duplicate_config()
+        _index = HammingIndex(max_distance=config.max_distance, max_entries=config.max_entries)
+    return _index
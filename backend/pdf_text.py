@@ -0,0 +1,665 @@
+import re
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Pure-Python reader for the text layer of digital PDFs (lab portal exports).
+# Only what text extraction needs: objects, Flate streams, object streams, the page tree,
+# fonts with ToUnicode maps and the text operators of content streams. Pages are parsed
+# lazily, one at a time, so callers can stop as soon as they have found what they need.
+# Everything a document's streams decode to counts against MAX_DECODED_BYTES, so a small
+# upload cannot inflate into gigabytes (a "zip bomb"). Interpreting content streams is budgeted
+# too, since a form XObject is lexed again each time it is drawn and forms nest: every content
+# byte lexed (per drawing) and every character of text produced counts against
+# MAX_CONTENT_BYTES, and every token against MAX_CONTENT_TOKENS. Past any of them, PDFTooLarge
+# is raised.
+PDF_MAGIC = b"%PDF-"
+MAX_DECODED_BYTES = 8 * 1024 * 1024
+MAX_CONTENT_BYTES = 32 * 1024 * 1024
+# A lab report page has a few thousand tokens; interpreting one takes about two microseconds
+MAX_CONTENT_TOKENS = 500_000
+_INFLATE_CHUNK = 256 * 1024
+
+_WS = re.compile(rb"(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)+")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_NAME = re.compile(rb"/([^\x00\t\n\x0c\r ()<>\[\]{}/%]*)")
+_NON_HEX = re.compile(rb"[^0-9A-Fa-f]")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_KEYWORD = re.compile(rb"[^\x00\t\n\x0c\r ()<>\[\]{}/%]+")
+_REF_TAIL = re.compile(rb"[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])")
+_HEX_STRING = re.compile(rb"<([0-9A-Fa-f\x00\t\n\x0c\r ]*)>")
+_STRING_RUN = re.compile(rb"[^()\\]+")
+_OCTAL = re.compile(rb"[0-7]{1,3}")
+_OBJ_HEADER = re.compile(rb"(?<![0-9])(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])")
+_STREAM_DATA = re.compile(rb"[\x00\t\x0c ]*\r?\n")
+_ROOT = re.compile(rb"/Root[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+\d+[\x00\t\n\x0c\r ]+R")
+_ENCRYPT = re.compile(rb"/Encrypt[\x00\t\n\x0c\r ]*\d+[\x00\t\n\x0c\r ]+\d+[\x00\t\n\x0c\r ]+R")
+_OBJECT_STREAM = re.compile(rb"/Type[\x00\t\n\x0c\r ]*/ObjStm")
+_INLINE_IMAGE_END = re.compile(rb"[\x00\t\n\x0c\r ]EI(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])")
+
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f",
+            b"(": b"(", b")": b")", b"\\": b"\\"}
+
+# Glyph names seen in /Differences arrays of simple fonts without a ToUnicode map
+_GLYPH_NAMES = {
+    "space": " ", "period": ".", "comma": ",", "hyphen": "-", "minus": "-", "slash": "/", "percent": "%",
+    "parenleft": "(", "parenright": ")", "colon": ":", "numbersign": "#", "asterisk": "*", "multiply": "×",
+    "mu": "µ", "mu1": "µ", "micro": "µ", "threesuperior": "³", "asciicircum": "^", "underscore": "_",
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+
+# Deepest nesting of form XObjects followed when collecting page text
+MAX_FORM_DEPTH = 3
+
+
+class PDFSyntaxError(ValueError):
+    pass
+
+
+class PDFTooLarge(Exception):
+    """The document needs more decoding or content interpretation than its budgets allow."""
+
+
+class _Budget:
+    def __init__(self, limit: int, message: str):
+        self.limit = limit
+        # Format string for the PDFTooLarge message, given the limit
+        self.message = message
+        self.remaining = limit
+
+    def spend(self, amount: int) -> None:
+        self.remaining -= amount
+        if self.remaining < 0:
+            raise PDFTooLarge(self.message.format(self.limit))
+
+
+def _inflate(data: bytes, budget: _Budget) -> bytes:
+    """Flate-decode in bounded chunks, charging the output to `budget` as it is produced."""
+    inflater = zlib.decompressobj()
+    chunks = []
+    pending = data
+    while pending and not inflater.eof:
+        chunk = inflater.decompress(pending, _INFLATE_CHUNK)
+        budget.spend(len(chunk))
+        chunks.append(chunk)
+        pending = inflater.unconsumed_tail
+    tail = inflater.flush(_INFLATE_CHUNK)
+    budget.spend(len(tail))
+    chunks.append(tail)
+    return b"".join(chunks)
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class Name(str):
+    """A PDF name (/Font); plain str values are keywords and operators."""
+
+
+class Operator(str):
+    pass
+
+
+class Stream:
+    def __init__(self, attrs: Dict[str, Any], raw: bytes, budget: _Budget):
+        self.attrs = attrs
+        self.raw = raw
+        self.budget = budget
+        self._data: Optional[bytes] = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.attrs.get(key, default)
+
+    def decode(self) -> bytes:
+        """
+        Stream data with its filters applied (decoded once); unsupported filters raise
+        PDFSyntaxError, and exceeding the document's decode budget raises PDFTooLarge.
+        """
+        if self._data is None:
+            self._data = self._apply_filters()
+        return self._data
+
+    def _apply_filters(self) -> bytes:
+        filters = self.attrs.get("Filter")
+        if filters is None:
+            return self.raw
+        data = self.raw
+        for name in filters if isinstance(filters, list) else [filters]:
+            if name in ("FlateDecode", "Fl"):
+                # Truncated or slightly corrupt streams still give their leading bytes
+                data = _inflate(data, self.budget)
+            elif name in ("ASCIIHexDecode", "AHx"):
+                hex_digits = _NON_HEX.sub(b"", data.split(b">")[0])
+                data = bytes.fromhex((hex_digits + b"0" * (len(hex_digits) % 2)).decode("ascii"))
+                self.budget.spend(len(data))
+            else:
+                raise PDFSyntaxError(f"Unsupported stream filter: {name}")
+        return data
+
+
+_ARRAY_START, _ARRAY_END, _DICT_START, _DICT_END, _EOF = (object() for _ in range(5))
+
+
+class _Lexer:
+    def __init__(self, data: bytes, pos: int = 0, budget: Optional[_Budget] = None):
+        self.data = data
+        self.pos = pos
+        # Charged one per token when set (content streams)
+        self.budget = budget
+
+    def _token(self) -> Any:
+        if self.budget is not None:
+            self.budget.spend(1)
+        data = self.data
+        match = _WS.match(data, self.pos)
+        if match:
+            self.pos = match.end()
+        if self.pos >= len(data):
+            return _EOF
+        char = data[self.pos]
+        if char in b"0123456789+-.":
+            match = _NUMBER.match(data, self.pos)
+            if match:
+                self.pos = match.end()
+                text = match.group()
+                if b"." in text:
+                    return float(text)
+                value = int(text)
+                ref = _REF_TAIL.match(data, self.pos)
+                if ref:
+                    self.pos = ref.end()
+                    return Ref(value, int(ref.group(1)))
+                return value
+        if char == 0x2F:  # /
+            match = _NAME.match(data, self.pos)
+            self.pos = match.end()
+            name = _NAME_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), match.group(1))
+            return Name(name.decode("latin-1"))
+        if char == 0x28:  # (
+            return self._literal_string()
+        if char == 0x3C:  # <
+            if data.startswith(b"<<", self.pos):
+                self.pos += 2
+                return _DICT_START
+            match = _HEX_STRING.match(data, self.pos)
+            if match is None:
+                raise PDFSyntaxError(f"Bad hex string at {self.pos}")
+            self.pos = match.end()
+            digits = _NON_HEX.sub(b"", match.group(1))
+            return bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode("ascii"))
+        if char == 0x3E:  # >
+            self.pos += 2 if data.startswith(b">>", self.pos) else 1
+            return _DICT_END
+        if char == 0x5B:  # [
+            self.pos += 1
+            return _ARRAY_START
+        if char == 0x5D:  # ]
+            self.pos += 1
+            return _ARRAY_END
+        match = _KEYWORD.match(data, self.pos)
+        if match is None:
+            # Stray delimiter such as { or }
+            self.pos += 1
+            return Operator(chr(char))
+        self.pos = match.end()
+        word = match.group()
+        if word == b"true":
+            return True
+        if word == b"false":
+            return False
+        if word == b"null":
+            return None
+        return Operator(word.decode("latin-1"))
+
+    def _literal_string(self) -> bytes:
+        data = self.data
+        pos = self.pos + 1
+        depth = 1
+        out = bytearray()
+        while pos < len(data):
+            run = _STRING_RUN.match(data, pos)
+            if run:
+                out += run.group()
+                pos = run.end()
+                continue
+            char = data[pos]
+            if char == 0x5C:  # backslash
+                escaped = data[pos + 1:pos + 2]
+                if escaped in _ESCAPES:
+                    out += _ESCAPES[escaped]
+                    pos += 2
+                elif escaped == b"\r":
+                    pos += 3 if data[pos + 2:pos + 3] == b"\n" else 2
+                elif escaped == b"\n":
+                    pos += 2
+                else:
+                    octal = _OCTAL.match(data, pos + 1)
+                    if octal:
+                        out.append(int(octal.group(), 8) & 0xFF)
+                        pos = octal.end()
+                    else:
+                        out += escaped
+                        pos += 2
+                continue
+            if char == 0x28:
+                depth += 1
+            elif char == 0x29:
+                depth -= 1
+                if depth == 0:
+                    pos += 1
+                    break
+            out.append(char)
+            pos += 1
+        self.pos = pos
+        return bytes(out)
+
+    def read(self) -> Any:
+        """The next complete object (arrays and dictionaries included), operator or _EOF."""
+        token = self._token()
+        if token is _ARRAY_START:
+            items = []
+            while True:
+                item = self.read()
+                if item is _ARRAY_END or item is _EOF:
+                    return items
+                items.append(item)
+        if token is _DICT_START:
+            entries: Dict[str, Any] = {}
+            while True:
+                key = self.read()
+                if key is _DICT_END or key is _EOF:
+                    return entries
+                value = self.read()
+                if value is _DICT_END or value is _EOF:
+                    return entries
+                if isinstance(key, str):
+                    entries[key] = value
+        return token
+
+
+class PDFDocument:
+    """
+    Random access to the objects of a PDF. Objects are located by scanning for their
+    "N G obj" headers instead of trusting the xref table, which also copes with files whose
+    offsets were broken by re-saving; the last definition of an object wins (incremental
+    updates). Objects are parsed only when first asked for.
+    """
+
+    def __init__(self, data: bytes, max_decoded_bytes: int = MAX_DECODED_BYTES,
+                 max_content_bytes: int = MAX_CONTENT_BYTES, max_content_tokens: int = MAX_CONTENT_TOKENS):
+        start = data.find(PDF_MAGIC, 0, 1024)
+        if start < 0:
+            raise PDFSyntaxError("Not a PDF file")
+        self.data = data
+        self.budget = _Budget(max_decoded_bytes, "PDF streams decode to more than {} bytes")
+        self.content_bytes = _Budget(max_content_bytes, "PDF content interpretation exceeds {} bytes")
+        self.content_tokens = _Budget(max_content_tokens, "PDF content streams exceed {} tokens")
+        self.encrypted = _ENCRYPT.search(data) is not None
+        self._offsets: Dict[int, int] = {}
+        for match in _OBJ_HEADER.finditer(data):
+            self._offsets[int(match.group(1))] = match.end()
+        self._objects: Dict[int, Any] = {}
+        self._in_object_streams: Optional[Dict[int, Tuple[int, int]]] = None
+        # Font decoders by font object, shared by all pages (ToUnicode maps are parsed once)
+        self.fonts: Dict[Any, "_FontDecoder"] = {}
+
+    def resolve(self, value: Any) -> Any:
+        seen = 0
+        while isinstance(value, Ref) and seen < 32:
+            value = self.get(value.num)
+            seen += 1
+        return value
+
+    def get(self, num: int) -> Any:
+        if num in self._objects:
+            return self._objects[num]
+        self._objects[num] = None  # guards against reference cycles while parsing
+        if num in self._offsets:
+            value = self._parse_at(self._offsets[num])
+        else:
+            value = self._from_object_stream(num)
+        self._objects[num] = value
+        return value
+
+    def _parse_at(self, offset: int) -> Any:
+        lexer = _Lexer(self.data, offset)
+        value = lexer.read()
+        if not isinstance(value, dict):
+            return value
+        after = _WS.match(self.data, lexer.pos)
+        position = after.end() if after else lexer.pos
+        if not self.data.startswith(b"stream", position):
+            return value
+        data_start = position + len(b"stream")
+        newline = _STREAM_DATA.match(self.data, data_start)
+        if newline:
+            data_start = newline.end()
+        length = value.get("Length")
+        if isinstance(length, Ref):
+            length = self.get(length.num)
+        end = data_start + length if isinstance(length, int) and length >= 0 else -1
+        if end < 0 or self.data.find(b"endstream", end, end + 32) < 0:
+            end = self.data.find(b"endstream", data_start)
+            if end < 0:
+                end = len(self.data)
+            while end > data_start and self.data[end - 1] in b"\r\n":
+                end -= 1
+        return Stream(value, self.data[data_start:end], self.budget)
+
+    def _from_object_stream(self, num: int) -> Any:
+        if self._in_object_streams is None:
+            self._in_object_streams = {}
+            headers = sorted((offset, obj) for obj, offset in self._offsets.items())
+            offsets = [offset for offset, _ in headers]
+            for match in _OBJECT_STREAM.finditer(self.data):
+                index = bisect_right(offsets, match.start()) - 1
+                if index >= 0:
+                    self._index_object_stream(headers[index][1])
+        location = self._in_object_streams.get(num)
+        if location is None:
+            return None
+        stream_num, offset = location
+        stream = self.get(stream_num)
+        if not isinstance(stream, Stream):
+            return None
+        try:
+            return _Lexer(stream.decode(), offset).read()
+        except (PDFSyntaxError, zlib.error):
+            return None
+
+    def _index_object_stream(self, stream_num: int) -> None:
+        stream = self.get(stream_num)
+        if not isinstance(stream, Stream) or stream.get("Type") != "ObjStm":
+            return
+        try:
+            data = stream.decode()
+        except (PDFSyntaxError, zlib.error):
+            return
+        lexer = _Lexer(data)
+        first = stream.get("First", 0)
+        for _ in range(stream.get("N", 0)):
+            obj, offset = lexer.read(), lexer.read()
+            if not isinstance(obj, int) or not isinstance(offset, int):
+                break
+            self._in_object_streams.setdefault(obj, (stream_num, first + offset))
+
+    def _root(self) -> Optional[Dict[str, Any]]:
+        for match in reversed(list(_ROOT.finditer(self.data))):
+            root = self.resolve(Ref(int(match.group(1)), 0))
+            if isinstance(root, dict) and "Pages" in root:
+                return root
+        return None
+
+    def pages(self) -> Iterator[Dict[str, Any]]:
+        """Page dictionaries in document order, with inherited Resources filled in."""
+        root = self._root()
+        if root is None:
+            # No usable catalog: fall back to page objects in object-number order
+            for num in sorted(self._offsets):
+                page = self.get(num)
+                if isinstance(page, dict) and page.get("Type") == "Page":
+                    yield page
+            return
+
+        visited = set()
+        stack: List[Tuple[Any, Any]] = [(root.get("Pages"), None)]
+        while stack:
+            node_ref, inherited = stack.pop()
+            if isinstance(node_ref, Ref):
+                if node_ref.num in visited:
+                    continue
+                visited.add(node_ref.num)
+            node = self.resolve(node_ref)
+            if not isinstance(node, dict):
+                continue
+            resources = node.get("Resources", inherited)
+            kids = self.resolve(node.get("Kids"))
+            if isinstance(kids, list):
+                stack.extend((kid, resources) for kid in reversed(kids))
+            elif node.get("Type") != "Pages":
+                page = dict(node)
+                page["Resources"] = resources
+                yield page
+
+
+class _FontDecoder:
+    """Turns the bytes of a shown string into text, using the font's ToUnicode map when it has one."""
+
+    def __init__(self, doc: PDFDocument, font: Any):
+        font = doc.resolve(font) if font is not None else {}
+        if not isinstance(font, dict):
+            font = {}
+        self.composite = font.get("Subtype") == "Type0"
+        self.code_bytes = 2 if self.composite else 1
+        self.to_unicode: Dict[int, str] = {}
+        self.differences: Dict[int, str] = {}
+        to_unicode = doc.resolve(font.get("ToUnicode"))
+        if isinstance(to_unicode, Stream):
+            try:
+                self._read_cmap(to_unicode.decode())
+            except (PDFSyntaxError, zlib.error):
+                pass
+        encoding = doc.resolve(font.get("Encoding"))
+        if isinstance(encoding, dict):
+            code = 0
+            for item in doc.resolve(encoding.get("Differences")) or []:
+                if isinstance(item, int):
+                    code = item
+                elif isinstance(item, Name):
+                    self.differences[code] = _glyph_text(item)
+                    code += 1
+
+    def _read_cmap(self, data: bytes) -> None:
+        lexer = _Lexer(data)
+        operands: List[Any] = []
+        section = None
+        while True:
+            token = lexer.read()
+            if token is _EOF:
+                break
+            if isinstance(token, Operator):
+                if token in ("begincodespacerange", "beginbfchar", "beginbfrange"):
+                    section = token
+                    operands = []
+                elif token.startswith("end"):
+                    section = None
+                continue
+            if section is None:
+                continue
+            operands.append(token)
+            if section == "begincodespacerange" and len(operands) == 2:
+                if isinstance(operands[0], bytes) and operands[0]:
+                    self.code_bytes = len(operands[0])
+                operands = []
+            elif section == "beginbfchar" and len(operands) == 2:
+                source, target = operands
+                if isinstance(source, bytes) and isinstance(target, bytes):
+                    self.to_unicode[int.from_bytes(source, "big")] = _utf16(target)
+                operands = []
+            elif section == "beginbfrange" and len(operands) == 3:
+                low, high, target = operands
+                if isinstance(low, bytes) and isinstance(high, bytes):
+                    low, high = int.from_bytes(low, "big"), int.from_bytes(high, "big")
+                    if isinstance(target, list):
+                        for offset, item in enumerate(target[:high - low + 1]):
+                            if isinstance(item, bytes):
+                                self.to_unicode[low + offset] = _utf16(item)
+                    elif isinstance(target, bytes) and target and high - low < 0x10000:
+                        base = int.from_bytes(target, "big")
+                        for offset in range(high - low + 1):
+                            self.to_unicode[low + offset] = _utf16((base + offset).to_bytes(len(target), "big"))
+                operands = []
+
+    def decode(self, data: bytes) -> str:
+        if not self.to_unicode and not self.differences:
+            # Simple font with a standard encoding; composite fonts without a map are unreadable
+            return "" if self.composite else data.decode("cp1252", errors="replace")
+        width = self.code_bytes
+        chars = []
+        for i in range(0, len(data) - width + 1, width):
+            code = int.from_bytes(data[i:i + width], "big")
+            text = self.to_unicode.get(code)
+            if text is None:
+                text = self.differences.get(code)
+            if text is None and not self.composite:
+                text = bytes([code]).decode("cp1252", errors="replace")
+            chars.append(text or "")
+        return "".join(chars)
+
+
+def _utf16(data: bytes) -> str:
+    if len(data) % 2:
+        data = b"\x00" + data
+    return data.decode("utf-16-be", errors="replace")
+
+
+def _glyph_text(name: str) -> str:
+    if name in _GLYPH_NAMES:
+        return _GLYPH_NAMES[name]
+    if len(name) == 1:
+        return name
+    if name.startswith("uni") and len(name) == 7:
+        try:
+            return chr(int(name[3:], 16))
+        except ValueError:
+            pass
+    return ""
+
+
+def _content_data(doc: PDFDocument, contents: Any) -> bytes:
+    contents = doc.resolve(contents)
+    streams = contents if isinstance(contents, list) else [contents]
+    parts = []
+    for stream in streams:
+        stream = doc.resolve(stream)
+        if isinstance(stream, Stream):
+            try:
+                parts.append(stream.decode())
+            except (PDFSyntaxError, zlib.error):
+                continue
+    return b"\n".join(parts)
+
+
+class _TextCollector:
+    """Interprets the text operators of content streams into lines of text."""
+
+    def __init__(self, doc: PDFDocument):
+        self.doc = doc
+        self.out: List[str] = []
+        self.line_y: Optional[float] = None
+
+    def _decoder(self, font: Any) -> _FontDecoder:
+        key = font if isinstance(font, Ref) or font is None else id(font)
+        decoder = self.doc.fonts.get(key)
+        if decoder is None:
+            decoder = self.doc.fonts[key] = _FontDecoder(self.doc, font)
+        return decoder
+
+    def _move_to(self, y: float) -> None:
+        # Runs on the same baseline are cells of one table row
+        if self.line_y is None or abs(y - self.line_y) > 1.0:
+            self.out.append("\n")
+        else:
+            self.out.append(" ")
+        self.line_y = y
+
+    def _show(self, text: str) -> None:
+        # A ToUnicode map can turn each byte into a long string
+        self.doc.content_bytes.spend(len(text))
+        self.out.append(text)
+
+    def run(self, data: bytes, resources: Any, depth: int = 0) -> None:
+        doc = self.doc
+        # Charged on every run, so a form drawn many times pays for each drawing
+        doc.content_bytes.spend(len(data))
+        resources = doc.resolve(resources) or {}
+        fonts = doc.resolve(resources.get("Font")) if isinstance(resources, dict) else None
+        fonts = fonts if isinstance(fonts, dict) else {}
+        decoder = self._decoder(None)
+        start_y = 0.0
+        leading = 0.0
+        lexer = _Lexer(data, budget=doc.content_tokens)
+        operands: List[Any] = []
+        while True:
+            token = lexer.read()
+            if token is _EOF:
+                break
+            if not isinstance(token, Operator):
+                operands.append(token)
+                continue
+            op = token
+            numbers = [value for value in operands if isinstance(value, (int, float))]
+            if op == "BT":
+                start_y = 0.0
+            elif op == "Tf" and operands and isinstance(operands[0], Name):
+                decoder = self._decoder(fonts.get(operands[0]))
+            elif op in ("Td", "TD") and len(numbers) >= 2:
+                start_y += numbers[-1]
+                if op == "TD":
+                    leading = -numbers[-1]
+                self._move_to(start_y)
+            elif op == "Tm" and len(numbers) >= 6:
+                start_y = numbers[5]
+                self._move_to(start_y)
+            elif op == "TL" and numbers:
+                leading = numbers[-1]
+            elif op in ("T*", "'", '"'):
+                start_y -= leading
+                self._move_to(start_y)
+            if op in ("Tj", "'", '"') and operands and isinstance(operands[-1], bytes):
+                self._show(decoder.decode(operands[-1]))
+            elif op == "TJ" and operands and isinstance(operands[-1], list):
+                for item in operands[-1]:
+                    if isinstance(item, bytes):
+                        self._show(decoder.decode(item))
+                    elif isinstance(item, (int, float)) and item <= -150:
+                        # A wide negative kern (in thousandths of an em) is a word gap
+                        self.out.append(" ")
+            elif op == "ID":
+                # Inline image data is binary: skip to its EI
+                end = _INLINE_IMAGE_END.search(data, lexer.pos)
+                lexer.pos = end.end() if end else len(data)
+            elif op == "Do" and operands and isinstance(operands[-1], Name) and depth < MAX_FORM_DEPTH:
+                xobjects = doc.resolve(resources.get("XObject")) if isinstance(resources, dict) else None
+                form = doc.resolve(xobjects.get(operands[-1])) if isinstance(xobjects, dict) else None
+                if isinstance(form, Stream) and form.get("Subtype") == "Form":
+                    try:
+                        form_data = form.decode()
+                    except (PDFSyntaxError, zlib.error):
+                        form_data = b""
+                    self.run(form_data, form.get("Resources", resources), depth + 1)
+            operands = []
+
+    def text(self) -> str:
+        return "".join(self.out).strip()
+
+
+def iter_page_texts(pdf_bytes: bytes, max_pages: Optional[int] = None,
+                    max_decoded_bytes: int = MAX_DECODED_BYTES, max_content_bytes: int = MAX_CONTENT_BYTES,
+                    max_content_tokens: int = MAX_CONTENT_TOKENS) -> Iterator[str]:
+    """
+    Text of each page in order, extracted only when the caller asks for the next page.
+    Yields nothing for encrypted files. Raises PDFSyntaxError if the data is not a PDF, and
+    PDFTooLarge once the pages read so far exceed a budget: streams decoded to more than
+    `max_decoded_bytes`, or content interpreted past `max_content_bytes` or `max_content_tokens`.
+    """
+    doc = PDFDocument(pdf_bytes, max_decoded_bytes, max_content_bytes, max_content_tokens)
+    if doc.encrypted:
+        return
+    for index, page in enumerate(doc.pages()):
+        if max_pages is not None and index >= max_pages:
+            return
+        collector = _TextCollector(doc)
+        try:
+            collector.run(_content_data(doc, page.get("Contents")), page.get("Resources"))
+        except PDFSyntaxError:
+            pass  # keep the text read before the damaged part of the page
+        yield collector.text()
+
+
+def extract_pdf_text(pdf_bytes: bytes, max_pages: Optional[int] = None) -> str:
+    """The whole text layer, pages separated by form feeds."""
+    return "\f".join(iter_page_texts(pdf_bytes, max_pages))
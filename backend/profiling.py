@@ -0,0 +1,239 @@
+import asyncio
+import hmac
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from itertools import count
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import HTTP_REQUESTS_IN_FLIGHT, PROFILES_CAPTURED
+from tracing import current_request_id, log
+
+# On-demand profiling of single uploads, to see where a slow report spends its CPU without a
+# redeploy. A profiled request is sampled by a background thread that reads the stack of every
+# thread (the event loop and the pre-processing pool alike) every PROFILE_INTERVAL_MS and writes
+# the counts as collapsed stacks ("frame;frame;frame count" per line), the input format of
+# flamegraph.pl, speedscope and inferno. Other requests running at the same time show up in the
+# same profile; its metadata says how many there were.
+# PROFILE_TOKEN         - admin secret: uploads sent with X-Profile-Token set to it are profiled, and
+#                         it is required to list and download profiles (unset: header ignored, no API)
+# PROFILE_SAMPLE_EVERY  - also profile one in this many uploads (default 0: only on request)
+# PROFILE_DIR           - directory of the profile ring (default: <tmp>/nadircare-profiles)
+# PROFILE_MAX_FILES     - profiles kept; the oldest are deleted first
+# PROFILE_INTERVAL_MS   - sampling interval
+# PROFILE_MAX_SECONDS   - sampling stops after this long, however long the request takes
+# With neither PROFILE_TOKEN nor PROFILE_SAMPLE_EVERY set, requests pass through untouched.
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILED_PATHS = ("/upload", "/upload/stream")
+DEFAULT_MAX_FILES = 50
+DEFAULT_INTERVAL_MS = 5.0
+DEFAULT_MAX_SECONDS = 60.0
+
+_PROFILE_ID = re.compile(r"^[0-9A-Za-z-]+$")
+# Innermost frames of a thread that is waiting for work, not running any
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def _frame_label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the collapsed stacks of all other threads, sampled every `interval` seconds."""
+
+    def __init__(self, interval: float, max_seconds: float):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                self.truncated = True
+                return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class ProfileStore:
+    """A directory of collapsed-stack profiles, each with a JSON sidecar, bounded to `max_files`."""
+
+    def __init__(self, directory: Path, max_files: int = DEFAULT_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max(1, max_files)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        """The profile's file, or None for ids that are malformed or no longer (or never) stored."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.folded"
+        return path if path.exists() else None
+
+    def save(self, profile_id: str, collapsed: str, meta: Dict[str, Any]) -> None:
+        (self.directory / f"{profile_id}.folded").write_text(collapsed)
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta))
+        # Ids start with the capture time, so name order is age order
+        for stale in sorted(self.directory.glob("*.folded"))[:-self.max_files]:
+            stale.unlink(missing_ok=True)
+            stale.with_suffix(".json").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for sidecar in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append(json.loads(sidecar.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+
+class RequestProfiler:
+    def __init__(self, store: ProfileStore, token: Optional[str] = None, sample_every: int = 0,
+                 interval: float = DEFAULT_INTERVAL_MS / 1000, max_seconds: float = DEFAULT_MAX_SECONDS):
+        self.store = store
+        self.token = token
+        self.sample_every = max(0, sample_every)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._uploads = count(1)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def trigger(self, token: Optional[str]) -> Optional[str]:
+        """Why this upload should be profiled ("header" or "sampled"), or None."""
+        if token is not None and self.authorized(token):
+            return "header"
+        if self.sample_every and next(self._uploads) % self.sample_every == 0:
+            return "sampled"
+        return None
+
+    async def profile(self, trigger: str, path: str, run: Callable[[], Awaitable[None]],
+                      on_id: Callable[[str], None]) -> None:
+        # Milliseconds since the epoch first, so the ring can sort ids by age
+        profile_id = f"{time.time_ns() // 1_000_000}-{uuid.uuid4().hex[:8]}"
+        on_id(profile_id)
+        sampler = StackSampler(self.interval, self.max_seconds)
+        started_at, started = time.time(), time.perf_counter()
+        sampler.start()
+        try:
+            await run()
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            meta = {
+                "id": profile_id,
+                "request_id": current_request_id(),
+                "path": path,
+                "trigger": trigger,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "samples": sampler.samples,
+                "idle_thread_samples": sampler.idle_samples,
+                "truncated": sampler.truncated,
+                # Other requests in flight meanwhile appear in the same stacks
+                "requests_in_flight": int(HTTP_REQUESTS_IN_FLIGHT.value()),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, sampler.collapsed(), meta)
+                PROFILES_CAPTURED.inc(trigger=trigger)
+                log(f"Profile {profile_id} saved ({trigger}, {sampler.samples} samples)")
+            except OSError as e:
+                log(f"Profile {profile_id} could not be saved: {str(e)}")
+
+
+_profiler: Optional[RequestProfiler] = None
+_profiler_configured = False
+
+
+def get_request_profiler() -> Optional[RequestProfiler]:
+    """The process-wide profiler, or None when profiling is off (checked once per process)."""
+    global _profiler, _profiler_configured
+    if not _profiler_configured:
+        token = os.getenv("PROFILE_TOKEN") or None
+        sample_every = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+        if token or sample_every > 0:
+            directory = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "nadircare-profiles")
+            _profiler = RequestProfiler(
+                ProfileStore(Path(directory), int(os.getenv("PROFILE_MAX_FILES", str(DEFAULT_MAX_FILES)))),
+                token=token,
+                sample_every=sample_every,
+                interval=float(os.getenv("PROFILE_INTERVAL_MS", str(DEFAULT_INTERVAL_MS))) / 1000,
+                max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", str(DEFAULT_MAX_SECONDS))),
+            )
+        _profiler_configured = True
+    return _profiler
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles uploads picked by the request profiler and names the
+    profile in an X-Profile-Id response header. With profiling off it only calls through.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]],
+                       send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        profiler = get_request_profiler()
+        if profiler is None or scope["type"] != "http" or scope["path"] not in PROFILED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(PROFILE_TOKEN_HEADER.lower().encode())
+        trigger = profiler.trigger(token.decode("latin-1") if token is not None else None)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile: Dict[str, str] = {}
+
+        async def send_with_profile_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode(), profile["id"].encode("latin-1"))
+                ]
+            await send(message)
+
+        await profiler.profile(
+            trigger, scope["path"], lambda: self.app(scope, receive, send_with_profile_id),
+            on_id=lambda profile_id: profile.update(id=profile_id),
+        )
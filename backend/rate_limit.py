@@ -0,0 +1,283 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from metrics import MODEL_BREAKER_STATE, MODEL_FAST_FAILURES, MODEL_RETRIES
+from tracing import log
+
+# Client-side protection for the model API: a token bucket that learns the provider's
+# request rate from its rate-limit headers, retries with jittered backoff inside a deadline,
+# and a circuit breaker that fails fast while the upstream keeps failing.
+DEFAULT_BURST = 10.0
+DEFAULT_RETRY_DEADLINE = 45.0
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30.0
+
+# Limits reported by the API; a remaining count of 0 pauses calls until that limit resets
+RATE_LIMIT_KINDS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling the model API while it is rate limiting us or unhealthy."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Model API unavailable ({reason}), retry after {math.ceil(retry_after)} seconds")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _seconds_until(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds from now until an RFC 3339 reset time, or None if missing or unparsable."""
+    if not timestamp:
+        return None
+    try:
+        reset = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset.tzinfo is None:
+        reset = reset.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket for outgoing model calls. Without a configured `rate` it lets calls through
+    until the API reports its request limit, then refills at that limit per minute. A
+    Retry-After or an exhausted limit pauses every caller until the limit resets.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: float = DEFAULT_BURST,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a call could start (0 when a token is available now)."""
+        now = self._clock()
+        self._refill(now)
+        if self._paused_until > now:
+            return self._paused_until - now
+        if not self.rate or self._tokens >= 1.0:
+            return 0.0
+        return (1.0 - self._tokens) / self.rate
+
+    async def acquire(self, deadline: float) -> None:
+        """
+        Take a token, waiting for one if needed. Raises UpstreamUnavailable right away when
+        no token will be available before `deadline` (a clock() value).
+        """
+        while True:
+            wait = self.wait_time()
+            if wait <= 0:
+                if self.rate:
+                    self._tokens -= 1.0
+                return
+            if self._clock() + wait > deadline:
+                MODEL_FAST_FAILURES.inc(reason="rate_limited")
+                raise UpstreamUnavailable("rate limited", wait)
+            await asyncio.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available now; never waits (used for optional calls like hedges)."""
+        if self.wait_time() > 0:
+            return False
+        if self.rate:
+            self._tokens -= 1.0
+        return True
+
+    def pause(self, seconds: float) -> None:
+        now = self._clock()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._refill(now)
+        self._tokens = 0.0
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Learn from the rate-limit headers of a response (successful or not)."""
+        limit = _header_float(headers, "anthropic-ratelimit-requests-limit")
+        if limit:
+            rate = limit / 60.0
+            if rate != self.rate:
+                self._refill(self._clock())
+                self.rate = rate
+                self.burst = max(1.0, min(self.burst, limit))
+                self._tokens = min(self._tokens, self.burst)
+        for kind in RATE_LIMIT_KINDS:
+            if _header_float(headers, f"anthropic-ratelimit-{kind}-remaining") == 0:
+                reset_in = _seconds_until(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+                if reset_in:
+                    self.pause(reset_in)
+        retry_after = _header_float(headers, "retry-after")
+        if retry_after:
+            self.pause(retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        wait = self.wait_time()
+        return {
+            "rate_per_second": self.rate or 0.0,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 3),
+            "wait_seconds": round(wait, 3),
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and rejects calls for
+    `reset_timeout` seconds. Then a single probe call is let through (half-open): success
+    closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_BREAKER_RESET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        MODEL_BREAKER_STATE.set(BREAKER_STATES["closed"])
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            log(f"Model API circuit breaker: {self._state} -> {state}")
+        self._state = state
+        MODEL_BREAKER_STATE.set(BREAKER_STATES[state])
+
+    @property
+    def state(self) -> str:
+        if self._state == "open" and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state("half_open")
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def before_call(self) -> None:
+        """Raises UpstreamUnavailable while open, or while a half-open probe is in flight."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "open" or self._probing:
+            MODEL_FAST_FAILURES.inc(reason="circuit_open")
+            raise UpstreamUnavailable("circuit open", self.retry_after() or 1)
+        self._probing = True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self._state == "half_open" or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            self._set_state("open")
+
+    def release(self) -> None:
+        """Forget an abandoned (cancelled) call without judging the upstream by it."""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_after_seconds": round(self.retry_after(), 3) if self._state == "open" else 0.0,
+        }
+
+
+def _retry_reason(error: BaseException) -> Optional[str]:
+    """Why a failed call is worth retrying, or None for errors a retry cannot fix."""
+    # Imported here, like in anthropic_client: only calls that failed need the SDK's error classes
+    import anthropic
+
+    if isinstance(error, anthropic.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, anthropic.OverloadedError):
+        return "overloaded"
+    if isinstance(error, anthropic.InternalServerError):
+        return "server_error"
+    if isinstance(error, anthropic.APIConnectionError):
+        return "connection_error"
+    return None
+
+
+async def call_with_retries(call: Callable[[float], Awaitable[Any]], limiter: AdaptiveRateLimiter,
+                            breaker: CircuitBreaker, deadline_seconds: float = DEFAULT_RETRY_DEADLINE,
+                            backoff_base: float = DEFAULT_BACKOFF_BASE,
+                            backoff_max: float = DEFAULT_BACKOFF_MAX) -> Any:
+    """
+    Run `call(remaining_seconds)` - which must return a raw response with `.headers` - through
+    the breaker and the limiter, retrying 429/529/5xx and connection errors with full-jitter
+    exponential backoff until `deadline_seconds` have passed. Rate limits do not count as
+    breaker failures; the limiter handles them. Raises UpstreamUnavailable when the breaker
+    is open or the deadline leaves no room for another attempt, and other errors unchanged.
+    """
+    clock = limiter._clock
+    deadline = clock() + deadline_seconds
+    attempt = 0
+    while True:
+        await limiter.acquire(deadline)
+        breaker.before_call()
+        try:
+            response = await call(deadline - clock())
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            reason = _retry_reason(e)
+            if reason is None:
+                import anthropic
+
+                # A 4xx means the API itself answered; anything else says nothing about it
+                if isinstance(e, anthropic.APIStatusError):
+                    breaker.record_success()
+                else:
+                    breaker.release()
+                raise
+            response = getattr(e, "response", None)
+            if response is not None:
+                limiter.observe(response.headers)
+            if reason == "rate_limited":
+                breaker.release()
+            else:
+                breaker.record_failure()
+            delay = random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt))
+            attempt += 1
+            if breaker.state == "open":
+                MODEL_FAST_FAILURES.inc(reason="circuit_open")
+                raise UpstreamUnavailable("circuit open", breaker.retry_after()) from e
+            if clock() + max(delay, limiter.wait_time()) >= deadline:
+                MODEL_FAST_FAILURES.inc(reason="deadline")
+                raise UpstreamUnavailable(reason.replace("_", " "), max(delay, limiter.wait_time(), 1)) from e
+            MODEL_RETRIES.inc(reason=reason)
+            log(f"Model API {reason} ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        limiter.observe(response.headers)
+        breaker.record_success()
+        return response
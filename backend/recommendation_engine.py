@@ -1,4 +1,5 @@
-from typing import Dict, Any, List
+import re
+from typing import Dict, Any, Iterable, List
 from enum import Enum
 
 class RecommendationType(str, Enum):
@@ -7,83 +8,220 @@ class RecommendationType(str, Enum):
     HOME_MEDICATION = "HOME_MEDICATION"
 
 
+# Critical keywords that indicate hospital admission
+CRITICAL_KEYWORDS = (
+    "severe", "critical", "emergency", "urgent", "acute",
+    "heart attack", "stroke", "pneumonia", "sepsis", "infection",
+    "high fever", "chest pain", "difficulty breathing", "unconscious",
+    "blood pressure", "bp", "heart rate", "pulse", "surgery"
+)
+
+# Moderate keywords that indicate doctor visit
+MODERATE_KEYWORDS = (
+    "moderate", "abnormal", "elevated", "increased", "decreased",
+    "pain", "discomfort", "infection", "inflammation", "fever",
+    "consult", "follow up", "examination", "test results"
+)
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """
+    Regex for a set of literal keywords, factored into a character trie.
+    Branches share their common prefixes, so each position costs at most one walk down
+    the trie instead of one attempt per keyword.
+    """
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + pattern + ")?" if "" in node else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Multi-keyword matcher compiled once into a single trie-shaped regular expression.
+
+    Keywords match as substrings of the lower-cased text, exactly like `keyword in text`,
+    and `find` reports every keyword that occurs, overlapping occurrences included, from
+    one left-to-right scan. The regex scan is non-overlapping, so - as in Aho-Corasick -
+    the overlaps are precomputed per keyword: the keywords it contains, and the offsets
+    where a suffix of it could be the start of another keyword ("acut|e|mergency").
+    Only those offsets are re-checked after a hit. The keyword set must be prefix-free
+    (no keyword is the beginning of another) so every position matches at most one keyword.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = sorted(set(keywords))
+        for keyword, following in zip(keywords, keywords[1:]):
+            if following.startswith(keyword):
+                raise ValueError(f"Keyword {keyword!r} is a prefix of {following!r}; matches would be missed")
+
+        self._pattern = re.compile(_trie_pattern(keywords))
+        self._contained = {
+            keyword: tuple(other for other in keywords if other != keyword and other in keyword)
+            for keyword in keywords
+        }
+        self._straddle_offsets = {
+            keyword: tuple(
+                offset for offset in range(1, len(keyword))
+                if any(other.startswith(keyword[offset:]) and len(other) > len(keyword) - offset
+                       for other in keywords)
+            )
+            for keyword in keywords
+        }
+
+    def find(self, text: str) -> List[str]:
+        """Return the distinct keywords that occur in `text`."""
+        found: Dict[str, None] = {}
+        match_at = self._pattern.match
+        for match in self._pattern.finditer(text):
+            keyword = match.group()
+            found[keyword] = None
+            for contained in self._contained[keyword]:
+                found[contained] = None
+            start = match.start()
+            for offset in self._straddle_offsets[keyword]:
+                straddling = match_at(text, start + offset)
+                if straddling is not None:
+                    found[straddling.group()] = None
+        return list(found)
+
+RULE_MATCHER = KeywordMatcher(CRITICAL_KEYWORDS + MODERATE_KEYWORDS)
+_CRITICAL = frozenset(CRITICAL_KEYWORDS)
+_MODERATE = frozenset(MODERATE_KEYWORDS)
+
+_ADMISSION = (
+    RecommendationType.ADMISSION,
+    "Based on the severity and critical indicators in your report, immediate hospital admission is recommended.",
+    (
+        "Seek immediate medical attention at the nearest hospital",
+        "Call emergency services if symptoms worsen",
+        "Do not delay treatment",
+        "Inform family members about your condition"
+    ),
+    0.85
+)
+
+_DOCTOR_VISIT = (
+    RecommendationType.DOCTOR_VISIT,
+    "Your medical report indicates moderate concerns that require professional medical consultation.",
+    (
+        "Schedule an appointment with your doctor as soon as possible",
+        "Bring this report to your consultation",
+        "Follow any prescribed medication or treatment plan",
+        "Monitor your symptoms and report any changes"
+    ),
+    0.75
+)
+
+_FALLING_ANC = (
+    RecommendationType.DOCTOR_VISIT,
+    "Your ANC is still above 500 but has been falling and is projected to drop below 500 within a few days.",
+    (
+        "Contact your oncology team about your falling blood counts",
+        "Ask whether a repeat blood count is needed before your next scheduled one",
+        "Check your temperature regularly and report any fever immediately",
+        "Avoid crowds and people who are unwell"
+    ),
+    0.7
+)
+
+# A falling ANC projected to reach 500 within this many days turns home care into a doctor visit
+ANC_TREND_ALERT_DAYS = 3.0
+
+_HOME_MEDICATION = (
+    RecommendationType.HOME_MEDICATION,
+    "Based on your report, the condition appears manageable with appropriate home care and medication.",
+    (
+        "Follow the recommended medication schedule",
+        "Rest and maintain good hydration",
+        "Monitor your symptoms",
+        "Contact a healthcare provider if symptoms persist or worsen"
+    ),
+    0.65
+)
+
+
 def get_recommendation(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Rule-based recommendation engine.
     Analyzes parsed medical data and determines the appropriate recommendation.
+    The response names the rule that decided it and the keywords that were found.
+    With a CBC panel, the other analytes' flags reach the rules through the conditions and
+    severity of the parsed report, and the response lists the values outside their reference
+    ranges in "abnormal_analytes". With the patient's "anc_trend", an ANC projected to fall
+    below 500 within ANC_TREND_ALERT_DAYS raises home care to a doctor visit.
     """
     severity = parsed_data.get("severity", "low").lower()
     conditions = parsed_data.get("conditions", [])
     symptoms = parsed_data.get("symptoms", [])
     test_results = parsed_data.get("test_results", [])
-    
-    # Critical keywords that indicate hospital admission
-    critical_keywords = [
-        "severe", "critical", "emergency", "urgent", "acute",
-        "heart attack", "stroke", "pneumonia", "sepsis", "infection",
-        "high fever", "chest pain", "difficulty breathing", "unconscious",
-        "blood pressure", "bp", "heart rate", "pulse", "surgery"
-    ]
-    
-    # Moderate keywords that indicate doctor visit
-    moderate_keywords = [
-        "moderate", "abnormal", "elevated", "increased", "decreased",
-        "pain", "discomfort", "infection", "inflammation", "fever",
-        "consult", "follow up", "examination", "test results"
-    ]
-    
+
     # Check severity level
     is_critical = severity in ["critical", "high"]
     is_moderate = severity == "moderate"
-    
+
     # Check conditions and symptoms for critical indicators
     all_text = " ".join(conditions + symptoms + test_results).lower()
-    
-    critical_found = any(keyword in all_text for keyword in critical_keywords)
-    moderate_found = any(keyword in all_text for keyword in moderate_keywords)
-    
+    matched_keywords = RULE_MATCHER.find(all_text)
+
     # Decision logic
-    if is_critical or critical_found:
-        recommendation = RecommendationType.ADMISSION
-        reasoning = "Based on the severity and critical indicators in your report, immediate hospital admission is recommended."
-        suggested_actions = [
-            "Seek immediate medical attention at the nearest hospital",
-            "Call emergency services if symptoms worsen",
-            "Do not delay treatment",
-            "Inform family members about your condition"
-        ]
-        confidence = 0.85
-    elif is_moderate or moderate_found:
-        recommendation = RecommendationType.DOCTOR_VISIT
-        reasoning = "Your medical report indicates moderate concerns that require professional medical consultation."
-        suggested_actions = [
-            "Schedule an appointment with your doctor as soon as possible",
-            "Bring this report to your consultation",
-            "Follow any prescribed medication or treatment plan",
-            "Monitor your symptoms and report any changes"
-        ]
-        confidence = 0.75
+    if is_critical:
+        rule, decision = "severity", _ADMISSION
+    elif not _CRITICAL.isdisjoint(matched_keywords):
+        rule, decision = "critical_keywords", _ADMISSION
+    elif is_moderate:
+        rule, decision = "severity", _DOCTOR_VISIT
+    elif not _MODERATE.isdisjoint(matched_keywords):
+        rule, decision = "moderate_keywords", _DOCTOR_VISIT
     else:
-        recommendation = RecommendationType.HOME_MEDICATION
-        reasoning = "Based on your report, the condition appears manageable with appropriate home care and medication."
-        suggested_actions = [
-            "Follow the recommended medication schedule",
-            "Rest and maintain good hydration",
-            "Monitor your symptoms",
-            "Contact a healthcare provider if symptoms persist or worsen"
-        ]
-        confidence = 0.65
-
-    if parsed_data.get("anc_extraction").get("status") == "success":
-        anc_value = parsed_data.get("anc_extraction", None).get("anc_value", None)
+        rule, decision = "default", _HOME_MEDICATION
+    anc_trend = parsed_data.get("anc_trend")
+    if decision is _HOME_MEDICATION and anc_trend:
+        days_to_500 = anc_trend.get("days_to_500")
+        if days_to_500 is not None and days_to_500 <= ANC_TREND_ALERT_DAYS:
+            rule, decision = "anc_trend", _FALLING_ANC
+    recommendation, reasoning, suggested_actions, confidence = decision
+
+    anc_extraction = parsed_data.get("anc_extraction") or {}
+    if anc_extraction.get("status") == "success":
+        anc_value = anc_extraction.get("anc_value", None)
     else:
         anc_value = None
 
+    panel = parsed_data.get("panel") or {}
+    abnormal_analytes = {
+        key: result["flag"] for key, result in panel.items() if result.get("flag") not in (None, "normal")
+    }
+
     return {
         "recommendation": recommendation.value,
         "confidence": confidence,
         "reasoning": reasoning,
-        "suggested_actions": suggested_actions,
+        "suggested_actions": list(suggested_actions),
         "anc_value": anc_value,
-        "severity": parsed_data.get("severity", "low")
+        "severity": parsed_data.get("severity", "low"),
+        "rule": rule,
+        "matched_keywords": matched_keywords,
+        "panel": parsed_data.get("panel"),
+        "abnormal_analytes": abnormal_analytes,
+        "anc_trend": anc_trend
     }
+
+
+def get_recommendations(batch: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Score many parsed reports at once (batch jobs, offline re-scoring).
+    Returns one recommendation per report, in input order.
+    """
+    return [get_recommendation(parsed_data) for parsed_data in batch]
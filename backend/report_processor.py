@@ -1,45 +1,175 @@
-import anthropic
 import os
+import asyncio
 import base64
+import hashlib
+import json
 import re
+import time
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import SimpleNamespace
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
+from anthropic_client import get_anthropic_client, create_message, stream_message
+from image_preprocessing import preprocess_image_async
+from pdf_text import PDF_MAGIC, extract_pdf_text
+from anc_text import find_panel_in_pdf
+from analytes import (
+    ANALYTES, Analyte, AnalyteResult, analyte_result, cbc_panel, condition, panel_analytes, printed_unit_factor,
+    to_canonical
+)
+from single_flight import SingleFlight
+from result_cache import CACHEABLE_STATUSES, get_result_cache, make_cache_key
+from metrics import (
+    ANC_EXTRACTIONS, COALESCED_UPLOADS, EXTRACTIONS_IN_FLIGHT, MODEL_PAYLOAD_BYTES, NEAR_DUPLICATE_LOOKUPS,
+    PDF_LOCAL_EXTRACTIONS
+)
+from tracing import emit_progress, log, progress_enabled, record_stage, span
+from cascade import cascade_config, cascade_enabled, run_cascade
+from near_duplicates import (
+    agrees, get_near_duplicate_index, near_duplicate_config, photo_hash_async, prior_record, worth_indexing
+)
 
-# Load environment variables from .env file
-# Get the directory where this script is located
-script_dir = Path(__file__).parent
-env_path = script_dir / ".env"
-
-# Load .env file if it exists
-if env_path.exists():
-    load_dotenv(dotenv_path=env_path)
-    print(f"Loaded .env file from: {env_path}")
-else:
-    # Try loading from current directory as fallback
-    load_dotenv()
-    if not os.getenv("ANTHROPIC_API_KEY"):
-        print(f"Warning: .env file not found at {env_path}")
-        print("Please create a .env file in the backend directory with: ANTHROPIC_API_KEY=your_key")
-
-# Lazy initialization of Anthropic client
-# Set your API key in environment variable: ANTHROPIC_API_KEY or .env file
-_anthropic_client: Optional[anthropic.Anthropic] = None
-
-def get_anthropic_client() -> Optional[anthropic.Anthropic]:
-    """Get or create Anthropic client if API key is available."""
-    global _anthropic_client
-    if _anthropic_client is None:
-        api_key = os.getenv("ANTHROPIC_API_KEY", "")
-        if api_key:
-            try:
-                _anthropic_client = anthropic.Anthropic(api_key=api_key)
-            except Exception as e:
-                print(f"Warning: Could not initialize Anthropic client: {e}")
-                return None
-        else:
-            print("Warning: ANTHROPIC_API_KEY not found in environment variables or .env file")
-    return _anthropic_client
+# Load environment variables from the .env file next to this module, or the current directory's
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path if env_path.exists() else None)
+
+ANC_EXTRACTION_MODEL = "claude-haiku-4-5-20251001"
+# ANC values (per microliter) where the severity band changes; see _process_medical_report
+ANC_SEVERITY_CUTOFFS = (500, 1000, 1500)
+ANC_PROMPT_FILE = Path(__file__).parent / "prompts" / "anc_extraction_prompt.txt"
+ANC_STRUCTURED_PROMPT_FILE = Path(__file__).parent / "prompts" / "anc_structured_prompt.txt"
+CBC_PANEL_PROMPT_FILE = Path(__file__).parent / "prompts" / "cbc_panel_prompt.txt"
+
+# ANC extraction modes (ANC_EXTRACTION_MODE):
+# reasoning  - free-form reasoning followed by an <answer> tag (default)
+# structured - a single record_anc tool call with a small output budget (ANC_STRUCTURED_MAX_TOKENS)
+ANC_EXTRACTION_MODES = ("reasoning", "structured")
+REASONING_MAX_TOKENS = 1024
+DEFAULT_STRUCTURED_MAX_TOKENS = 200
+# A panel (CBC_PANEL, see analytes.py) is always read with one record_cbc_panel tool call
+PANEL_MAX_TOKENS_PER_ANALYTE = 60
+# A record_cbc_panel result as printed: number (thousands separators allowed) then unit
+_PRINTED_RESULT = re.compile(r"(?P<value>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)\s*(?P<unit>[^\d.,\s].*)?")
+# The reasoning-mode <answer>: "1234 per microliter", "1,234 microliter", or failing that any number
+_ANSWER_VALUE = re.compile(r'([\d,]+\.?\d*)\s*(?:per\s+)?microliter', re.IGNORECASE)
+_ANSWER_NUMBER = re.compile(r'[\d,]+\.?\d*')
+
+# Streamed extractions (POST /upload/stream) report output progress at most this often, in seconds
+PROGRESS_INTERVAL = 0.25
+
+# Digital PDFs: the ANC is read from the text layer without a model call when possible.
+# PDF_LOCAL_PARSER - "0" sends every PDF to the model
+# PDF_MAX_PAGES    - pages searched for a neutrophil line
+DEFAULT_PDF_MAX_PAGES = 20
+
+ANC_TOOL = {
+    "name": "record_anc",
+    "description": "Record the Absolute Neutrophil Count read from the CBC report image.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "value": {"type": ["number", "null"], "description": "Number as printed, thousands separators removed"},
+            "unit": {"type": ["string", "null"], "description": "Unit as printed, e.g. /uL, K/uL, x10^3/uL"},
+            "multiplier": {"type": "number", "description": "Factor converting value to cells per microliter"},
+            "status": {"type": "string", "enum": ["success", "not_found", "unclear"]},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        },
+        "required": ["value", "unit", "multiplier", "status", "confidence"],
+    },
+}
+_ANC_TOOL_JSON = json.dumps(ANC_TOOL, sort_keys=True)
+
+
+def panel_tool(analytes: Sequence[Analyte]) -> Dict[str, Any]:
+    """
+    The record_cbc_panel tool: each analyte as one short string, the result as printed
+    ("2.03 K/uL", "not_found" or "unclear"), and one confidence for the whole read. The
+    registry parses and converts the strings, which keeps the output - and so the latency -
+    about the size of the single-analyte record_anc call.
+    """
+    properties: Dict[str, Any] = {
+        analyte.key: {"type": "string", "description": f"{analyte.name}: value and unit as printed"}
+        for analyte in analytes
+    }
+    properties["confidence"] = {"type": "number", "minimum": 0, "maximum": 1}
+    return {
+        "name": "record_cbc_panel",
+        "description": "Record the requested CBC results read from the report image.",
+        "input_schema": {"type": "object", "properties": properties, "required": list(properties)},
+    }
+
+
+@lru_cache(maxsize=32)
+def _panel_tool_json(analytes: Tuple[Analyte, ...]) -> str:
+    return json.dumps(panel_tool(analytes), sort_keys=True)
+
+
+def anc_extraction_mode() -> str:
+    """The configured ANC extraction mode."""
+    mode = os.getenv("ANC_EXTRACTION_MODE", "reasoning").lower()
+    if mode not in ANC_EXTRACTION_MODES:
+        raise ValueError(f"Unknown ANC_EXTRACTION_MODE: {mode}. Use 'reasoning' or 'structured'.")
+    return mode
+
+
+# Prompt files as last read: path -> ((mtime_ns, size), text). A prompt is read once per
+# process and again only when the file changes, so an edit takes effect without a restart
+# (and, with its new prompt_version, misses the result cache).
+_prompt_files: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+
+
+def _read_prompt(path: Path) -> str:
+    try:
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = _prompt_files.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"Prompt file not found: {path}. "
+            f"Please ensure the prompts/{path.name} file exists."
+        )
+    _prompt_files[path] = (stamp, text)
+    return text
+
+
+@lru_cache(maxsize=32)
+def _fill(template: str, placeholder: str, value: str) -> str:
+    # The template is the cached file text, so repeated calls hit on its identity
+    return template.replace(placeholder, value)
+
+
+def load_anc_prompt() -> str:
+    """Load the ANC extraction prompt with the image placeholder filled in."""
+    return _fill(_read_prompt(ANC_PROMPT_FILE), "{{IMAGE}}", "[The CBC report image is provided below]")
+
+
+def load_anc_structured_prompt() -> str:
+    """Load the short prompt used with the record_anc tool."""
+    return _read_prompt(ANC_STRUCTURED_PROMPT_FILE)
+
+
+@lru_cache(maxsize=32)
+def _analyte_listing(analytes: Tuple[Analyte, ...]) -> str:
+    return "\n".join(
+        f"- {analyte.key}: {analyte.name} (also printed as {', '.join(analyte.aliases)})"
+        for analyte in analytes
+    )
+
+
+def load_panel_prompt(analytes: Sequence[Analyte]) -> str:
+    """Load the record_cbc_panel prompt listing the panel's analytes and the labels they are printed under."""
+    return _fill(_read_prompt(CBC_PANEL_PROMPT_FILE), "{{ANALYTES}}", _analyte_listing(tuple(analytes)))
+
+
+@lru_cache(maxsize=64)
+def prompt_version(prompt: str) -> str:
+    """Short content hash of a prompt, used to invalidate cached results when the prompt changes."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
 
 
 async def extract_text_from_image(image_bytes: bytes) -> str:
@@ -50,12 +180,17 @@ async def extract_text_from_image(image_bytes: bytes) -> str:
     raise ValueError("Image text extraction is not available. OCR dependencies have been removed.")
 
 
+def pdf_max_pages() -> int:
+    return int(os.getenv("PDF_MAX_PAGES", str(DEFAULT_PDF_MAX_PAGES)))
+
+
 async def extract_text_from_pdf(pdf_bytes: bytes) -> str:
     """
-    Extract text from a PDF file.
-    Note: PDF processing functionality has been removed.
+    Extract the text layer of a PDF file (pages separated by form feeds).
+    Scanned PDFs have no text layer and give an empty string.
     """
-    raise ValueError("PDF text extraction is not available. PDF processing dependencies have been removed.")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, extract_pdf_text, pdf_bytes, pdf_max_pages())
 
 
 async def parse_with_genai(text: str) -> Dict[str, Any]:
@@ -65,7 +200,7 @@ async def parse_with_genai(text: str) -> Dict[str, Any]:
     anthropic_client = get_anthropic_client()
     
     if not anthropic_client:
-        print("Warning: Anthropic API key not set. Using mock data.")
+        log("Warning: Anthropic API key not set. Using mock data.")
         return {
             "conditions": ["Mild symptoms"],
             "test_results": [],
@@ -89,7 +224,8 @@ Medical Report Text:
 
 Only return the JSON object, no additional text."""
 
-        message = anthropic_client.messages.create(
+        message = await create_message(
+            anthropic_client,
             model="claude-3-5-sonnet-20241022",
             max_tokens=1000,
             temperature=0.3,
@@ -114,7 +250,7 @@ Only return the JSON object, no additional text."""
         return parsed_data
     
     except Exception as e:
-        print(f"Error parsing with GenAI: {str(e)}")
+        log(f"Error parsing with GenAI: {str(e)}")
         # Return fallback data
         return {
             "conditions": ["Unable to parse"],
@@ -125,64 +261,289 @@ Only return the JSON object, no additional text."""
         }
 
 
-async def extract_anc_from_cbc_image(image_bytes: bytes) -> Dict[str, Any]:
+def parse_anc_answer(response_text: str) -> Tuple[Optional[float], str, Optional[str]]:
+    """
+    Parse the <answer> section of the model's ANC extraction response.
+
+    Returns:
+        (anc_value, status, answer_section); status is one of
+        success, not_found, unclear, parse_error or unknown
+    """
+    anc_value = None
+    status = "unknown"
+    answer_section = None
+    
+    if "<answer>" in response_text and "</answer>" in response_text:
+        answer_section = response_text.split("<answer>")[1].split("</answer>")[0].strip()
+        
+        if "not found" in answer_section.lower():
+            status = "not_found"
+        elif "too unclear" in answer_section.lower() or "unreadable" in answer_section.lower():
+            status = "unclear"
+        else:
+            # Try to extract the numerical value
+            # Look for patterns like "1234 per microliter" or "1.5 per microliter"
+            # Match numbers (including decimals) followed by "per microliter" or similar
+            match = _ANSWER_VALUE.search(answer_section)
+            if match:
+                anc_value_str = match.group(1).replace(',', '')
+                try:
+                    anc_value = float(anc_value_str)
+                    status = "success"
+                except ValueError:
+                    status = "parse_error"
+            else:
+                # Try to extract just a number
+                numbers = _ANSWER_NUMBER.findall(answer_section)
+                if numbers:
+                    try:
+                        anc_value = float(numbers[0].replace(',', ''))
+                        status = "success"
+                    except ValueError:
+                        status = "parse_error"
+    
+    return anc_value, status, answer_section
+
+
+def parse_anc_tool_result(message: Any) -> Dict[str, Any]:
+    """
+    Read the record_anc tool call from a structured-mode response.
+    The model reports the value as printed plus a multiplier; the conversion to cells per
+    microliter happens here so the model never does arithmetic.
+
+    Returns:
+        dict with anc_value, status (success, not_found, unclear or parse_error),
+        confidence, unit, multiplier and the raw tool input
+    """
+    tool_input = next(
+        (block.input for block in message.content
+         if getattr(block, "type", None) == "tool_use" and block.name == ANC_TOOL["name"]),
+        None
+    )
+    result = {"anc_value": None, "status": "parse_error", "confidence": None, "unit": None, "multiplier": None,
+              "raw_response": json.dumps(tool_input) if tool_input is not None else None}
+    if not isinstance(tool_input, dict):
+        return result
+
+    status = tool_input.get("status")
+    value = tool_input.get("value")
+    multiplier = tool_input.get("multiplier", 1)
+    confidence = tool_input.get("confidence")
+    result.update(
+        unit=tool_input.get("unit"),
+        multiplier=multiplier,
+        confidence=float(confidence) if isinstance(confidence, (int, float)) else None,
+    )
+    if status in ("not_found", "unclear"):
+        result["status"] = status
+    elif status == "success":
+        try:
+            anc_value = to_canonical(float(value), float(multiplier))
+        except (TypeError, ValueError):
+            return result
+        if anc_value >= 0:
+            result.update(anc_value=anc_value, status="success")
+    return result
+
+
+def parse_panel_tool_result(message: Any, analytes: Sequence[Analyte]) -> Dict[str, Any]:
+    """
+    Read the record_cbc_panel tool call. Each printed result is split into number and unit
+    and converted to its analyte's canonical unit with the registry's factor for that unit;
+    a unit the registry does not know is a parse_error rather than a guess.
+
+    Returns:
+        dict with the panel ({analyte key: AnalyteResult}) and the raw tool input
+    """
+    tool_input = next(
+        (block.input for block in message.content
+         if getattr(block, "type", None) == "tool_use" and block.name == "record_cbc_panel"),
+        None
+    )
+    if not isinstance(tool_input, dict):
+        tool_input = None
+    confidence = tool_input.get("confidence") if tool_input else None
+    confidence = float(confidence) if isinstance(confidence, (int, float)) else None
+    panel: Dict[str, AnalyteResult] = {}
+    for analyte in analytes:
+        printed = tool_input.get(analyte.key) if tool_input else None
+        printed = printed.strip() if isinstance(printed, str) else ""
+        if printed.lower() in ("not_found", "unclear"):
+            panel[analyte.key] = analyte_result(analyte, printed.lower(), confidence=confidence)
+            continue
+        match = _PRINTED_RESULT.fullmatch(printed)
+        if match is None:
+            panel[analyte.key] = analyte_result(analyte, "parse_error", confidence=confidence)
+            continue
+        unit = match.group("unit") or None
+        panel[analyte.key] = analyte_result(
+            analyte, "success",
+            printed_value=float(match.group("value").replace(",", "")),
+            printed_unit=unit,
+            factor=printed_unit_factor(analyte, unit),
+            confidence=confidence,
+        )
+    return {"panel": panel, "raw_response": json.dumps(tool_input) if tool_input is not None else None}
+
+
+def _stream_listener(mode: str) -> Callable[[Any], None]:
+    """
+    Stream-event handler used when the request has a progress stream: reports how much the
+    model has written (from the first token, then at most every PROGRESS_INTERVAL) and emits the ANC as an "answer" event
+    as soon as the stream holds it, before the message is complete - at the closing </answer>
+    tag, once the panel's anc entry is complete, or when the record_anc call ends (its numbers
+    are only final then).
+    """
+    state = {"answered": False, "chars": 0, "reported_at": float("-inf")}
+    
+    def answer(anc_value: Optional[float], status: str) -> None:
+        state["answered"] = True
+        emit_progress("answer", anc_value=anc_value, status=status, mode=mode)
+    
+    def on_event(event: Any) -> None:
+        if event.type == "text":
+            state["chars"] += len(event.text)
+            if not state["answered"] and "</answer>" in event.snapshot:
+                anc_value, status, _ = parse_anc_answer(event.snapshot)
+                answer(anc_value, status)
+        elif event.type == "input_json":
+            state["chars"] += len(event.partial_json)
+            # Partial tool input only holds strings once they are complete
+            if mode == "panel" and not state["answered"] and "anc" in event.snapshot:
+                message = SimpleNamespace(content=[SimpleNamespace(
+                    type="tool_use", name="record_cbc_panel", input=event.snapshot
+                )])
+                anc = parse_panel_tool_result(message, [ANALYTES["anc"]])["panel"]["anc"]
+                answer(anc["value"], anc["status"])
+        elif event.type == "content_block_stop" and mode == "structured" and not state["answered"]:
+            result = parse_anc_tool_result(SimpleNamespace(content=[event.content_block]))
+            answer(result["anc_value"], result["status"])
+        now = time.perf_counter()
+        if event.type in ("text", "input_json") and now - state["reported_at"] >= PROGRESS_INTERVAL:
+            state["reported_at"] = now
+            emit_progress("model_streaming", output_chars=state["chars"])
+    
+    return on_event
+
+
+async def extract_anc_from_cbc_image(image_bytes: bytes, mode: Optional[str] = None, model: Optional[str] = None,
+                                     max_long_edge: Optional[int] = None,
+                                     max_pixels: Optional[int] = None,
+                                     call_info: Optional[Dict[str, Any]] = None,
+                                     analytes: Optional[Sequence[str]] = None) -> Dict[str, Any]:
     """
     Extract Absolute Neutrophil Count (ANC) from a CBC report image using Claude Haiku 4.5 with vision.
+    PDF bytes are sent unprocessed as a document instead (see extract_anc_from_cbc_pdf).
+    
+    When the panel has more analytes than the ANC, all of them are read in the same single
+    call with the record_cbc_panel tool (mode "panel", whatever `mode` says); the ANC fields
+    of the result are the panel's ANC entry.
+    
+    When the request has a progress stream (POST /upload/stream), the model's answer is read
+    with the streaming Messages API and the ANC is reported the moment it appears.
     
     Args:
-        image_bytes: The image file as bytes
+        image_bytes: The image file as bytes (or a PDF)
+        mode: "reasoning" or "structured"; defaults to ANC_EXTRACTION_MODE
+        model: Model to ask; defaults to ANC_EXTRACTION_MODEL
+        max_long_edge, max_pixels: Downscale further than the pre-processing defaults
+        call_info: Optional dict that receives "cached" (whether the cache answered)
+        analytes: Analyte keys to extract (see analytes.py); defaults to CBC_PANEL
         
     Returns:
-        Dictionary containing the extracted ANC value and metadata
+        Dictionary containing the extracted ANC value and metadata, plus "panel" in panel mode
     """
+    panel = panel_analytes(analytes or cbc_panel())
+    mode = "panel" if len(panel) > 1 else mode or anc_extraction_mode()
+    model = model or ANC_EXTRACTION_MODEL
+    with span("prompt_load"):
+        if mode == "panel":
+            tool = panel_tool(panel)
+            prompt = load_panel_prompt(panel)
+            version = prompt_version(prompt + _panel_tool_json(tuple(panel)))
+        elif mode == "structured":
+            prompt = load_anc_structured_prompt()
+            version = prompt_version(prompt + _ANC_TOOL_JSON)
+        else:
+            prompt = load_anc_prompt()
+            version = prompt_version(prompt)
+    if max_long_edge or max_pixels:
+        version += f"@{max_long_edge}x{max_pixels}"
+    
+    # Identical image + prompt + model always gives the same extraction, so serve repeats from cache
+    result_cache = get_result_cache()
+    with span("cache_lookup"):
+        cache_key = make_cache_key(image_bytes, version, model)
+        cached_result = await result_cache.get(cache_key)
+    if cached_result is not None:
+        log(f"ANC cache hit: {cache_key}")
+        if call_info is not None:
+            call_info["cached"] = True
+        return cached_result
+    
     anthropic_client = get_anthropic_client()
     
     if not anthropic_client:
         raise ValueError("Anthropic API key not set. Please set ANTHROPIC_API_KEY environment variable.")
     
     try:
-        # Convert image bytes to base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        
-        # Determine media type based on image format
-        # Check magic bytes to detect image type
-        if image_bytes.startswith(b'\xff\xd8\xff'):
-            media_type = "image/jpeg"
-        elif image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
-            media_type = "image/png"
-        elif image_bytes.startswith(b'GIF87a') or image_bytes.startswith(b'GIF89a'):
-            media_type = "image/gif"
-        elif len(image_bytes) >= 12 and image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
-            media_type = "image/webp"
+        if image_bytes.startswith(PDF_MAGIC):
+            model_image, media_type, preprocessing_stats = image_bytes, "application/pdf", None
         else:
-            # Default to JPEG if format cannot be determined
-            media_type = "image/jpeg"
-        
-        # Load the prompt from file
-        prompt_file = Path(__file__).parent / "prompts" / "anc_extraction_prompt.txt"
-        try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                prompt = f.read()
-        except FileNotFoundError:
-            raise FileNotFoundError(
-                f"Prompt file not found: {prompt_file}. "
-                "Please ensure the prompts/anc_extraction_prompt.txt file exists."
+            # Downscale/grayscale the photo off the event loop; the model would shrink it anyway
+            with span("preprocess"):
+                model_image, media_type, preprocessing_stats = await preprocess_image_async(
+                    image_bytes, max_long_edge, max_pixels
+                )
+            for step, elapsed_ms in preprocessing_stats["timings_ms"].items():
+                record_stage(f"preprocess_{step}", elapsed_ms / 1000)
+            log(
+                f"Image pre-processing: {preprocessing_stats['bytes_in']} -> {preprocessing_stats['bytes_out']} "
+                f"bytes in {sum(preprocessing_stats['timings_ms'].values()):.1f} ms"
+            )
+            emit_progress(
+                "preprocessed", bytes_in=preprocessing_stats["bytes_in"], bytes_out=preprocessing_stats["bytes_out"]
             )
         
-        # Replace the placeholder with actual instruction
-        prompt = prompt.replace("{{IMAGE}}", "[The CBC report image is provided below]")
+        # Convert image bytes to base64
+        with span("base64_encode"):
+            base64_image = base64.b64encode(model_image).decode('ascii')
+        MODEL_PAYLOAD_BYTES.observe(len(base64_image))
+        
+        if mode == "panel":
+            options = {
+                "max_tokens": PANEL_MAX_TOKENS_PER_ANALYTE * len(panel),
+                "temperature": 0.0,
+                "tools": [tool],
+                "tool_choice": {"type": "tool", "name": tool["name"]},
+            }
+        elif mode == "structured":
+            # One forced tool call: a few dozen output tokens instead of free-form reasoning
+            options = {
+                "max_tokens": int(os.getenv("ANC_STRUCTURED_MAX_TOKENS", str(DEFAULT_STRUCTURED_MAX_TOKENS))),
+                "temperature": 0.0,
+                "tools": [ANC_TOOL],
+                "tool_choice": {"type": "tool", "name": ANC_TOOL["name"]},
+            }
+        else:
+            options = {"max_tokens": REASONING_MAX_TOKENS, "temperature": 0.3}
         
         # Create the message with image and text content
-        message = anthropic_client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=1024,
-            temperature=0.3,
+        emit_progress("model_started", model=model, mode=mode)
+        if progress_enabled():
+            send = partial(stream_message, on_event=_stream_listener(mode))
+        else:
+            send = create_message
+        message = await send(
+            anthropic_client,
+            model=model,
+            **options,
             messages=[
                 {
                     "role": "user",
                     "content": [
                         {
-                            "type": "image",
+                            "type": "document" if media_type == "application/pdf" else "image",
                             "source": {
                                 "type": "base64",
                                 "media_type": media_type,
@@ -198,67 +559,224 @@ async def extract_anc_from_cbc_image(image_bytes: bytes) -> Dict[str, Any]:
             ]
         )
         
-        # Extract the response text
-        response_text = message.content[0].text.strip()
+        if mode == "panel":
+            with span("answer_parse"):
+                parsed = parse_panel_tool_result(message, panel)
+            anc = parsed["panel"]["anc"]
+            anc_result = {
+                "anc_value": anc["value"],
+                "status": anc["status"],
+                "confidence": anc["confidence"],
+                "unit": anc["printed_unit"],
+                "raw_response": parsed["raw_response"],
+                "answer_section": None,
+                "panel": parsed["panel"],
+            }
+        elif mode == "structured":
+            with span("answer_parse"):
+                anc_result = parse_anc_tool_result(message)
+            anc_result["answer_section"] = None
+        else:
+            # Extract the response text
+            response_text = message.content[0].text.strip()
+            
+            with span("answer_parse"):
+                anc_value, status, answer_section = parse_anc_answer(response_text)
+            
+            anc_result = {
+                "anc_value": anc_value,
+                "status": status,
+                "raw_response": response_text,
+                "answer_section": answer_section
+            }
         
-        # Parse the response to extract the answer
-        anc_value = None
-        status = "unknown"
-        answer_section = None
+        if call_info is not None:
+            call_info["cached"] = False
+        anc_result.update({
+            "mode": mode,
+            "usage": {"input_tokens": message.usage.input_tokens, "output_tokens": message.usage.output_tokens},
+            "preprocessing": preprocessing_stats
+        })
         
-        if "<answer>" in response_text and "</answer>" in response_text:
-            answer_section = response_text.split("<answer>")[1].split("</answer>")[0].strip()
-            
-            if "not found" in answer_section.lower():
-                status = "not_found"
-            elif "too unclear" in answer_section.lower() or "unreadable" in answer_section.lower():
-                status = "unclear"
-            else:
-                # Try to extract the numerical value
-                # Look for patterns like "1234 per microliter" or "1.5 per microliter"
-                # Match numbers (including decimals) followed by "per microliter" or similar
-                match = re.search(r'([\d,]+\.?\d*)\s*(?:per\s+)?microliter', answer_section, re.IGNORECASE)
-                if match:
-                    anc_value_str = match.group(1).replace(',', '')
-                    try:
-                        anc_value = float(anc_value_str)
-                        status = "success"
-                    except ValueError:
-                        status = "parse_error"
-                else:
-                    # Try to extract just a number
-                    numbers = re.findall(r'[\d,]+\.?\d*', answer_section)
-                    if numbers:
-                        try:
-                            anc_value = float(numbers[0].replace(',', ''))
-                            status = "success"
-                        except ValueError:
-                            status = "parse_error"
+        if anc_result["status"] in CACHEABLE_STATUSES:
+            await result_cache.set(cache_key, anc_result)
         
-        return {
-            "anc_value": anc_value,
-            "status": status,
-            "raw_response": response_text,
-            "answer_section": answer_section
-        }
+        return anc_result
     
     except Exception as e:
-        print(f"Error extracting ANC from CBC image: {str(e)}")
+        log(f"Error extracting ANC from CBC image: {str(e)}")
+        raise
+
+
+async def extract_anc_from_cbc_pdf(pdf_bytes: bytes, analytes: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Extract ANC (or the CBC_PANEL analytes) from a PDF report. Digital PDFs are read locally
+    from their text layer, page by page up to the first page that mentions neutrophils, with
+    no model call. Scanned PDFs and reports where any printed analyte lacks one unambiguous
+    value with a known unit go to the model as a document.
+    
+    Returns:
+        The same result dict as extract_anc_from_cbc_image; mode is "local_text" when the
+        text layer answered, and local_text_outcome records why the model was needed otherwise
+    """
+    keys = tuple(analytes or cbc_panel())
+    if os.getenv("PDF_LOCAL_PARSER", "1") != "1":
+        return await extract_anc_from_cbc_image(pdf_bytes, analytes=keys)
+    
+    panel = panel_analytes(keys)
+    loop = asyncio.get_running_loop()
+    with span("pdf_text_parse"):
+        found, pages_read = await loop.run_in_executor(None, find_panel_in_pdf, pdf_bytes, panel, pdf_max_pages())
+    match, outcome = found["anc"]
+    if match is not None:
+        # An analyte the report prints but the parser could not read with confidence is the model's job;
+        # one the report does not have at all is simply not found
+        outcome = next((other for _, other in found.values() if other not in ("hit", "no_label")), "hit")
+    PDF_LOCAL_EXTRACTIONS.inc(outcome=outcome)
+    if outcome == "hit":
+        log(f"ANC read from the PDF text layer (page {pages_read}): {match.line}")
+        anc_result = {
+            "anc_value": match.normalized,
+            "status": "success",
+            "raw_response": match.line,
+            "answer_section": None,
+            "unit": match.unit,
+            "multiplier": match.multiplier,
+            "mode": "local_text",
+            "pages_read": pages_read,
+            "usage": {"input_tokens": 0, "output_tokens": 0},
+        }
+        if len(panel) > 1:
+            anc_result["panel"] = {
+                analyte.key: analyte_result(analyte, "success", local.value, local.unit, local.multiplier)
+                if local is not None else analyte_result(analyte, "not_found")
+                for analyte, (local, _) in zip(panel, found.values())
+            }
+        return anc_result
+    
+    log(f"No confident ANC in the PDF text layer ({outcome}, {pages_read} page(s) read); asking the model")
+    anc_result = await extract_anc_from_cbc_image(pdf_bytes, analytes=keys)
+    return dict(anc_result, local_text_outcome=outcome)
+
+
+def _add_panel_findings(parsed_data: Dict[str, Any], panel: Dict[str, AnalyteResult]) -> None:
+    """
+    Add the panel's other analytes to the parsed report: a test result line each, a condition
+    for every value outside its reference range, and critical severity when one is below its
+    critical limit (e.g. hemoglobin under 7 g/dL) whatever the ANC says.
+    """
+    parsed_data["panel"] = panel
+    critical: List[str] = []
+    for key, result in panel.items():
+        if key == "anc" or result["status"] != "success":
+            continue
+        analyte = ANALYTES[key]
+        parsed_data["test_results"].append(f"{analyte.name}: {result['value']} {result['unit']} ({result['flag']})")
+        finding = condition(analyte, result["flag"])
+        if finding is not None:
+            parsed_data["conditions"].append(finding)
+        if result["flag"] == "critical_low":
+            critical.append(f"{finding} ({analyte.name}: {result['value']} {result['unit']})")
+    if critical:
+        parsed_data["severity"] = "critical"
+        parsed_data["summary"] = (
+            f"{parsed_data['summary']} Critical: {', '.join(critical)}. Immediate medical attention required."
+        ).strip()
+
+
+async def extract_anc_from_cbc_photo(image_bytes: bytes) -> Dict[str, Any]:
+    """
+    Extract ANC from a report photo with the model (through the cascade when enabled).
+    
+    With NEAR_DUP_MODE=cross_check the photo's perceptual hash is looked up among earlier
+    photos; when a near-duplicate (a retake, a new screenshot) is found, the result records
+    its distance and whether the two reads agree, and disagreements are counted and logged.
+    Only fresh model reads with a high enough confidence are added to the index.
+    """
+    config = near_duplicate_config()
+    
+    async def hash_photo() -> Optional[int]:
+        with span("perceptual_hash"):
+            return await photo_hash_async(image_bytes, config.hash_function)
+    
+    # The hash is computed while the model reads the photo, so the check adds no latency
+    hashing = asyncio.ensure_future(hash_photo()) if config.mode == "cross_check" else None
+    call_info: Dict[str, Any] = {}
+    try:
+        if cascade_enabled():
+            anc_result = await run_cascade(
+                image_bytes, extract_anc_from_cbc_image, cascade_config(ANC_EXTRACTION_MODEL), ANC_SEVERITY_CUTOFFS
+            )
+            call_info["cached"] = anc_result["cascade"]["tiers"][-1]["cached"]
+        else:
+            anc_result = await extract_anc_from_cbc_image(image_bytes, call_info=call_info)
+    except BaseException:
+        if hashing is not None:
+            hashing.cancel()
         raise
+    hashed = await hashing if hashing is not None else None
+    if hashed is None:
+        return anc_result
+    
+    index = get_near_duplicate_index()
+    near = index.search(hashed)
+    if near is None:
+        NEAR_DUPLICATE_LOOKUPS.inc(outcome="miss")
+    else:
+        distance, _, prior = near
+        agreed = agrees(anc_result, prior)
+        NEAR_DUPLICATE_LOOKUPS.inc(outcome="agree" if agreed else "disagree")
+        if not agreed:
+            log(f"Near-duplicate photo (distance {distance}) read differently: "
+                f"ANC {prior.get('anc_value')} before, {anc_result.get('anc_value')} now")
+        anc_result = dict(anc_result, near_duplicate={
+            "distance": distance, "agrees": agreed, "prior_anc_value": prior.get("anc_value"),
+        })
+    # A result served from the cache was indexed when its photo was first read
+    if not call_info.get("cached") and worth_indexing(anc_result, config.min_confidence, config.index_unscored):
+        index.add(hashed, prior_record(anc_result))
+    return anc_result
+
+
+_report_flights = SingleFlight()
 
 
 async def process_medical_report(file_contents: bytes, content_type: str, file_name: str) -> Dict[str, Any]:
     """
     Main function to process a medical report file.
     Returns structured data extracted from the report.
+    
+    Identical uploads that arrive while the first one is still being processed (app retries,
+    double taps) wait for that one extraction instead of starting their own model call.
+    A streamed upload (POST /upload/stream) never joins one: the progress events go to the
+    request that started the extraction, so it runs its own. Others may still join it.
     """
+    flight_key = f"{content_type}:{hashlib.sha256(file_contents).hexdigest()}"
+    if progress_enabled() and flight_key in _report_flights:
+        log(f"Streamed upload not joining in-flight processing of identical upload: {file_name}")
+        return await _process_medical_report(file_contents, content_type, file_name)
+    if flight_key in _report_flights:
+        log(f"Joining in-flight processing of identical upload: {file_name}")
+        COALESCED_UPLOADS.inc()
+    return await _report_flights.do(
+        flight_key,
+        lambda: _process_medical_report(file_contents, content_type, file_name)
+    )
+
+
+async def _process_medical_report(file_contents: bytes, content_type: str, file_name: str) -> Dict[str, Any]:
+    EXTRACTIONS_IN_FLIGHT.inc()
     try:
         # Process based on file type
-        if content_type.startswith("image/"):
-            print(f"Processing CBC report image: {file_name}")
+        if content_type.startswith("image/") or content_type == "application/pdf":
+            log(f"Processing CBC report: {file_name}")
             
-            # Extract ANC from CBC image using vision model
-            anc_result = await extract_anc_from_cbc_image(file_contents)
+            # Extract ANC locally from a PDF's text layer, or from the image using the vision model
+            if content_type == "application/pdf":
+                anc_result = await extract_anc_from_cbc_pdf(file_contents)
+            else:
+                anc_result = await extract_anc_from_cbc_photo(file_contents)
+            ANC_EXTRACTIONS.inc(status=anc_result["status"])
             
             # Format the results for the recommendation engine
             parsed_data = {
@@ -307,27 +825,24 @@ async def process_medical_report(file_contents: bytes, content_type: str, file_n
                 parsed_data["summary"] = f"ANC extraction status: {anc_result['status']}"
                 parsed_data["test_results"] = [f"ANC extraction: {anc_result['status']}"]
             
+            if anc_result.get("panel"):
+                _add_panel_findings(parsed_data, anc_result["panel"])
+            
             # Include raw response for debugging
             parsed_data["anc_extraction"] = anc_result
-            print(f"ANC extraction result: {anc_result}")
+            log(f"ANC extraction result: {anc_result}")
+            emit_progress(
+                "parsed", anc_value=anc_result.get("anc_value"), status=anc_result["status"],
+                severity=parsed_data["severity"], mode=anc_result.get("mode")
+            )
             return parsed_data
             
-        elif content_type == "application/pdf":
-            print(f"Extracting text from PDF: {file_name}")
-            raw_text = await extract_text_from_pdf(file_contents)
-            
-            print(f"Extracted text length: {len(raw_text)} characters")
-            
-            # Parse text with GenAI
-            print("Parsing with GenAI...")
-            parsed_data = await parse_with_genai(raw_text)
-            parsed_data["raw_text"] = raw_text[:500]  # Include first 500 chars for debugging
-            
-            return parsed_data
         else:
             raise ValueError(f"Unsupported content type: {content_type}")
     
     except Exception as e:
-        print(f"Error in process_medical_report: {str(e)}")
+        log(f"Error in process_medical_report: {str(e)}")
         raise
+    finally:
+        EXTRACTIONS_IN_FLIGHT.dec()
 
@@ -0,0 +1,164 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Content-addressed cache of ANC extraction results.
+# ANC_CACHE_MAX_ENTRIES        - size of the in-memory LRU (0 disables it)
+# ANC_CACHE_TTL_SECONDS        - how long a cached extraction stays valid
+# ANC_CACHE_DB_PATH            - optional SQLite file shared by all workers and kept across restarts
+# ANC_CACHE_MAX_DISK_ENTRIES   - row limit for the SQLite tier
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_DISK_ENTRIES = 100_000
+
+# Only results that describe the image are cached; parse errors may be model noise and are retried.
+CACHEABLE_STATUSES = {"success", "not_found", "unclear"}
+
+
+def make_cache_key(image_bytes: bytes, prompt_version: str, model: str) -> str:
+    """Build a cache key from the image content, the prompt version and the model name."""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{model}:{prompt_version}:{digest}"
+
+
+class ResultCache:
+    """
+    Two-tier cache: a bounded LRU in memory in front of an optional SQLite table.
+    Both tiers honour the same TTL; the SQLite tier is trimmed to `max_disk_entries` rows.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._clock = clock
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if db_path:
+            self._init_db()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for `key`, or None on a miss."""
+        now = self._clock()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return copy.deepcopy(value)
+            del self._memory[key]
+
+        if self.db_path:
+            row = await asyncio.to_thread(self._db_get, key, now)
+            if row is not None:
+                expires_at, value = row
+                self._remember(key, value, expires_at)
+                self._counters["disk_hits"] += 1
+                return copy.deepcopy(value)
+
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store `value` in every enabled tier."""
+        expires_at = self._clock() + self.ttl_seconds
+        value = copy.deepcopy(value)
+        self._remember(key, value, expires_at)
+        if self.db_path:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+        self._counters["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current tier sizes."""
+        hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            **self._counters,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": bool(self.db_path),
+        }
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS anc_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS anc_cache_created_at ON anc_cache (created_at)")
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM anc_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM anc_cache WHERE key = ?", (key,))
+                return None
+            return row[1], json.loads(row[0])
+
+    def _db_set(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        now = self._clock()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO anc_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, expires_at),
+            )
+            conn.execute("DELETE FROM anc_cache WHERE expires_at <= ?", (now,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM anc_cache").fetchone()
+            overflow = count - self.max_disk_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM anc_cache WHERE key IN "
+                    "(SELECT key FROM anc_cache ORDER BY created_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._counters["evictions"] += overflow
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Get or create the process-wide result cache configured from the environment."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_entries=int(os.getenv("ANC_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+            ttl_seconds=float(os.getenv("ANC_CACHE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+            db_path=os.getenv("ANC_CACHE_DB_PATH") or None,
+            max_disk_entries=int(os.getenv("ANC_CACHE_MAX_DISK_ENTRIES", str(DEFAULT_MAX_DISK_ENTRIES))),
+        )
+    return _result_cache
@@ -0,0 +1,62 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as its own task; everyone who arrives
+    while it is running awaits the same task and receives a deep copy of its result.
+    A caller that is cancelled only stops waiting: the work keeps running for the
+    others, and is cancelled only when nobody is left waiting for it. Exceptions are
+    delivered to every waiter and nothing is remembered once the call finishes, so
+    the next request for the key starts fresh.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                # Last interested caller left: stop the work and let the next request start over
+                call.task.cancel()
+                self._forget(key, call)
+            raise
+        finally:
+            call.waiters -= 1
+        return copy.deepcopy(result)
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
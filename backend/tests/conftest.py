@@ -0,0 +1,91 @@
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Tests import the backend modules the same way uvicorn does (from the backend directory)
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+from fake_anthropic import FakeAnthropicServer  # noqa: E402
+import anthropic_client  # noqa: E402
+import result_cache  # noqa: E402
+import near_duplicates  # noqa: E402
+import anc_history  # noqa: E402
+import profiling  # noqa: E402
+import main  # noqa: E402
+
+
+def _reset_process_state():
+    """Drop the per-process singletons so each test starts cold."""
+    anthropic_client._anthropic_client = None
+    anthropic_client._anthropic_semaphore = None
+    anthropic_client._hedger = None
+    anthropic_client._rate_limiter = None
+    anthropic_client._breaker = None
+    result_cache._result_cache = None
+    near_duplicates._index = None
+    anc_history._history = None
+    profiling._profiler = None
+    profiling._profiler_configured = False
+    main._job_manager = None
+
+
+@pytest.fixture(autouse=True)
+def fresh_process_state():
+    _reset_process_state()
+    yield
+    _reset_process_state()
+
+
+@pytest.fixture
+def fake_anthropic(monkeypatch):
+    """Start a local stand-in for the Anthropic Messages API and point the client at it."""
+    server = FakeAnthropicServer()
+    server.start()
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """`jpeg_bytes(i)`: a tiny JPEG-looking upload, distinct per `i` so neither the result cache
+    nor single-flight collapses them."""
+    def make(i: int = 0) -> bytes:
+        return b"\xff\xd8\xff\xe0" + i.to_bytes(4, "big") + b"\x00" * 64
+    return make
+
+
+@pytest.fixture
+def app_client():
+    """`async with app_client() as client:` an HTTP client for the app; closes the shared model client afterwards."""
+    @asynccontextmanager
+    async def connect():
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                yield client
+        finally:
+            await anthropic_client.close_anthropic_client()
+    return connect
+
+
+@pytest.fixture
+def run_closing():
+    """`run_closing(coroutine)`: asyncio.run that also closes the shared model client before the loop ends."""
+    def run(coroutine):
+        async def closing():
+            try:
+                return await coroutine
+            finally:
+                await anthropic_client.close_anthropic_client()
+        return asyncio.run(closing())
+    return run
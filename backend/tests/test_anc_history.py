@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from anc_history import DAY, AncHistory, anc_trend, get_anc_history
+from recommendation_engine import get_recommendation
+
+
+def test_trend_slope_time_below_500_and_projection():
+    falling = anc_trend([(0, 1800.0), (DAY, 1500.0), (2 * DAY, 1200.0)], window_days=14)
+    assert falling["decline_per_day"] == 300.0
+    assert falling["days_to_500"] == pytest.approx(2.3, abs=0.05)
+    assert falling["days_below_500"] == 0.0
+
+    # Below 500 from half-way through the first day to half-way through the third
+    dip = anc_trend([(0, 600.0), (DAY, 400.0), (2 * DAY, 400.0), (3 * DAY, 600.0)], window_days=14)
+    assert dip["days_below_500"] == 2.0
+    assert (dip["nadir_anc"], dip["nadir_at"]) == (400.0, 2 * DAY)
+    assert dip["days_to_500"] is None
+
+    single = anc_trend([(0, 900.0)], window_days=14)
+    assert (single["decline_per_day"], single["points"]) == (None, 1)
+
+
+def test_writes_are_batched_and_visible_before_they_are_committed(tmp_path, monkeypatch):
+    history = AncHistory(str(tmp_path / "history.sqlite3"), batch_size=100, flush_interval=60)
+    transactions = []
+    insert = history._db_insert
+    monkeypatch.setattr(history, "_db_insert", lambda points: transactions.append(len(points)) or insert(points))
+
+    async def scenario():
+        for day in range(5):
+            history.record("p1", day * DAY, 2000.0 - 300 * day)
+        history.record("p2", 0, 1000.0)
+        trend = await history.trend("p1", 5 * DAY, 500.0)
+        assert transactions == []
+        queried = await history.query("p1")
+        await history.close()
+        return trend, queried
+
+    trend, queried = asyncio.run(scenario())
+
+    assert trend["points"] == 6 and trend["decline_per_day"] == 300.0
+    assert trend["days_to_500"] == 0.0
+    assert transactions == [6]
+    assert [p["anc_value"] for p in queried["points"]] == [2000.0, 1700.0, 1400.0, 1100.0, 800.0]
+    assert queried["downsampled"] is False
+
+
+def test_a_rejected_point_does_not_lose_the_rest_of_its_batch(tmp_path):
+    history = AncHistory(str(tmp_path / "history.sqlite3"), batch_size=100, flush_interval=60)
+
+    async def scenario():
+        history.record("p1", 0, 2000.0)
+        # SQLite stores NaN as NULL, which the NOT NULL key refuses
+        history.record("p2", float("nan"), 1000.0)
+        history.record("p1", DAY, 1500.0)
+        await history.close()
+        return await history.query("p1"), await history.query("p2")
+
+    p1, p2 = asyncio.run(scenario())
+
+    assert [p["anc_value"] for p in p1["points"]] == [2000.0, 1500.0]
+    assert p2["count"] == 0
+    assert history.pending() == 0
+
+
+def test_long_series_are_downsampled_without_losing_the_nadir(tmp_path):
+    history = AncHistory(str(tmp_path / "history.sqlite3"))
+    history._db_insert([("p1", hour * 3600.0, 3000.0 - (hour % 100) * 10) for hour in range(5000)])
+    history._db_insert([("p1", 2500 * 3600.0 + 1, 120.0)])
+
+    result = asyncio.run(history.query("p1", start=0, end=4999 * 3600.0, max_points=50))
+
+    assert result["downsampled"] is True and result["count"] == 5001
+    assert len(result["points"]) == 50
+    assert sum(point["count"] for point in result["points"]) == 5001
+    assert min(point["min"] for point in result["points"]) == 120.0
+    assert result["points"] == sorted(result["points"], key=lambda point: point["observed_at"])
+
+
+def test_falling_trend_turns_home_care_into_a_doctor_visit():
+    parsed = {"severity": "low", "anc_extraction": {"status": "success", "anc_value": 1100.0}}
+    assert get_recommendation(parsed)["rule"] == "default"
+
+    parsed["anc_trend"] = anc_trend([(0, 2000.0), (DAY, 1700.0), (2 * DAY, 1100.0)], window_days=14)
+    recommendation = get_recommendation(parsed)
+
+    assert (recommendation["recommendation"], recommendation["rule"]) == ("DOCTOR_VISIT", "anc_trend")
+    assert recommendation["anc_trend"]["days_to_500"] <= 3
+
+
+def test_uploads_build_the_history_endpoint(fake_anthropic, monkeypatch, tmp_path, app_client, jpeg_bytes):
+    monkeypatch.setenv("ANC_HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setenv("ANC_HISTORY_TOKEN", "secret")
+    headers = {"X-History-Token": "secret"}
+
+    async def scenario():
+        async with app_client() as client:
+            responses = []
+            for i, (observed_at, answer) in enumerate([(0, "2900"), (DAY, "2400"), (2 * DAY, "1910")]):
+                fake_anthropic.answer_text = f"<answer>\n{answer} per microliter\n</answer>"
+                responses.append(await client.post(
+                    "/upload", files={"file": ("cbc.jpg", jpeg_bytes(i), "image/jpeg")},
+                    data={"patient_id": "patient-7", "observed_at": str(observed_at)}, headers=headers,
+                ))
+            series = await client.get("/patients/patient-7/anc", params={"start": DAY / 2}, headers=headers)
+            other = await client.get("/patients/someone-else/anc", headers=headers)
+            return responses, series, other
+
+    responses, series, other = asyncio.run(scenario())
+
+    latest = responses[-1].json()
+    assert responses[0].json()["anc_trend"]["points"] == 1
+    assert latest["anc_trend"]["decline_per_day"] == 495.0
+    assert latest["anc_trend"]["days_to_500"] == pytest.approx(2.8, abs=0.05)
+    assert latest["rule"] == "anc_trend"
+    assert series.status_code == 200
+    assert [p["anc_value"] for p in series.json()["points"]] == [2400.0, 1910.0]
+    assert other.json()["count"] == 0
+
+
+@pytest.mark.parametrize("path", ["/upload", "/upload/stream"])
+@pytest.mark.parametrize("headers", [{}, {"X-History-Token": "guess"}])
+def test_uploads_without_the_token_neither_read_nor_write_history(fake_anthropic, monkeypatch, tmp_path, app_client,
+                                                                  jpeg_bytes, path, headers):
+    monkeypatch.setenv("ANC_HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setenv("ANC_HISTORY_TOKEN", "secret")
+    history = get_anc_history()
+
+    async def scenario():
+        history.record("patient-7", 0, 2900.0)
+        async with app_client() as client:
+            response = await client.post(path, files={"file": ("cbc.jpg", jpeg_bytes(), "image/jpeg")},
+                                         data={"patient_id": "patient-7", "observed_at": str(DAY)}, headers=headers)
+            return response, await history.query("patient-7")
+
+    response, stored = asyncio.run(scenario())
+
+    assert response.status_code == 403
+    assert "anc_trend" not in response.text and "nadir" not in response.text
+    assert fake_anthropic.request_count == 0
+    assert [p["anc_value"] for p in stored["points"]] == [2900.0]
+
+
+@pytest.mark.parametrize("observed_at", ["nan", "inf", "-inf"])
+def test_non_finite_observed_at_is_rejected_before_processing(fake_anthropic, monkeypatch, tmp_path, app_client,
+                                                              jpeg_bytes, observed_at):
+    monkeypatch.setenv("ANC_HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+
+    async def scenario():
+        async with app_client() as client:
+            return [await client.post(path, files={"file": ("cbc.jpg", jpeg_bytes(), "image/jpeg")},
+                                      data={"patient_id": "patient-7", "observed_at": observed_at})
+                    for path in ("/upload", "/upload/stream")]
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [422, 422]
+    assert fake_anthropic.request_count == 0
+    assert get_anc_history().pending() == 0
+
+
+def test_history_endpoint_is_off_by_default(app_client):
+    async def scenario():
+        async with app_client() as client:
+            return await client.get("/patients/patient-7/anc")
+
+    assert asyncio.run(scenario()).status_code == 404
+
+
+@pytest.mark.parametrize("token, headers", [
+    (None, {}),
+    (None, {"X-History-Token": ""}),
+    ("secret", {}),
+    ("secret", {"X-History-Token": "guess"}),
+])
+def test_history_endpoint_rejects_a_missing_or_wrong_token(monkeypatch, tmp_path, app_client, token, headers):
+    monkeypatch.setenv("ANC_HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+    if token:
+        monkeypatch.setenv("ANC_HISTORY_TOKEN", token)
+
+    async def scenario():
+        async with app_client() as client:
+            return await client.get("/patients/patient-7/anc", headers=headers)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 404
+    assert "anc_value" not in response.text
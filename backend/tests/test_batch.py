@@ -0,0 +1,89 @@
+import asyncio
+import io
+import json
+import time
+import zipfile
+
+from batch import BatchItem, run_batch
+
+
+async def _post_batch(app_client, files):
+    async with app_client() as client:
+        response = await client.post("/upload/batch", files=files)
+        return response, [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_one_line_per_file_and_a_summary(fake_anthropic, app_client, jpeg_bytes):
+    fake_anthropic.latency = 0.2
+    files = [("files", (f"cbc-{i}.jpg", jpeg_bytes(i), "image/jpeg")) for i in range(10)]
+    files.append(("files", ("notes.txt", b"hello", "text/plain")))
+
+    started = time.perf_counter()
+    response, lines = asyncio.run(_post_batch(app_client, files))
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records, summary = lines[:-1], lines[-1]["summary"]
+    assert len(records) == 11
+    assert sorted(r["index"] for r in records) == list(range(11))
+    failed = [r for r in records if r["status"] == "failed"]
+    assert [r["file_name"] for r in failed] == ["notes.txt"]
+    assert all(r["result"]["anc_value"] == 2030.0 for r in records if r["status"] == "succeeded")
+    assert summary["total"] == 11 and summary["succeeded"] == 10 and summary["failed"] == 1
+    # Ten 0.2 s model calls run concurrently, not one after another
+    assert elapsed < 1.5
+
+
+def test_zip_archive_is_expanded(fake_anthropic, app_client, jpeg_bytes):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("reports/a.jpg", jpeg_bytes(1))
+        archive.writestr("reports/b.jpg", jpeg_bytes(2))
+        archive.writestr("reports/readme.txt", b"not an image")
+        archive.writestr("__MACOSX/reports/._a.jpg", b"resource fork")
+    files = [
+        ("files", ("reports.zip", buffer.getvalue(), "application/zip")),
+        ("files", ("broken.zip", b"PK not really", "application/zip")),
+    ]
+
+    response, lines = asyncio.run(_post_batch(app_client, files))
+
+    statuses = {r["file_name"]: r["status"] for r in lines[:-1]}
+    assert statuses == {
+        "reports/a.jpg": "succeeded",
+        "reports/b.jpg": "succeeded",
+        "reports/readme.txt": "failed",
+        "broken.zip": "failed",
+    }
+
+
+def test_concurrency_is_bounded():
+    state = {"running": 0, "peak": 0}
+
+    async def handler(contents, content_type, file_name):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return {"ok": True}
+
+    async def load():
+        return b"x", "image/jpeg"
+
+    async def scenario():
+        items = [BatchItem(f"{i}.jpg", load) for i in range(20)]
+        return [record async for record in run_batch(items, handler, concurrency=3)]
+
+    records = asyncio.run(scenario())
+    assert len(records) == 20
+    assert state["peak"] == 3
+
+
+def test_too_many_files_is_rejected(monkeypatch, app_client, jpeg_bytes):
+    monkeypatch.setenv("BATCH_MAX_FILES", "2")
+    files = [("files", (f"cbc-{i}.jpg", jpeg_bytes(i), "image/jpeg")) for i in range(3)]
+
+    response, _ = asyncio.run(_post_batch(app_client, files))
+
+    assert response.status_code == 413
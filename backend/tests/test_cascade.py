@@ -0,0 +1,68 @@
+import io
+
+import pytest
+from PIL import Image
+
+from cascade import CascadeConfig, escalation_reason
+from report_processor import ANC_SEVERITY_CUTOFFS, process_medical_report
+
+CONFIG = CascadeConfig(
+    fast_model="claude-haiku-4-5-20251001", fast_long_edge=1024, fast_max_pixels=600_000,
+    escalation_model="claude-sonnet-4-5-20250929", escalation_mode="reasoning",
+    min_confidence=0.8, cutoff_margin=0.1,
+)
+
+
+def _photo() -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise((2400, 1800), 30).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("result, reason", [
+    ({"status": "success", "anc_value": 2030.0, "confidence": 0.95}, None),
+    ({"status": "success", "anc_value": 300.0, "confidence": 0.95}, None),
+    ({"status": "not_found", "anc_value": None, "confidence": 0.9}, None),
+    ({"status": "success", "anc_value": 980.0, "confidence": 0.95}, "near_cutoff"),
+    ({"status": "success", "anc_value": 1400.0, "confidence": 0.95}, "near_cutoff"),
+    ({"status": "success", "anc_value": 2030.0, "confidence": 0.5}, "low_confidence"),
+    ({"status": "unclear", "anc_value": None, "confidence": 0.3}, "unclear"),
+    ({"status": "parse_error", "anc_value": None, "confidence": None}, "parse_error"),
+])
+def test_escalation_reason(result, reason):
+    assert escalation_reason(result, CONFIG, ANC_SEVERITY_CUTOFFS) == reason
+
+
+def test_confident_first_pass_answers_alone(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("ANC_CASCADE", "1")
+
+    parsed = run_closing(process_medical_report(_photo(), "image/jpeg", "cbc.jpg"))
+
+    cascade = parsed["anc_extraction"]["cascade"]
+    assert cascade["tier"] == 1
+    assert cascade["escalation_reason"] is None
+    assert cascade["cost_usd"] > 0
+    assert fake_anthropic.request_count == 1
+    assert fake_anthropic.last_request["tool_choice"]["name"] == "record_anc"
+    width, height = parsed["anc_extraction"]["preprocessing"]["output_size"]
+    assert max(width, height) <= 1024 and width * height <= 600_000
+    assert parsed["severity"] == "low"
+
+
+def test_value_near_a_cutoff_escalates(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("ANC_CASCADE", "1")
+    monkeypatch.setenv("ANC_CASCADE_ESCALATION_MODEL", "claude-sonnet-4-5-20250929")
+    fake_anthropic.tool_input = {"value": 0.98, "unit": "K/uL", "multiplier": 1000, "status": "success",
+                                 "confidence": 0.9}
+
+    parsed = run_closing(process_medical_report(_photo(), "image/jpeg", "cbc.jpg"))
+
+    cascade = parsed["anc_extraction"]["cascade"]
+    assert cascade["tier"] == 2
+    assert cascade["escalation_reason"] == "near_cutoff"
+    # 980 and 2030 fall in different severity bands; the full-resolution read decides
+    assert cascade["bands_agree"] is False
+    assert [tier["model"] for tier in cascade["tiers"]] == ["claude-haiku-4-5-20251001", "claude-sonnet-4-5-20250929"]
+    assert fake_anthropic.last_request["model"] == "claude-sonnet-4-5-20250929"
+    assert parsed["anc_extraction"]["anc_value"] == 2030.0
+    assert parsed["severity"] == "low"
@@ -0,0 +1,105 @@
+import pytest
+
+from analytes import ANALYTES, cbc_panel, printed_unit_factor
+from anc_text import find_analyte_in_text
+from recommendation_engine import get_recommendation
+from report_processor import extract_anc_from_cbc_image, process_medical_report
+from sample_pdfs import CBC_PAGE, COVER_PAGE, lab_report_pdf
+
+JPEG = b"\xff\xd8\xff\xe0panel" + b"\x00" * 64
+
+
+def test_panel_setting(monkeypatch):
+    assert cbc_panel() == ("anc",)
+    monkeypatch.setenv("CBC_PANEL", "platelets, hemoglobin")
+    assert cbc_panel() == ("anc", "platelets", "hemoglobin")
+    monkeypatch.setenv("CBC_PANEL", "all")
+    assert cbc_panel() == tuple(ANALYTES)
+    monkeypatch.setenv("CBC_PANEL", "anc,esr")
+    with pytest.raises(ValueError):
+        cbc_panel()
+
+
+@pytest.mark.parametrize("key, unit, factor", [
+    ("platelets", "lakhs/cumm", 100_000),
+    ("platelets", "x10^9/L", 1000),
+    ("wbc", "cells/µL", 1),
+    ("hemoglobin", "g/L", 0.1),
+    ("hemoglobin", "gm%", 1),
+    ("hemoglobin", "K/uL", None),
+])
+def test_registry_units(key, unit, factor):
+    assert printed_unit_factor(ANALYTES[key], unit) == factor
+
+
+def test_local_parser_reads_other_analytes_and_skips_lookalike_tests():
+    text = "\n".join([
+        "Hemoglobin 6.8 L 12.0 - 16.0 g/dL",
+        "Mean Corpuscular Hemoglobin Concentration 33.1 g/dL",
+        "Platelet Count 0.4 lakhs/cumm",
+        "Mean Platelet Volume 10.2 fL",
+    ])
+
+    hemoglobin, outcome = find_analyte_in_text(text, ANALYTES["hemoglobin"])
+    assert (hemoglobin.normalized, outcome) == (6.8, "hit")
+    platelets, outcome = find_analyte_in_text(text, ANALYTES["platelets"])
+    assert (platelets.normalized, outcome) == (40_000, "hit")
+
+
+def test_panel_is_read_in_one_call_and_normalized(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("CBC_PANEL", "all")
+    fake_anthropic.panel_input.update(hemoglobin="129 g/L", wbc="4.8 gpt/l", platelets="2,31,000 /cumm")
+
+    result = run_closing(extract_anc_from_cbc_image(JPEG))
+
+    assert fake_anthropic.request_count == 1
+    assert fake_anthropic.last_request["tool_choice"]["name"] == "record_cbc_panel"
+    assert (result["mode"], result["anc_value"], result["status"]) == ("panel", 2030.0, "success")
+    panel = result["panel"]
+    assert {key: panel[key]["value"] for key in panel} == {
+        "anc": 2030.0, "wbc": None, "hemoglobin": 12.9, "platelets": None
+    }
+    assert (panel["hemoglobin"]["unit"], panel["hemoglobin"]["flag"]) == ("g/dL", "normal")
+    assert panel["anc"]["confidence"] == 0.95
+    # Units outside the registry and Indian digit grouping are never guessed at
+    assert panel["wbc"]["status"] == "parse_error"
+    assert panel["platelets"]["status"] == "parse_error"
+
+
+def test_critical_analyte_drives_the_recommendation(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("CBC_PANEL", "hemoglobin,platelets")
+    fake_anthropic.panel_input["platelets"] = "12 x10^3/uL"
+
+    parsed = run_closing(process_medical_report(JPEG, "image/jpeg", "cbc.jpg"))
+    recommendation = get_recommendation(parsed)
+
+    assert parsed["severity"] == "critical"
+    assert "Severe thrombocytopenia" in parsed["conditions"]
+    assert "Platelet count: 12000.0 cells/µL (critical_low)" in parsed["test_results"]
+    assert recommendation["recommendation"] == "ADMISSION"
+    assert recommendation["anc_value"] == 2030.0
+    assert recommendation["abnormal_analytes"] == {"platelets": "critical_low"}
+
+
+def test_text_pdf_panel_needs_no_model_call(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("CBC_PANEL", "all")
+
+    parsed = run_closing(process_medical_report(lab_report_pdf(), "application/pdf", "cbc.pdf"))
+
+    assert fake_anthropic.request_count == 0
+    assert {key: result["value"] for key, result in parsed["panel"].items()} == {
+        "anc": 2030.0, "wbc": 4800.0, "hemoglobin": 12.9, "platelets": 231_000.0
+    }
+
+
+def test_pdf_with_an_unreadable_analyte_goes_to_the_model(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("CBC_PANEL", "all")
+    page = [row for row in CBC_PAGE if row[0] != "Platelets"] + [("Platelets", "231", "150 - 400", "")]
+
+    parsed = run_closing(process_medical_report(
+        lab_report_pdf([COVER_PAGE, page]), "application/pdf", "cbc.pdf"
+    ))
+
+    assert fake_anthropic.request_count == 1
+    assert parsed["anc_extraction"]["local_text_outcome"] == "no_value"
+    assert parsed["panel"]["platelets"]["value"] == 231_000.0
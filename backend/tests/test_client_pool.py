@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import httpx
+
+import anthropic_client
+import main
+from hedging import HedgeBudget, Hedger
+from metrics import MODEL_HEDGES
+from rate_limit import AdaptiveRateLimiter
+
+
+async def _post(client: httpx.AsyncClient, photo: bytes) -> httpx.Response:
+    return await client.post("/upload", files={"file": ("cbc.jpg", photo, "image/jpeg")})
+
+
+def test_startup_warms_pooled_connections_before_ready(fake_anthropic, monkeypatch, jpeg_bytes):
+    monkeypatch.setenv("ANTHROPIC_WARMUP_CONNECTIONS", "4")
+    fake_anthropic.latency = 0.2
+
+    async def scenario():
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for _ in range(100):
+                    readiness = await client.get("/ready")
+                    if readiness.status_code == 200:
+                        break
+                    await asyncio.sleep(0.02)
+                warmed = fake_anthropic.connections_opened
+                uploads = await asyncio.gather(*[_post(client, jpeg_bytes(i)) for i in range(4)])
+                return readiness, warmed, uploads
+
+    readiness, warmed, uploads = asyncio.run(scenario())
+
+    assert readiness.status_code == 200
+    assert readiness.json()["model_client"]["status"] == "warm"
+    assert fake_anthropic.models_requests == 4
+    assert warmed == 4
+    assert [r.status_code for r in uploads] == [200] * 4
+    # The uploads reused the warmed keep-alive connections instead of opening new ones
+    assert fake_anthropic.connections_opened == 4
+
+
+def test_client_has_explicit_timeouts(fake_anthropic, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_CONNECT_TIMEOUT", "2.5")
+    client = anthropic_client.get_anthropic_client()
+    try:
+        assert client._client.timeout.connect == 2.5
+        assert client._client.timeout.read == anthropic_client.DEFAULT_READ_TIMEOUT
+    finally:
+        asyncio.run(anthropic_client.close_anthropic_client())
+
+
+def test_ready_is_unavailable_before_startup(app_client):
+    async def scenario():
+        async with app_client() as client:
+            return await client.get("/ready"), await client.get("/")
+
+    ready, live = asyncio.run(scenario())
+    assert ready.status_code == 503
+    assert live.status_code == 200
+
+
+def test_hedged_request_beats_a_straggler(fake_anthropic, monkeypatch, app_client, jpeg_bytes):
+    monkeypatch.setenv("ANTHROPIC_HEDGE", "1")
+    monkeypatch.setenv("ANTHROPIC_HEDGE_MAX_EXTRA", "1")
+    fake_anthropic.latency = 0.02
+    fake_anthropic.slow_latency = 3.0
+    fake_anthropic.slow_requests = {20}
+    hedges_won = MODEL_HEDGES.value(outcome="hedge_won")
+
+    async def scenario():
+        async with app_client() as client:
+            # 20 normal calls teach the client what its p95 latency looks like
+            for i in range(20):
+                assert (await _post(client, jpeg_bytes(i))).status_code == 200
+            started = time.perf_counter()
+            response = await _post(client, jpeg_bytes(20))
+            return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["anc_value"] == 2030.0
+    assert elapsed < 1.0
+    assert fake_anthropic.request_count == 22
+    assert MODEL_HEDGES.value(outcome="hedge_won") == hedges_won + 1
+
+
+def test_hedge_budget_caps_extra_load():
+    budget = HedgeBudget(max_extra=0.1)
+    hedges = 0
+    for _ in range(1000):
+        budget.earn()
+        hedges += budget.try_spend()
+    assert hedges == 100
+
+
+def test_hedge_needs_a_spare_rate_limiter_token():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def straggler(limiter):
+        hedger = Hedger(max_extra=1, min_samples=1)
+        hedger.tracker("model").add(0.01)
+        return await hedger.run("model", call, admit=limiter.try_acquire)
+
+    drained = AdaptiveRateLimiter(rate=1.0, burst=1)
+    assert drained.try_acquire() and not drained.try_acquire()
+    skipped = MODEL_HEDGES.value(outcome="rate_limited")
+
+    assert asyncio.run(straggler(drained)) == "answer"
+    assert len(calls) == 1
+    assert MODEL_HEDGES.value(outcome="rate_limited") == skipped + 1
+
+    calls.clear()
+    assert asyncio.run(straggler(AdaptiveRateLimiter(rate=1.0, burst=1))) == "answer"
+    assert len(calls) == 2
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+async def _upload_many(app_client, jpeg_bytes, count: int):
+    async with app_client() as client:
+        return await asyncio.gather(*[
+            client.post("/upload", files={"file": ("cbc.jpg", jpeg_bytes(i), "image/jpeg")})
+            for i in range(count)
+        ])
+
+
+def test_concurrent_uploads_finish_in_about_one_model_latency(fake_anthropic, app_client, jpeg_bytes):
+    fake_anthropic.latency = 0.5
+    count = 20
+
+    started = time.perf_counter()
+    responses = asyncio.run(_upload_many(app_client, jpeg_bytes, count))
+    elapsed = time.perf_counter() - started
+
+    assert [r.status_code for r in responses] == [200] * count
+    assert all(r.json()["anc_value"] == 2030.0 for r in responses)
+    assert fake_anthropic.request_count == count
+    # Sequential handling would take count * latency (10 s); overlapping calls take ~one latency.
+    assert elapsed < fake_anthropic.latency * 3
+
+
+def test_concurrency_limit_caps_in_flight_model_calls(fake_anthropic, monkeypatch, app_client, jpeg_bytes):
+    monkeypatch.setenv("ANTHROPIC_MAX_CONCURRENCY", "4")
+    fake_anthropic.latency = 0.2
+
+    responses = asyncio.run(_upload_many(app_client, jpeg_bytes, 12))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert fake_anthropic.max_in_flight == 4
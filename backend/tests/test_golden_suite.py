@@ -0,0 +1,79 @@
+import httpx
+import pytest
+
+from golden_suite import load_dataset, run, severity_band, write_synthetic_dataset
+from model_recordings import request_key
+
+
+@pytest.fixture
+def suite_env(monkeypatch):
+    """Let the suite set its environment; monkeypatch puts it back afterwards."""
+    monkeypatch.setenv("ANC_CACHE_MAX_ENTRIES", "0")
+    monkeypatch.setenv("MODEL_RECORDINGS_MODE", "off")
+    monkeypatch.setenv("MODEL_RECORDINGS_DIR", "")
+    monkeypatch.delenv("ANC_CACHE_DB_PATH", raising=False)
+    monkeypatch.delenv("NEAR_DUP_MODE", raising=False)
+    monkeypatch.delenv("ANC_EXTRACTION_MODE", raising=False)
+
+
+def _outcomes(result):
+    return {row["id"]: (row["status"], row["anc_value"], row["band"]) for row in result["rows"]}
+
+
+def test_severity_band_matches_pipeline_cutoffs(tmp_path):
+    assert [severity_band(v) for v in (None, 499, 500, 999, 1000, 1499, 1500)] == [
+        "none", "critical", "high", "high", "moderate", "moderate", "low"
+    ]
+    write_synthetic_dataset(tmp_path)
+    cases = {case.id: case for case in load_dataset(tmp_path)}
+    assert cases["photo-severe"].expected_band == "critical"
+    assert cases["photo-no-anc"].expected_status == "not_found"
+    assert cases["photo-no-anc"].expected_band == "none"
+
+
+def test_request_key_ignores_json_layout():
+    a = httpx.Request("POST", "https://api.example/v1/messages", content=b'{"model": "m", "max_tokens": 5}')
+    b = httpx.Request("POST", "https://api.example/v1/messages", content=b'{"max_tokens":5,"model":"m"}')
+    c = httpx.Request("POST", "https://api.example/v1/messages", content=b'{"max_tokens":6,"model":"m"}')
+    assert request_key(a) == request_key(b) != request_key(c)
+
+
+def test_recorded_run_replays_offline(tmp_path, fake_anthropic, suite_env, monkeypatch):
+    dataset, recordings = tmp_path / "golden", tmp_path / "recordings"
+    answers = write_synthetic_dataset(dataset)
+
+    recorded = run(dataset, recordings, record=True, fake=fake_anthropic, fake_answers=answers)
+    # Photos reach the model once each; digital PDFs are read from their text layer
+    assert fake_anthropic.request_count == len(answers)
+    assert len(list(recordings.glob("*.json"))) == len(answers)
+
+    # Nothing listens there: a replay that tried the network would fail
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://127.0.0.1:9")
+    replayed = run(dataset, recordings, record=False)
+    assert fake_anthropic.request_count == len(answers)
+    assert _outcomes(replayed) == _outcomes(recorded)
+
+    summary = replayed["summary"]
+    assert summary["cases"] == 9
+    assert summary["failures"] == ["photo-missed-multiplier"]
+    assert summary["accuracy"] == pytest.approx(8 / 9)
+    assert summary["band_confusion"]["low"]["critical"] == 1
+    assert summary["band_confusion"]["critical"]["critical"] == 2
+    assert "answer_parse" in summary["stages_ms"] and "model_call_recorded" in summary["stages_ms"]
+    photo = next(row for row in replayed["rows"] if row["id"] == "photo-normal")
+    assert 0 < photo["model_bytes"] < photo["upload_bytes"]
+    assert photo["input_tokens"] > 0
+
+
+def test_changed_request_is_a_missing_recording(tmp_path, fake_anthropic, suite_env, monkeypatch):
+    dataset, recordings = tmp_path / "golden", tmp_path / "recordings"
+    answers = write_synthetic_dataset(dataset)
+    run(dataset, recordings, record=True, fake=fake_anthropic, fake_answers=answers)
+
+    # Another extraction mode sends another prompt: the photos miss, quickly and without retries
+    monkeypatch.setenv("ANC_EXTRACTION_MODE", "structured")
+    result = run(dataset, recordings, record=False)
+    statuses = {row["id"]: row["status"] for row in result["rows"]}
+    assert {statuses[case_id] for case_id in answers} == {"missing_recording"}
+    assert statuses["pdf-normal"] == statuses["pdf-severe"] == "success"
+    assert result["elapsed_s"] < 5
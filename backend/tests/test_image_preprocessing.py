@@ -0,0 +1,93 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from image_preprocessing import preprocess_image, preprocess_image_async
+
+
+def _jpeg(size, color=(200, 30, 30), orientation=None, quality=95):
+    image = Image.effect_noise(size, 64).convert("RGB")
+    image.paste(Image.new("RGB", (size[0] // 2, size[1] // 2), color))
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, format="JPEG", quality=quality, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def test_large_photo_is_downsampled_to_grayscale_jpeg():
+    original = _jpeg((4000, 3000))
+
+    output, media_type, stats = preprocess_image(original)
+
+    assert media_type == "image/jpeg"
+    assert stats["bytes_in"] == len(original)
+    assert stats["bytes_out"] == len(output) < len(original) // 4
+    assert set(stats["timings_ms"]) == {"decode", "exif_orientation", "grayscale", "downsample", "encode"}
+    result = Image.open(io.BytesIO(output))
+    assert result.mode == "L"
+    assert max(result.size) <= 1568
+    assert result.size[0] * result.size[1] <= 1_150_000
+
+
+def test_exif_orientation_is_applied():
+    # Orientation 6: the camera stored the image rotated 90 degrees clockwise
+    original = _jpeg((3000, 2000), orientation=6)
+
+    output, _, stats = preprocess_image(original)
+
+    width, height = Image.open(io.BytesIO(output)).size
+    assert stats["exif_orientation"] == 6
+    assert height > width
+
+
+def test_small_image_that_would_grow_is_sent_unchanged():
+    buffer = io.BytesIO()
+    Image.new("L", (64, 64), 255).save(buffer, format="PNG")
+    original = buffer.getvalue()
+
+    output, media_type, stats = preprocess_image(original)
+
+    assert output == original
+    assert media_type == "image/png"
+    assert stats["bytes_out"] == len(original)
+
+
+def test_transparent_png_is_flattened_onto_white():
+    # Dark text on a transparent background, as exported by some lab portals
+    image = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+    image.paste(Image.new("RGBA", (200, 40), (20, 20, 20, 255)), (100, 80))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+
+    output, media_type, stats = preprocess_image(buffer.getvalue())
+
+    assert media_type == "image/jpeg"
+    assert stats["flattened_transparency"] is True
+    result = Image.open(io.BytesIO(output))
+    assert result.getpixel((10, 10)) > 240
+    assert result.getpixel((200, 100)) < 40
+
+
+def test_undecodable_bytes_pass_through():
+    original = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+    output, media_type, stats = preprocess_image(original)
+
+    assert output == original
+    assert media_type == "image/jpeg"
+    assert stats["skipped"].startswith("decode failed")
+
+
+def test_async_variant_runs_in_thread_pool_and_can_be_disabled(monkeypatch):
+    original = _jpeg((2000, 1500))
+
+    output, _, _ = asyncio.run(preprocess_image_async(original))
+    assert len(output) < len(original)
+
+    monkeypatch.setenv("IMAGE_PREPROCESSING", "0")
+    output, _, stats = asyncio.run(preprocess_image_async(original))
+    assert output == original
+    assert stats["skipped"] == "disabled"
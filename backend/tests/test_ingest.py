@@ -0,0 +1,76 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from ingest import RequestSizeLimitMiddleware
+
+
+def _png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("L", (32, 32), 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def _post(app_client, path, **kwargs):
+    async with app_client() as client:
+        return await client.post(path, **kwargs)
+
+
+def test_declared_content_type_is_ignored_in_favour_of_magic_bytes(fake_anthropic, app_client):
+    accepted = asyncio.run(_post(app_client, "/upload", files={"file": ("cbc", _png_bytes(), "application/octet-stream")}))
+    rejected = asyncio.run(_post(app_client, "/upload", files={"file": ("cbc.jpg", b"GIF89a not allowed", "image/jpeg")}))
+
+    assert accepted.status_code == 200
+    assert rejected.status_code == 400
+    assert "image/gif not supported" in rejected.json()["detail"]
+
+
+def test_oversized_upload_is_rejected_with_413(monkeypatch, app_client):
+    monkeypatch.setenv("MAX_UPLOAD_BYTES", str(100 * 1024))
+    oversized = b"\xff\xd8\xff\xe0" + b"\x00" * (200 * 1024)
+
+    response = asyncio.run(_post(app_client, "/upload", files={"file": ("cbc.jpg", oversized, "image/jpeg")}))
+
+    assert response.status_code == 413
+
+
+def test_file_over_limit_inside_an_allowed_request_is_rejected(monkeypatch, app_client):
+    # The request fits the body limit (file limit + multipart overhead), the file itself does not
+    monkeypatch.setenv("MAX_UPLOAD_BYTES", str(100 * 1024))
+    oversized = b"\xff\xd8\xff\xe0" + b"\x00" * (100 * 1024 + 10)
+
+    response = asyncio.run(_post(app_client, "/upload", files={"file": ("cbc.jpg", oversized, "image/jpeg")}))
+
+    assert response.status_code == 413
+    assert "upload limit" in response.json()["detail"]
+
+
+def test_chunked_body_is_cut_off_once_it_passes_the_limit():
+    reads = []
+
+    async def downstream(scope, receive, send):
+        while True:
+            message = await receive()
+            reads.append(len(message.get("body", b"")))
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = RequestSizeLimitMiddleware(downstream, limit_for_path=lambda path: 1000)
+    chunks = [{"type": "http.request", "body": b"x" * 400, "more_body": True} for _ in range(10)]
+    sent = []
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": []}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert sent[0]["status"] == 413
+    assert len(reads) == 2  # the third chunk crosses the limit and is never handed on
+    assert len(chunks) == 7
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from jobs import JobStore, MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture
+def with_client(app_client):
+    """`with_client(scenario)`: runs `scenario(client)` against the app."""
+    def run(scenario):
+        async def connected():
+            async with app_client() as client:
+                return await scenario(client)
+        return asyncio.run(connected())
+    return run
+
+
+async def _poll(client, status_url):
+    for _ in range(200):
+        job = (await client.get(status_url)).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_submit_returns_immediately_and_job_can_be_polled(fake_anthropic, with_client, jpeg_bytes):
+    fake_anthropic.latency = 0.2
+
+    async def scenario(client):
+        submitted = await client.post("/jobs", files={"file": ("cbc.jpg", jpeg_bytes(1), "image/jpeg")})
+        queued = submitted.json()
+        assert submitted.status_code == 202
+        assert queued["status"] == "queued"
+        assert fake_anthropic.request_count == 0
+        return await _poll(client, queued["status_url"])
+
+    job = with_client(scenario)
+    assert job["status"] == "succeeded"
+    assert job["result"]["anc_value"] == 2030.0
+    assert job["result"]["recommendation"] == "HOME_MEDICATION"
+    assert job["finished_at"] >= job["started_at"] >= job["created_at"]
+
+
+def test_full_queue_answers_429_with_retry_after(fake_anthropic, monkeypatch, with_client, jpeg_bytes):
+    monkeypatch.setenv("JOB_WORKERS", "1")
+    monkeypatch.setenv("JOB_MAX_QUEUE", "2")
+    fake_anthropic.latency = 0.3
+
+    async def scenario(client):
+        responses = []
+        for i in range(4):
+            responses.append(await client.post("/jobs", files={"file": ("cbc.jpg", jpeg_bytes(i), "image/jpeg")}))
+            await asyncio.sleep(0.01)
+        return responses
+
+    responses = with_client(scenario)
+    # One job is running, two are waiting, the fourth is refused
+    assert [r.status_code for r in responses] == [202, 202, 202, 429]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+
+def test_unknown_job_and_unsupported_file_type(with_client):
+    async def scenario(client):
+        missing = await client.get("/jobs/does-not-exist")
+        rejected = await client.post("/jobs", files={"file": ("report.txt", b"CBC results", "text/plain")})
+        return missing, rejected
+
+    missing, rejected = with_client(scenario)
+    assert missing.status_code == 404
+    assert rejected.status_code == 400
+
+
+def test_failed_job_records_the_error(monkeypatch, with_client, jpeg_bytes):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    async def scenario(client):
+        submitted = (await client.post("/jobs", files={"file": ("cbc.jpg", jpeg_bytes(9), "image/jpeg")})).json()
+        return await _poll(client, submitted["status_url"])
+
+    job = with_client(scenario)
+    assert job["status"] == "failed"
+    assert "ANTHROPIC_API_KEY" in job["error"]
+
+
+def test_stores_round_trip_and_prune_finished_jobs(tmp_path):
+    async def scenario(store):
+        await store.create({"job_id": "a", "status": "queued", "file_name": "a.jpg", "created_at": 1.0,
+                            "started_at": None, "finished_at": None, "result": None, "error": None})
+        await store.update("a", status="succeeded", result={"anc_value": 2030.0}, finished_at=10.0)
+        job = await store.get("a")
+        removed = await store.prune(finished_before=20.0)
+        return job, removed, await store.get("a")
+
+    for store in (MemoryJobStore(), SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))):
+        job, removed, after = asyncio.run(scenario(store))
+        assert job["status"] == "succeeded"
+        assert job["result"] == {"anc_value": 2030.0}
+        assert removed == 1
+        assert after is None
+
+
+def test_incomplete_store_fails_when_created():
+    class NoPruneStore(JobStore):
+        async def create(self, job): ...
+        async def update(self, job_id, **fields): ...
+        async def get(self, job_id): ...
+
+    with pytest.raises(TypeError, match="prune"):
+        NoPruneStore()
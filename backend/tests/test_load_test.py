@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+
+from load_test import percentile, run_load
+
+
+def _options(**overrides) -> argparse.Namespace:
+    options = dict(endpoint="upload", rps=None, concurrency=4, duration=30.0, requests=12, file=[],
+                   repeat=False, batch_size=3, poll_interval=0.02)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+async def _run(app_client, options: argparse.Namespace):
+    async with app_client() as client:
+        return await run_load(client, options)
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([7.0], 0.99) == 7.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_closed_loop_upload_load(fake_anthropic, app_client):
+    fake_anthropic.latency = 0.05
+
+    result = asyncio.run(_run(app_client, _options()))
+
+    assert result["requests"] == 12
+    assert result["outcomes"] == {"ok": 12}
+    assert result["error_rate"] == 0.0
+    # Every upload is made distinct, so each one reaches the model
+    assert fake_anthropic.request_count == 12
+    latency = result["latency_ms"]
+    assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    assert latency["p50"] >= 50
+
+
+def test_open_loop_counts_errors(fake_anthropic, app_client):
+    fake_anthropic.answers = ["<answer>1200 per microliter</answer>"]
+
+    result = asyncio.run(_run(app_client, _options(endpoint="jobs", rps=50.0, requests=6, concurrency=None)))
+
+    assert result["outcomes"] == {"ok": 6}
+    assert result["mode"] == "open loop, 50.0 rps"
+
+    result = asyncio.run(_run(app_client, _options(endpoint="batch", requests=2, concurrency=1, batch_size=0)))
+    # A batch without files is refused by request validation and counted as an error
+    assert result["outcomes"] == {"422": 2}
+    assert result["error_rate"] == 1.0
@@ -0,0 +1,77 @@
+import asyncio
+
+from metrics import Counter, Histogram, _registry
+
+
+def _sample(text: str, prefix: str) -> float:
+    """Value of the first exposition line starting with `prefix`."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {prefix!r} in metrics output")
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1.0))
+    try:
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage="a")
+        lines = histogram.render()
+    finally:
+        _registry.remove(histogram)
+
+    assert lines[:2] == ["# HELP test_latency_seconds Test histogram.", "# TYPE test_latency_seconds histogram"]
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{stage="a"} 4.05' in lines
+    assert 'test_latency_seconds_count{stage="a"} 4' in lines
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_events_total", "Test counter.", ("name",))
+    try:
+        counter.inc(name='a"b')
+        counter.inc(2, name='a"b')
+        lines = counter.render()
+    finally:
+        _registry.remove(counter)
+
+    assert 'test_events_total{name="a\\"b"} 3' in lines
+
+
+async def _upload_and_scrape(app_client):
+    async with app_client() as client:
+        before = (await client.get("/metrics")).text
+        upload = await client.post(
+            "/upload",
+            files={"file": ("cbc.jpg", b"\xff\xd8\xff\xe0metrics-test" + b"\x00" * 64, "image/jpeg")},
+            headers={"X-Request-ID": "req-123"},
+        )
+        after = await client.get("/metrics")
+        return before, upload, after
+
+
+def test_upload_is_traced_and_exported(fake_anthropic, capsys, app_client):
+    before, upload, after = asyncio.run(_upload_and_scrape(app_client))
+
+    assert upload.status_code == 200
+    assert upload.headers["X-Request-ID"] == "req-123"
+    assert after.headers["content-type"].startswith("text/plain")
+
+    text = after.text
+    for stage in ("media_type_sniff", "upload_read", "prompt_load", "cache_lookup", "preprocess",
+                  "base64_encode", "model_queue", "model_call", "answer_parse", "recommendation"):
+        assert f'nadircare_stage_duration_seconds_count{{stage="{stage}"}}' in text, stage
+
+    success = 'nadircare_anc_extractions_total{status="success"}'
+    previous = _sample(before, success) if success in before else 0
+    assert _sample(text, success) == previous + 1
+    assert 'nadircare_model_tokens_count{model="claude-haiku-4-5-20251001",direction="output"}' in text
+    assert 'nadircare_http_request_duration_seconds_count{method="POST",path="/upload",status="200"}' in text
+    assert _sample(text, "nadircare_http_requests_in_flight") == 1  # the scrape itself
+
+    # Every log line of the request carries its id, ending with the per-stage timing summary
+    logged = capsys.readouterr().out
+    assert "[req-123] Processing file: cbc.jpg (image/jpeg)" in logged
+    assert '[req-123] {"event": "request_timing", "method": "POST", "path": "/upload"' in logged
@@ -0,0 +1,118 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from bench_near_duplicates import jpeg, render_report
+from metrics import NEAR_DUPLICATE_LOOKUPS
+from near_duplicates import HASH_BITS, HammingIndex, dhash, get_near_duplicate_index, phash, worth_indexing
+from report_processor import process_medical_report
+
+
+def _report_photo() -> bytes:
+    return jpeg(render_report(random.Random(1), layout=0))
+
+
+def _reencoded(photo: bytes, quality: int = 60) -> bytes:
+    image = Image.open(io.BytesIO(photo))
+    buffer = io.BytesIO()
+    image.resize((image.width * 3 // 4, image.height * 3 // 4)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("max_distance, max_entries", [(0, 500), (4, 500), (7, 50_000)])
+def test_index_agrees_with_a_linear_scan(max_distance, max_entries):
+    rng = random.Random(max_distance)
+    index = HammingIndex(max_distance=max_distance, max_entries=max_entries)
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(500)]
+    for i, value in enumerate(stored):
+        index.add(value, i)
+
+    for _ in range(300):
+        query = rng.choice(stored)
+        for bit in rng.sample(range(HASH_BITS), rng.randint(0, max_distance + 2)):
+            query ^= 1 << bit
+        expected = min((((value ^ query).bit_count(), -i) for i, value in enumerate(stored)), default=None)
+        found = index.search(query)
+        if expected[0] > max_distance:
+            assert found is None
+        else:
+            assert (found[0], -found[2]) == expected
+
+
+def test_oldest_entries_are_overwritten():
+    index = HammingIndex(max_distance=2, max_entries=2)
+    for payload, value in enumerate([0b1, 0b10, 0b100]):
+        index.add(value, payload)
+
+    assert len(index) == 2
+    # 0b1 itself is gone; the closest survivor is 0b10 (distance 2, older than 0b100 at distance 2)
+    assert index.search(0b1) == (2, 0b100, 2)
+    assert index.search(0b11) == (1, 0b10, 1)
+
+
+# dhash's gradients between adjacent thumbnail pixels flip more under rescaling than phash's DCT terms
+@pytest.mark.parametrize("photo_hash, max_distance", [(dhash, 8), (phash, 4)])
+def test_reencoded_copy_hashes_close_to_the_original(photo_hash, max_distance):
+    photo = _report_photo()
+    original, copy = photo_hash(photo), photo_hash(_reencoded(photo))
+
+    assert (original ^ copy).bit_count() <= max_distance
+    assert photo_hash(b"not an image") is None
+
+
+def test_cross_check_compares_with_the_earlier_read(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("NEAR_DUP_MODE", "cross_check")
+    # Reasoning-mode reads carry no confidence
+    monkeypatch.setenv("NEAR_DUP_INDEX_UNSCORED", "1")
+    photo = _report_photo()
+    agreed = NEAR_DUPLICATE_LOOKUPS.value(outcome="agree")
+    disagreed = NEAR_DUPLICATE_LOOKUPS.value(outcome="disagree")
+
+    async def scenario():
+        first = await process_medical_report(photo, "image/jpeg", "cbc.jpg")
+        retake = await process_medical_report(_reencoded(photo), "image/jpeg", "cbc-retake.jpg")
+        fake_anthropic.answer_text = "<answer>\n480 per microliter\n</answer>"
+        misread = await process_medical_report(_reencoded(photo, 50), "image/jpeg", "cbc-misread.jpg")
+        return first, retake, misread
+
+    first, retake, misread = run_closing(scenario())
+
+    assert "near_duplicate" not in first["anc_extraction"]
+    assert retake["anc_extraction"]["near_duplicate"]["agrees"] is True
+    assert misread["anc_extraction"]["near_duplicate"] == {
+        "distance": misread["anc_extraction"]["near_duplicate"]["distance"],
+        "agrees": False,
+        "prior_anc_value": 2030.0,
+    }
+    # The model still answers every upload; the prior only cross-checks it
+    assert misread["anc_extraction"]["anc_value"] == 480.0
+    assert fake_anthropic.request_count == 3
+    assert NEAR_DUPLICATE_LOOKUPS.value(outcome="agree") == agreed + 1
+    assert NEAR_DUPLICATE_LOOKUPS.value(outcome="disagree") == disagreed + 1
+
+
+def test_only_fresh_scored_reads_are_indexed(fake_anthropic, monkeypatch, run_closing):
+    assert worth_indexing({"status": "success", "confidence": 0.95}, 0.9)
+    assert not worth_indexing({"status": "success", "confidence": 0.5}, 0.9)
+    assert not worth_indexing({"status": "success", "confidence": None}, 0.9)
+    assert worth_indexing({"status": "success", "confidence": None}, 0.9, index_unscored=True)
+    assert not worth_indexing({"status": "unclear", "confidence": 0.99}, 0.9)
+
+    monkeypatch.setenv("NEAR_DUP_MODE", "cross_check")
+    photo = _report_photo()
+
+    run_closing(process_medical_report(photo, "image/jpeg", "cbc.jpg"))
+    assert len(get_near_duplicate_index()) == 0
+
+    monkeypatch.setenv("ANC_EXTRACTION_MODE", "structured")
+
+    async def twice():
+        for _ in range(2):
+            await process_medical_report(photo, "image/jpeg", "cbc.jpg")
+
+    run_closing(twice())
+    # The second read came from the result cache and is not indexed again
+    assert fake_anthropic.request_count == 2
+    assert len(get_near_duplicate_index()) == 1
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from anc_text import find_anc_in_pdf, find_anc_in_text
+from metrics import PDF_LOCAL_EXTRACTIONS
+from pdf_text import MAX_DECODED_BYTES, PDFTooLarge, iter_page_texts
+from report_processor import process_medical_report
+from sample_pdfs import CBC_PAGE, COVER_PAGE, form_bomb_pdf, lab_report_pdf
+
+
+def _process(contents: bytes):
+    return process_medical_report(contents, "application/pdf", "cbc.pdf")
+
+
+@pytest.mark.parametrize("text, anc_value", [
+    ("Neutrophils, Absolute   2.03   1.50 - 8.00   K/µL", 2030.0),
+    ("NEUT#  2.03 ×10³/µL  (1.8-7.7)", 2030.0),
+    ("Abs Neutrophils  0.42 L  x10^3/uL", 420.0),
+    ("Absolute Neutrophil Count (ANC)  2,030  cells/µL", 2030.0),
+    ("ANC 1.2 x 10^9/L", 1200.0),
+    ("Neutrophils (%)  62\nNeutrophils (Absolute)  980 /mcL", 980.0),
+])
+def test_local_parser_converts_units(text, anc_value):
+    match, outcome = find_anc_in_text(text)
+    assert outcome == "hit"
+    assert match.normalized == anc_value
+
+
+@pytest.mark.parametrize("text, outcome", [
+    ("Hemoglobin 12.9 g/dL", "no_label"),
+    ("Neutrophils  62 %  40 - 75", "no_value"),
+    ("Neutrophils, Absolute  2.03", "no_value"),
+    ("Neutrophils  2,03  K/µL", "no_value"),
+    ("Neutrophils, Absolute 2.03 K/µL\nANC 3.10 K/µL", "ambiguous"),
+])
+def test_local_parser_refuses_unsure_text(text, outcome):
+    assert find_anc_in_text(text) == (None, outcome)
+
+
+@pytest.mark.parametrize("font", ["type0", "type1"])
+def test_text_layer_is_read_lazily_up_to_the_first_neutrophil_page(font):
+    pdf = lab_report_pdf([COVER_PAGE, CBC_PAGE, COVER_PAGE, COVER_PAGE], font=font)
+
+    pages = iter_page_texts(pdf)
+    assert "Test Patient" in next(pages)
+    assert "Neutrophils, Absolute 2.03 1.50 - 8.00 K/µL" in next(pages)
+
+    match, outcome, pages_read = find_anc_in_pdf(pdf)
+    assert (match.normalized, outcome, pages_read) == (2030.0, "hit", 2)
+
+
+def test_text_pdf_upload_needs_no_model_call(fake_anthropic, app_client):
+    hits = PDF_LOCAL_EXTRACTIONS.value(outcome="hit")
+
+    async def scenario():
+        async with app_client() as client:
+            return await client.post("/upload", files={"file": ("cbc.pdf", lab_report_pdf(), "application/pdf")})
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["anc_value"] == 2030.0
+    assert fake_anthropic.request_count == 0
+    assert PDF_LOCAL_EXTRACTIONS.value(outcome="hit") == hits + 1
+
+
+def test_pdf_without_a_confident_match_goes_to_the_model(fake_anthropic, run_closing):
+    pdf = lab_report_pdf([[("Neutrophils", "42.3", "40 - 75", "%")]])
+
+    parsed = run_closing(_process(pdf))
+
+    anc = parsed["anc_extraction"]
+    assert anc["anc_value"] == 2030.0
+    assert anc["local_text_outcome"] == "no_value"
+    document = fake_anthropic.last_request["messages"][0]["content"][0]
+    assert document["type"] == "document"
+    assert document["source"]["media_type"] == "application/pdf"
+
+
+def test_scanned_pdf_without_text_goes_to_the_model(fake_anthropic, run_closing):
+    parsed = run_closing(_process(lab_report_pdf([[]])))
+
+    assert parsed["anc_extraction"]["local_text_outcome"] == "no_text"
+    assert fake_anthropic.request_count == 1
+
+
+def test_compression_bomb_is_not_inflated_and_goes_to_the_model(fake_anthropic, run_closing):
+    # A few KB on the wire that would inflate to several times the decode budget
+    bomb = lab_report_pdf([CBC_PAGE + [" " * (4 * MAX_DECODED_BYTES)]], font="type1")
+    assert len(bomb) < MAX_DECODED_BYTES // 100
+
+    with pytest.raises(PDFTooLarge):
+        list(iter_page_texts(bomb))
+    assert find_anc_in_pdf(bomb)[1] == "no_text"
+
+    parsed = run_closing(_process(bomb))
+    assert parsed["anc_extraction"]["local_text_outcome"] == "no_text"
+    assert fake_anthropic.request_count == 1
+
+
+@pytest.mark.parametrize("levels, draws", [(1, 1000), (3, 100)])
+def test_form_xobject_bomb_is_not_interpreted_and_goes_to_the_model(fake_anthropic, run_closing, levels, draws):
+    # Under a KB, drawing a form (or nested forms) so often it would take minutes of CPU to interpret
+    bomb = form_bomb_pdf(levels, draws)
+    assert len(bomb) < 1024
+
+    with pytest.raises(PDFTooLarge):
+        list(iter_page_texts(bomb))
+    # The same form drawn a few times is an ordinary page
+    list(iter_page_texts(form_bomb_pdf(1, 10)))
+
+    parsed = run_closing(_process(bomb))
+    assert parsed["anc_extraction"]["local_text_outcome"] == "no_text"
+    assert fake_anthropic.request_count == 1
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import metrics
+from profiling import StackSampler, get_request_profiler
+
+
+@pytest.fixture
+def requests(app_client, jpeg_bytes):
+    """`requests(*calls)`: runs (method, path, headers) calls in order against the app; returns the responses."""
+    async def send_all(calls):
+        responses = []
+        async with app_client() as client:
+            for i, (method, path, headers) in enumerate(calls):
+                if method == "POST":
+                    files = {"file": ("cbc.jpg", jpeg_bytes(i), "image/jpeg")}
+                    responses.append(await client.post(path, files=files, headers=headers))
+                else:
+                    responses.append(await client.get(path, headers=headers))
+        return responses
+    return lambda *calls: asyncio.run(send_all(calls))
+
+
+def test_profiling_is_off_by_default(fake_anthropic, monkeypatch, requests):
+    monkeypatch.delenv("PROFILE_TOKEN", raising=False)
+    monkeypatch.delenv("PROFILE_SAMPLE_EVERY", raising=False)
+
+    upload, listing = requests(("POST", "/upload", {"X-Profile-Token": "anything"}),
+                               ("GET", "/admin/profiles", {"X-Profile-Token": "anything"}))
+
+    assert upload.status_code == 200
+    assert "x-profile-id" not in upload.headers
+    assert listing.status_code == 404
+    assert get_request_profiler() is None
+
+
+def test_header_profiles_one_upload_for_the_admin(fake_anthropic, monkeypatch, tmp_path, requests):
+    monkeypatch.setenv("PROFILE_TOKEN", "s3cret")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_INTERVAL_MS", "1")
+    fake_anthropic.latency = 0.05
+    admin = {"X-Profile-Token": "s3cret"}
+
+    profiled, plain, wrong = requests(
+        ("POST", "/upload", admin), ("POST", "/upload", {}), ("GET", "/admin/profiles", {"X-Profile-Token": "guess"})
+    )
+    assert profiled.status_code == plain.status_code == 200
+    assert "x-profile-id" not in plain.headers
+    assert wrong.status_code == 403
+    profile_id = profiled.headers["x-profile-id"]
+
+    listing, download, missing = requests(
+        ("GET", "/admin/profiles", admin), ("GET", f"/admin/profiles/{profile_id}", admin),
+        ("GET", "/admin/profiles/..%2Fsecrets", admin),
+    )
+    [meta] = listing.json()["profiles"]
+    assert meta["id"] == profile_id
+    assert meta["trigger"] == "header"
+    assert meta["path"] == "/upload"
+    assert meta["request_id"] == profiled.headers["x-request-id"]
+    assert meta["samples"] > 0
+    # Collapsed stacks: "thread;outer frame;...;inner frame count"
+    lines = download.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert missing.status_code == 404
+
+
+def test_sampled_profiles_are_kept_in_a_bounded_ring(fake_anthropic, monkeypatch, tmp_path, requests):
+    monkeypatch.delenv("PROFILE_TOKEN", raising=False)
+    monkeypatch.setenv("PROFILE_SAMPLE_EVERY", "2")
+    monkeypatch.setenv("PROFILE_MAX_FILES", "2")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    captured_before = metrics.PROFILES_CAPTURED.value(trigger="sampled")
+
+    uploads = requests(*[("POST", "/upload", {})] * 6)
+
+    profiled = [r.headers["x-profile-id"] for r in uploads if "x-profile-id" in r.headers]
+    assert len(profiled) == 3
+    assert metrics.PROFILES_CAPTURED.value(trigger="sampled") - captured_before == 3
+    kept = [meta["id"] for meta in get_request_profiler().store.list()]
+    assert kept == profiled[:0:-1]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{profile_id}{suffix}" for profile_id in kept for suffix in (".folded", ".json")
+    )
+
+
+def test_sampler_sees_work_in_other_threads():
+    stop = threading.Event()
+
+    def busy_decode() -> None:
+        while not stop.is_set():
+            sum(i * i for i in range(1000))
+
+    worker = threading.Thread(target=busy_decode, name="image-preprocess")
+    sampler = StackSampler(interval=0.001, max_seconds=5)
+    worker.start()
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    assert sampler.samples > 0
+    busy = [line for line in sampler.collapsed().splitlines() if line.startswith("image-preprocess;")]
+    assert busy and all("busy_decode (test_profiling.py:" in line for line in busy)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from metrics import MODEL_FAST_FAILURES, MODEL_RETRIES
+from rate_limit import AdaptiveRateLimiter, CircuitBreaker, UpstreamUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_BACKOFF_BASE", "0.01")
+    monkeypatch.setenv("ANTHROPIC_BACKOFF_MAX", "0.05")
+
+
+@pytest.fixture
+def upload(app_client, jpeg_bytes):
+    """`upload(count)`: posts `count` distinct photos one after another; returns (response, seconds) pairs."""
+    async def post_all(count):
+        responses = []
+        async with app_client() as client:
+            for i in range(count):
+                started = time.perf_counter()
+                response = await client.post("/upload", files={"file": ("cbc.jpg", jpeg_bytes(i), "image/jpeg")})
+                responses.append((response, time.perf_counter() - started))
+        return responses
+    return lambda count: asyncio.run(post_all(count))
+
+
+def test_rate_limited_calls_are_retried(fake_anthropic, fast_backoff, upload):
+    fake_anthropic.errors = [429, 529]
+    retries = MODEL_RETRIES.value(reason="rate_limited")
+
+    [(response, _)] = upload(1)
+
+    assert response.status_code == 200
+    assert response.json()["anc_value"] == 2030.0
+    assert fake_anthropic.request_count == 3
+    assert MODEL_RETRIES.value(reason="rate_limited") == retries + 1
+
+
+def test_retry_after_beyond_the_deadline_fails_fast(fake_anthropic, fast_backoff, monkeypatch, upload):
+    monkeypatch.setenv("ANTHROPIC_RETRY_DEADLINE", "2")
+    fake_anthropic.errors = [429]
+    fake_anthropic.error_headers = {"retry-after": "30"}
+
+    [(response, elapsed)] = upload(1)
+
+    assert response.status_code == 503
+    assert 25 <= int(response.headers["Retry-After"]) <= 30
+    assert elapsed < 1.0
+    assert fake_anthropic.request_count == 1
+
+
+def test_open_breaker_fails_fast_without_calling_the_api(fake_anthropic, fast_backoff, monkeypatch, upload):
+    monkeypatch.setenv("ANTHROPIC_BREAKER_FAILURES", "3")
+    fake_anthropic.errors = [529] * 10
+    rejected = MODEL_FAST_FAILURES.value(reason="circuit_open")
+
+    (first, _), (second, elapsed) = upload(2)
+
+    assert first.status_code == 503
+    assert second.status_code == 503
+    assert int(second.headers["Retry-After"]) >= 1
+    assert elapsed < 0.5
+    # Three overloaded answers opened the breaker; the second upload never reached the API
+    assert fake_anthropic.request_count == 3
+    assert MODEL_FAST_FAILURES.value(reason="circuit_open") == rejected + 2
+
+
+def test_breaker_probes_once_after_the_reset_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(UpstreamUnavailable) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == 10
+
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_limiter_learns_the_rate_from_response_headers():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(burst=2, clock=clock)
+    assert limiter.wait_time() == 0.0
+
+    limiter.observe({"anthropic-ratelimit-requests-limit": "60", "anthropic-ratelimit-requests-remaining": "59"})
+    assert limiter.rate == 1.0
+    asyncio.run(limiter.acquire(deadline=clock.now))
+    asyncio.run(limiter.acquire(deadline=clock.now))
+    assert limiter.wait_time() == pytest.approx(1.0)
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(limiter.acquire(deadline=clock.now + 0.5))
+
+    clock.now += 1
+    limiter.observe({"retry-after": "20"})
+    assert limiter.wait_time() == pytest.approx(20.0)
+    assert limiter.stats()["wait_seconds"] == pytest.approx(20.0)
@@ -0,0 +1,70 @@
+import pytest
+
+from bench_recommendation_engine import legacy_get_recommendation, synthetic_reports
+from recommendation_engine import (
+    CRITICAL_KEYWORDS, MODERATE_KEYWORDS, KeywordMatcher, RULE_MATCHER, get_recommendation, get_recommendations
+)
+
+
+def test_decisions_match_the_original_engine():
+    reports = synthetic_reports(5000)
+
+    results = get_recommendations(reports)
+
+    assert len(results) == len(reports)
+    for report, result in zip(reports, results):
+        expected = legacy_get_recommendation(report)
+        assert {key: result[key] for key in expected} == expected
+
+
+def test_matcher_keeps_substring_semantics_and_reports_overlaps():
+    hits = RULE_MATCHER.find("recurrent infections with high fever and painful joints")
+
+    # "fever" lies inside "high fever" and is still reported
+    assert sorted(hits) == ["fever", "high fever", "infection", "pain"]
+
+
+def test_matcher_finds_keywords_that_start_inside_another_match():
+    # "acute" and "emergency" share the "e"; "bp" runs straight into "pulse"
+    assert sorted(RULE_MATCHER.find("acutemergency")) == ["acute", "emergency"]
+    assert sorted(RULE_MATCHER.find("bpulse")) == ["bp", "pulse"]
+
+
+def test_matcher_agrees_with_substring_checks_on_random_text():
+    import random
+
+    keywords = sorted(set(CRITICAL_KEYWORDS + MODERATE_KEYWORDS))
+    alphabet = "abcdefghilmnoprstuvy "
+    rng = random.Random(3)
+    for _ in range(2000):
+        pieces = [rng.choice(keywords) if rng.random() < 0.4 else rng.choice(alphabet) for _ in range(12)]
+        text = "".join(pieces)
+        assert sorted(RULE_MATCHER.find(text)) == [k for k in keywords if k in text]
+
+
+def test_response_names_the_rule_that_fired():
+    base = {"conditions": [], "symptoms": [], "test_results": [], "anc_extraction": {"status": "not_found"}}
+
+    assert get_recommendation({**base, "severity": "critical"})["rule"] == "severity"
+    assert get_recommendation({**base, "severity": "low", "symptoms": ["Chest pain"]})["rule"] == "critical_keywords"
+    assert get_recommendation({**base, "severity": "low", "symptoms": ["Elevated CRP"]})["rule"] == "moderate_keywords"
+    assert get_recommendation({**base, "severity": "low"})["rule"] == "default"
+
+
+def test_reports_without_anc_extraction_are_scored():
+    result = get_recommendation({"conditions": ["Mild symptoms"], "severity": "low"})
+
+    assert result["recommendation"] == "HOME_MEDICATION"
+    assert result["anc_value"] is None
+
+
+def test_suggested_actions_are_not_shared_between_responses():
+    first = get_recommendation({"severity": "low"})
+    first["suggested_actions"].append("mutated")
+
+    assert "mutated" not in get_recommendation({"severity": "low"})["suggested_actions"]
+
+
+def test_keyword_sets_that_would_hide_matches_are_refused():
+    with pytest.raises(ValueError):
+        KeywordMatcher(["pain", "painful"])
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import report_processor
+from result_cache import ResultCache, make_cache_key
+
+JPEG_BYTES = b"\xff\xd8\xff\xe0" + b"\x01" * 64
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_depends_on_image_prompt_and_model():
+    key = make_cache_key(JPEG_BYTES, "v1", "model-a")
+    assert key == make_cache_key(JPEG_BYTES, "v1", "model-a")
+    assert key != make_cache_key(JPEG_BYTES + b"\x00", "v1", "model-a")
+    assert key != make_cache_key(JPEG_BYTES, "v2", "model-a")
+    assert key != make_cache_key(JPEG_BYTES, "v1", "model-b")
+
+
+def test_memory_tier_is_lru_bounded_and_counts_hits():
+    async def scenario():
+        cache = ResultCache(max_entries=2)
+        await cache.set("a", {"v": 1})
+        await cache.set("b", {"v": 2})
+        assert await cache.get("a") == {"v": 1}
+        await cache.set("c", {"v": 3})  # evicts "b", the least recently used
+        assert await cache.get("b") is None
+        assert await cache.get("c") == {"v": 3}
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["memory_entries"] == 2
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+
+    async def scenario():
+        cache = ResultCache(ttl_seconds=60, clock=clock)
+        await cache.set("a", {"v": 1})
+        clock.now += 59
+        assert await cache.get("a") == {"v": 1}
+        clock.now += 2
+        assert await cache.get("a") is None
+
+    asyncio.run(scenario())
+
+
+def test_cached_values_are_isolated_copies():
+    async def scenario():
+        cache = ResultCache()
+        value = {"anc_value": 2030.0}
+        await cache.set("a", value)
+        value["anc_value"] = 1.0
+        hit = await cache.get("a")
+        hit["anc_value"] = 2.0
+        assert await cache.get("a") == {"anc_value": 2030.0}
+
+    asyncio.run(scenario())
+
+
+def test_disk_tier_survives_restart_and_is_size_bounded(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+
+    async def scenario():
+        first = ResultCache(db_path=db_path, max_disk_entries=2)
+        await first.set("a", {"v": 1})
+        await first.set("b", {"v": 2})
+        await first.set("c", {"v": 3})  # trims "a", the oldest row
+
+        restarted = ResultCache(db_path=db_path, max_disk_entries=2)
+        assert await restarted.get("a") is None
+        assert await restarted.get("c") == {"v": 3}
+        assert await restarted.get("c") == {"v": 3}
+        return restarted.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_repeat_upload_is_served_from_cache(fake_anthropic, run_closing):
+    fake_anthropic.latency = 0.3
+
+    async def scenario():
+        first = await report_processor.process_medical_report(JPEG_BYTES, "image/jpeg", "cbc.jpg")
+        started = time.perf_counter()
+        second = await report_processor.process_medical_report(JPEG_BYTES, "image/jpeg", "cbc.jpg")
+        return first, second, time.perf_counter() - started
+
+    first, second, elapsed = run_closing(scenario())
+    assert second["anc_extraction"] == first["anc_extraction"]
+    assert fake_anthropic.request_count == 1
+    assert elapsed < 0.05
+
+
+def test_parse_errors_are_not_cached(fake_anthropic, run_closing):
+    fake_anthropic.answer_text = "no answer tags here"
+
+    async def scenario():
+        for _ in range(2):
+            await report_processor.extract_anc_from_cbc_image(JPEG_BYTES)
+
+    run_closing(scenario())
+    assert fake_anthropic.request_count == 2
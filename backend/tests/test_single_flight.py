@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+JPEG_BYTES = b"\xff\xd8\xff\xe0" + b"\x02" * 64
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"anc_value": 2030.0}
+
+    async def scenario():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do("k", work) for _ in range(5)])
+        return flights, results
+
+    flights, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"anc_value": 2030.0}] * 5
+    assert results[0] is not results[1]
+    assert flights.executions == 1
+    assert flights.coalesced == 4
+    assert flights.in_flight() == 0
+
+
+def test_failure_reaches_every_waiter_and_is_not_remembered():
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model unavailable")
+
+    async def scenario():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do("k", failing) for _ in range(3)], return_exceptions=True)
+        with pytest.raises(RuntimeError):
+            await flights.do("k", failing)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(attempts) == 2
+
+
+def test_cancelled_first_caller_does_not_cancel_the_others():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        flights = SingleFlight()
+        first = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_work_is_cancelled_when_every_caller_gives_up():
+    state = {"cancelled": False}
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def scenario():
+        flights = SingleFlight()
+        waiters = [asyncio.create_task(flights.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights
+
+    flights = asyncio.run(scenario())
+    assert state["cancelled"]
+    assert flights.in_flight() == 0
+
+
+def test_retried_upload_joins_the_in_flight_model_call(fake_anthropic, monkeypatch, app_client):
+    monkeypatch.setenv("ANC_CACHE_MAX_ENTRIES", "0")
+    fake_anthropic.latency = 0.3
+
+    async def scenario():
+        async with app_client() as client:
+            return await asyncio.gather(*[
+                client.post("/upload", files={"file": ("cbc.jpg", JPEG_BYTES, "image/jpeg")})
+                for _ in range(3)
+            ])
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [200] * 3
+    assert all(r.json()["anc_value"] == 2030.0 for r in responses)
+    assert fake_anthropic.request_count == 1
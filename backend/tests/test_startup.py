@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import report_processor
+from load_test import BACKEND_DIR
+from report_processor import load_anc_prompt, prompt_version
+
+
+def test_importing_the_app_leaves_the_sdk_for_the_warm_up():
+    check = "import sys, main; print('anthropic' in sys.modules, 'httpx' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", check], cwd=BACKEND_DIR, capture_output=True, text=True,
+                            check=True).stdout
+    assert output.split() == ["False", "False"]
+
+
+def test_prompt_is_read_once_and_reloaded_when_the_file_changes(tmp_path, monkeypatch):
+    prompt_file = tmp_path / "anc_extraction_prompt.txt"
+    prompt_file.write_text("Read the ANC. {{IMAGE}}")
+    monkeypatch.setattr(report_processor, "ANC_PROMPT_FILE", prompt_file)
+
+    first = load_anc_prompt()
+    assert first == "Read the ANC. [The CBC report image is provided below]"
+    # Served from memory: the same object, no re-read or re-templating
+    assert load_anc_prompt() is first
+
+    prompt_file.write_text("Read the absolute neutrophil count. {{IMAGE}}")
+    stat = prompt_file.stat()
+    os.utime(prompt_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    edited = load_anc_prompt()
+    assert edited.startswith("Read the absolute neutrophil count.")
+    assert prompt_version(edited) != prompt_version(first)
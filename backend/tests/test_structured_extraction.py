@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from report_processor import extract_anc_from_cbc_image, parse_anc_tool_result
+
+JPEG = b"\xff\xd8\xff\xe0structured" + b"\x00" * 64
+
+
+def _message(*blocks):
+    return SimpleNamespace(content=list(blocks))
+
+
+def _tool_use(**tool_input):
+    return SimpleNamespace(type="tool_use", name="record_anc", input=tool_input)
+
+
+def test_tool_result_is_converted_to_cells_per_microliter():
+    result = parse_anc_tool_result(_message(
+        _tool_use(value=2.03, unit="K/uL", multiplier=1000, status="success", confidence=0.9)
+    ))
+    assert result["anc_value"] == 2030.0
+    assert result["status"] == "success"
+    assert result["confidence"] == 0.9
+    assert result["unit"] == "K/uL"
+
+
+@pytest.mark.parametrize("message, status", [
+    (_message(_tool_use(value=None, unit=None, multiplier=1, status="not_found", confidence=0.8)), "not_found"),
+    (_message(_tool_use(value=None, unit=None, multiplier=1, status="unclear", confidence=0.2)), "unclear"),
+    (_message(_tool_use(value=None, unit="/uL", multiplier=1, status="success", confidence=0.9)), "parse_error"),
+    (_message(SimpleNamespace(type="text", text="<answer>2030 per microliter</answer>")), "parse_error"),
+])
+def test_tool_result_statuses(message, status):
+    result = parse_anc_tool_result(message)
+    assert result["status"] == status
+    assert result["anc_value"] is None
+
+
+
+
+def test_structured_mode_uses_a_forced_tool_call(fake_anthropic, run_closing):
+    result = run_closing(extract_anc_from_cbc_image(JPEG, mode="structured"))
+
+    request = fake_anthropic.last_request
+    assert request["tool_choice"] == {"type": "tool", "name": "record_anc"}
+    assert request["max_tokens"] == 200
+    assert result["mode"] == "structured"
+    assert result["anc_value"] == 2030.0
+    assert result["status"] == "success"
+    assert result["usage"]["output_tokens"] > 0
+
+
+def test_modes_are_cached_separately(fake_anthropic, monkeypatch, run_closing):
+    monkeypatch.setenv("ANC_EXTRACTION_MODE", "structured")
+    structured = run_closing(extract_anc_from_cbc_image(JPEG, mode=None))
+    reasoning = run_closing(extract_anc_from_cbc_image(JPEG, mode="reasoning"))
+
+    assert structured["mode"] == "structured"
+    assert reasoning["mode"] == "reasoning"
+    assert reasoning["answer_section"] == "2030 per microliter"
+    assert fake_anthropic.request_count == 2
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+REASONED_ANSWER = "The neutrophil row reads 2.03 K/uL, i.e. 2030 per microliter.\n<answer>\n2030 per microliter\n</answer>"
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def post(app_client, jpeg_bytes):
+    """`post(path)`: uploads one report photo to `path` and returns the response."""
+    async def post_photo(path):
+        async with app_client() as client:
+            return await client.post(path, files={"file": ("cbc.jpg", jpeg_bytes(), "image/jpeg")})
+    return lambda path: asyncio.run(post_photo(path))
+
+
+def test_stream_reports_each_stage_then_the_upload_body(fake_anthropic, post):
+    fake_anthropic.answer_text = REASONED_ANSWER
+    fake_anthropic.token_latency = 0.005
+
+    response = post("/upload/stream")
+    events = _parse_sse(response.text)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert fake_anthropic.last_request["stream"] is True
+    names = [name for name, _ in events]
+    assert names[:3] == ["received", "preprocessed", "model_started"]
+    assert "model_streaming" in names
+    assert names[-3:] == ["answer", "parsed", "recommendation"]
+    assert events[-3][1]["anc_value"] == 2030.0
+    elapsed = [data["elapsed_ms"] for _, data in events]
+    assert elapsed == sorted(elapsed)
+
+    result = events[-1][1]["result"]
+    assert (result["recommendation"], result["anc_value"]) == ("HOME_MEDICATION", 2030.0)
+    assert result["panel"] is None
+
+
+def test_panel_anc_is_answered_before_the_model_finishes(fake_anthropic, monkeypatch, post):
+    monkeypatch.setenv("CBC_PANEL", "all")
+    fake_anthropic.token_latency = 0.02
+
+    events = dict(_parse_sse(post("/upload/stream").text))
+
+    assert (events["answer"]["anc_value"], events["answer"]["mode"]) == (2030.0, "panel")
+    # The anc entry comes first; the other three analytes are still being written
+    assert events["parsed"]["elapsed_ms"] - events["answer"]["elapsed_ms"] > 200
+
+
+def test_plain_upload_does_not_stream(fake_anthropic, post):
+    response = post("/upload")
+
+    assert response.json()["anc_value"] == 2030.0
+    assert "stream" not in fake_anthropic.last_request
+
+
+def test_processing_errors_become_an_error_event(monkeypatch, post):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    response = post("/upload/stream")
+    name, data = _parse_sse(response.text)[-1]
+
+    assert response.status_code == 200
+    assert name == "error"
+    assert data["status"] == 500 and "ANTHROPIC_API_KEY" in data["detail"]
+
+
+def test_streamed_upload_does_not_join_a_plain_one_in_flight(fake_anthropic, app_client, jpeg_bytes):
+    fake_anthropic.latency = 0.3
+
+    async def plain_then_streamed():
+        async with app_client() as client:
+            files = {"file": ("cbc.jpg", jpeg_bytes(), "image/jpeg")}
+            plain = asyncio.create_task(client.post("/upload", files=files))
+            await asyncio.sleep(0.1)
+            streamed = await client.post("/upload/stream", files=files)
+            return await plain, streamed
+
+    plain, streamed = asyncio.run(plain_then_streamed())
+
+    names = [name for name, _ in _parse_sse(streamed.text)]
+    assert "model_started" in names and names[-1] == "recommendation"
+    assert plain.json()["anc_value"] == 2030.0
+    assert fake_anthropic.request_count == 2
@@ -0,0 +1,126 @@
+import contextvars
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, STAGE_DURATION
+
+# Request-scoped tracing: a request id carried through log lines and per-stage timings.
+# Context variables follow the request into tasks it starts (single-flight, batch items).
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+_stage_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+# Receives progress events of the current request (POST /upload/stream); None when nobody listens
+_progress_sink: contextvars.ContextVar[Optional[Callable[[str, Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "progress_sink", default=None
+)
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+def bind_request(request_id: str) -> Dict[str, float]:
+    """Start a new request context (also used for background jobs); returns its stage-timing dict."""
+    timings: Dict[str, float] = {}
+    _request_id.set(request_id)
+    _stage_timings.set(timings)
+    return timings
+
+
+def log(message: str) -> None:
+    """print() with the current request id, so interleaved concurrent requests can be told apart."""
+    print(f"[{_request_id.get()}] {message}")
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_DURATION.observe(seconds, stage=stage)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 2)
+
+
+def bind_progress(sink: Callable[[str, Dict[str, Any]], None]) -> None:
+    """Send the progress events of this context (and the tasks it starts) to `sink(event, data)`."""
+    _progress_sink.set(sink)
+
+
+def progress_enabled() -> bool:
+    return _progress_sink.get() is not None
+
+
+def emit_progress(event: str, **data: Any) -> None:
+    """Report a processing milestone to the current request's progress stream, if it has one."""
+    sink = _progress_sink.get()
+    if sink is not None:
+        sink(event, data)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a processing stage into the stage histogram and the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def _route_path(scope: Dict[str, Any]) -> str:
+    # Label by route template ("/jobs/{job_id}") so metric cardinality stays bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that assigns each request an id (the caller's X-Request-ID if given),
+    echoes it in the response, records latency and in-flight metrics, and logs one
+    timing line per request with the time spent in each stage.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]],
+                       send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode())
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+        timings = bind_request(request_id)
+        state = {"status": 500}
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            path = _route_path(scope)
+            HTTP_REQUEST_DURATION.observe(elapsed, method=scope["method"], path=path, status=str(state["status"]))
+            if timings:
+                log(json.dumps({
+                    "event": "request_timing",
+                    "method": scope["method"],
+                    "path": path,
+                    "status": state["status"],
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "stages_ms": timings,
+                }))
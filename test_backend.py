@@ -3,6 +3,7 @@
 Simple script to test the backend API without the Android app.
 """
 
+import mimetypes
 import requests
 import sys
 
@@ -28,8 +29,10 @@ def test_backend_health():
 def test_upload_sample(file_path):
     """Test uploading a file to the backend."""
     try:
+        # The API accepts JPG and PNG report images (the type is checked from the file contents)
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
         with open(file_path, 'rb') as f:
-            files = {'file': (file_path.split('/')[-1], f, 'application/pdf')}
+            files = {'file': (file_path.split('/')[-1], f, content_type)}
             response = requests.post("http://localhost:8000/upload", files=files)
             
             if response.status_code == 200:
@@ -69,5 +72,6 @@ if __name__ == "__main__":
         test_upload_sample(file_path)
     else:
         print("ℹ️  To test file upload, provide a file path:")
-        print("   python test_backend.py /path/to/test/file.pdf")
+        print("   python test_backend.py /path/to/cbc_report.jpg")
+        print("ℹ️  For throughput and tail latency, use: python backend/benchmarks/load_test.py")
 